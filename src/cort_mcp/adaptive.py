@@ -0,0 +1,193 @@
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves of concurrent processes are not serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_MODES = ("off", "record", "on")
+# Temperatures the policy allocates alternative slots to (the fixed schedule's values)
+TEMPERATURE_ARMS = (0.7, 0.8, 0.9, 1.0, 1.1, 1.2)
+# Rounds observed before the policy starts to deviate from the fixed schedule
+MIN_ROUNDS = 20
+# A round is cut at the first slot whose sampled win rate (counting wins of later slots too)
+# falls below this; the remaining slots are not generated at all
+MIN_WIN_RATE = 0.05
+STAT_TABLES = ("temperatures", "slots", "models")
+# Minimum seconds between two writes of the state file
+SAVE_INTERVAL = 5.0
+
+
+def _arm() -> Dict[str, int]:
+    return {"trials": 0, "wins": 0}
+
+
+def _empty_stats() -> Dict[str, Any]:
+    return {"rounds": 0, "kept_current": 0, **{table: {} for table in STAT_TABLES}}
+
+
+def _add_stats(total: Dict[str, Any], delta: Dict[str, Any]) -> None:
+    """Add the counts of delta to total in place."""
+    total["rounds"] += delta["rounds"]
+    total["kept_current"] += delta["kept_current"]
+    for table in STAT_TABLES:
+        for name, arm in delta[table].items():
+            merged = total[table].setdefault(name, _arm())
+            merged["trials"] += arm["trials"]
+            merged["wins"] += arm["wins"]
+
+
+def _read_stats(path: str) -> Dict[str, Any]:
+    stats = _empty_stats()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            _add_stats(stats, {**_empty_stats(), **json.load(f)})
+    return stats
+
+
+class AdaptivePolicy:
+    """Bandit policy over alternative settings, learned from the evaluator's selections.
+
+    Every evaluated round counts a trial for the temperature, slot and (in mixed
+    mode) model of each alternative the evaluator saw, and a win for the selected
+    one. In "on" mode each slot of a round draws its temperature and model by
+    Thompson sampling from those counts, so settings that win get more of the
+    round's budget. The slot counts decide the width of the round: it is cut at the
+    first slot from which on the evaluator rarely finds a winner (sampled win rate
+    below MIN_WIN_RATE), which saves calls on rounds where extra alternatives rarely
+    beat the current response. "record" mode only collects the statistics.
+
+    The statistics are kept in a JSON file when a path is given. Every save adds the
+    counts of this process since its previous save to the file, so the worker
+    processes of one server learn together.
+    """
+
+    def __init__(self, mode: str = "on", path: Optional[str] = None, rng: Optional[random.Random] = None):
+        if mode not in ADAPTIVE_MODES[1:]:
+            raise ValueError(f"adaptive mode must be 'record' or 'on', got {mode!r}")
+        self.mode = mode
+        self.path = path
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        # Counts recorded since the last save, not yet in the state file
+        self._pending = _empty_stats()
+        self._stats = _empty_stats()
+        if path and os.path.exists(path):
+            self._stats = _read_stats(path)
+            logger.info(f"Loaded adaptive statistics from {path} ({self._stats['rounds']} rounds)")
+        if path:
+            atexit.register(self.save)
+
+    def plan(self, count: int, models: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Settings for up to count alternative slots, or None to use the fixed schedule.
+
+        Each entry has a "temperature" and a "model" key (None outside mixed mode).
+        """
+        with self._lock:
+            if self.mode != "on" or self._stats["rounds"] < MIN_ROUNDS:
+                return None
+            plan = []
+            for slot in range(count):
+                if slot and self._slot_draw(slot) < MIN_WIN_RATE:
+                    break
+                temperature = self._draw(self._stats["temperatures"], [str(t) for t in TEMPERATURE_ARMS])[0]
+                model = self._draw(self._stats["models"], models)[0] if models else None
+                plan.append({"temperature": float(temperature), "model": model})
+            return plan
+
+    def _slot_draw(self, slot: int) -> float:
+        """Sampled chance that the winner of a round is at this slot or a later one.
+
+        Rounds are cut at a slot, so a slot is only worth generating while some slot
+        from it on still wins.
+        """
+        slots = self._stats["slots"]
+        trials = slots.get(str(slot), _arm())["trials"]
+        wins = sum(arm["wins"] for name, arm in slots.items() if int(name) >= slot)
+        return self._rng.betavariate(wins + 1, max(trials - wins, 0) + 1)
+
+    def _draw(self, arms: Dict[str, Dict[str, int]], names: List[str]):
+        """Thompson sample: the arm with the highest draw from Beta(wins + 1, losses + 1)."""
+        best, best_draw = None, -1.0
+        for name in names:
+            arm = arms.get(name, _arm())
+            draw = self._rng.betavariate(arm["wins"] + 1, arm["trials"] - arm["wins"] + 1)
+            if draw > best_draw:
+                best, best_draw = name, draw
+        return best, best_draw
+
+    def record(self, alternatives: List[Dict[str, Any]], selected: int) -> None:
+        """Count one evaluated round.
+
+        Args:
+            alternatives: Settings of each alternative the evaluator saw ("slot", "temperature"
+                and optionally "model")
+            selected: Index of the selected alternative, or -1 if the current response was kept
+        """
+        if not alternatives:
+            return
+        delta = _empty_stats()
+        delta["rounds"] = 1
+        delta["kept_current"] = int(selected == -1)
+        for i, alt in enumerate(alternatives):
+            arms = [("slots", str(alt["slot"])), ("temperatures", str(alt["temperature"]))]
+            if alt.get("model"):
+                arms.append(("models", alt["model"]))
+            for table, name in arms:
+                arm = delta[table].setdefault(name, _arm())
+                arm["trials"] += 1
+                arm["wins"] += int(i == selected)
+        with self._lock:
+            _add_stats(self._stats, delta)
+            _add_stats(self._pending, delta)
+            due = time.monotonic() - self._last_save >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        """The learned statistics with per-arm win rates."""
+        with self._lock:
+            report = {"mode": self.mode, "path": self.path, "rounds": self._stats["rounds"], "kept_current": self._stats["kept_current"]}
+            for table in STAT_TABLES:
+                report[table] = {
+                    name: {**arm, "win_rate": round(arm["wins"] / arm["trials"], 3) if arm["trials"] else None}
+                    for name, arm in sorted(self._stats[table].items())
+                }
+            return report
+
+    def save(self) -> None:
+        """Add the counts recorded since the last save to the state file, if one is configured.
+
+        Other processes may have saved in the meantime: the file is re-read under a lock,
+        updated atomically, and the merged totals become this process's statistics.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._pending["rounds"]:
+                return
+            delta, self._pending = self._pending, _empty_stats()
+            self._last_save = time.monotonic()
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            stats = _read_stats(self.path)
+            _add_stats(stats, delta)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(stats, indent=1, sort_keys=True))
+            os.replace(tmp_path, self.path)
+        with self._lock:
+            # Keep what was recorded while the file was being written
+            _add_stats(stats, self._pending)
+            self._stats = stats
@@ -0,0 +1,102 @@
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+try:
+    from .similarity import NUM_PERMUTATIONS, estimate_similarity, minhash_signature, normalize_text
+except ImportError:
+    from similarity import NUM_PERMUTATIONS, estimate_similarity, minhash_signature, normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_THRESHOLD = 0.9
+# Locality-sensitive hashing bands over the MinHash signature (bands * rows == NUM_PERMUTATIONS)
+LSH_BANDS = 16
+
+
+class AnswerStore:
+    """Bounded store of final answers, looked up by prompt similarity.
+
+    Prompts are keyed by their normalized text within a scope, the model selection
+    that produced the answer (e.g. one provider/model), so a call never gets an answer
+    of another model. Lookups first try an exact match and then query a MinHash/LSH
+    index for near-duplicate prompts of the same scope. The least recently used entry
+    is evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, threshold: float = DEFAULT_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._rows = NUM_PERMUTATIONS // LSH_BANDS
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[tuple, set] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _bands(self, signature):
+        return [(band, tuple(signature[band * self._rows:(band + 1) * self._rows])) for band in range(LSH_BANDS)]
+
+    @staticmethod
+    def _key(prompt: str, scope: str) -> str:
+        return f"{scope}\n{normalize_text(prompt)}"
+
+    def lookup(self, prompt: str, scope: str = "") -> Optional[Dict[str, Any]]:
+        """Return the stored answer of the most similar prompt of scope above the threshold, if any.
+
+        The returned dict has the keys response, model, provider, prompt and similarity.
+        """
+        key = self._key(prompt, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return {**entry["answer"], "prompt": entry["prompt"], "similarity": 1.0}
+        signature = minhash_signature(prompt)
+        with self._lock:
+            candidates = set()
+            for band in self._bands(signature):
+                candidates |= self._buckets.get(band, set())
+            best_key, best_similarity = None, 0.0
+            for candidate in candidates:
+                if self._entries[candidate]["scope"] != scope:
+                    continue
+                similarity = estimate_similarity(signature, self._entries[candidate]["signature"])
+                if similarity > best_similarity:
+                    best_key, best_similarity = candidate, similarity
+            if best_key is None or best_similarity < self.threshold:
+                return None
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            logger.info(f"Answer store hit (similarity={best_similarity:.2f})")
+            return {**entry["answer"], "prompt": entry["prompt"], "similarity": best_similarity}
+
+    def add(self, prompt: str, response: str, model: str, provider: str, scope: str = "") -> None:
+        """Store the final answer for a prompt within scope, evicting the least recently used entry when full."""
+        key = self._key(prompt, scope)
+        signature = minhash_signature(prompt)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "prompt": prompt,
+                "scope": scope,
+                "signature": signature,
+                "answer": {"response": response, "model": model, "provider": provider},
+            }
+            for band in self._bands(signature):
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for band in self._bands(entry["signature"]):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
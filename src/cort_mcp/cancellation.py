@@ -0,0 +1,145 @@
+import contextlib
+import logging
+import socket
+import threading
+from typing import Any, Callable, List, Optional, Set
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Per thread: the cancel token of the run the thread executes, and the provider call in flight
+_local = threading.local()
+
+
+class RunCancelled(Exception):
+    """Raised inside a thinking run once its CancelToken has been cancelled."""
+
+
+class CancelToken:
+    """Cancellation flag of one thinking run.
+
+    The engine checks it between stages, and provider requests made inside
+    http_call() register their connections with it. cancel() sets the flag and
+    shuts those connections down, so requests blocked waiting for a response
+    fail right away instead of running to completion.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections: Set[HTTPConnection] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Cancel the run and abort its in-flight provider requests."""
+        with self._lock:
+            self._event.set()
+            connections = list(self._connections)
+        if connections:
+            logger.info(f"Cancelling run: aborting {len(connections)} in-flight provider requests")
+        for conn in connections:
+            _abort(conn)
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise RunCancelled("run cancelled")
+
+    @contextlib.contextmanager
+    def http_call(self):
+        """Let the provider request made on this thread inside the block be aborted by cancel().
+
+        Raises:
+            RunCancelled: If the run is already cancelled
+        """
+        self.raise_if_cancelled()
+        previous = getattr(_local, "call", None)
+        call = _local.call = (self, [])
+        try:
+            yield
+        finally:
+            _local.call = previous
+            with self._lock:
+                for conn in call[1]:
+                    self._connections.discard(conn)
+
+    def _attach(self, conn: HTTPConnection, attached: List[HTTPConnection]) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise RunCancelled("run cancelled")
+            self._connections.add(conn)
+            attached.append(conn)
+
+
+def _abort(conn: HTTPConnection) -> None:
+    sock = getattr(conn, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """The cancel token of the run executing on this thread, if any."""
+    return getattr(_local, "token", None)
+
+
+def run_with_cancel_token(token: CancelToken, fn: Callable, *args, **kwargs) -> Any:
+    """Call fn with token as this thread's cancel token (picked up by the thinking engine)."""
+    previous = current_cancel_token()
+    _local.token = token
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _local.token = previous
+
+
+class _CancellableConnectionMixin:
+    """Registers the connection with the cancel token of the provider call in flight on this thread."""
+
+    def connect(self):
+        super().connect()
+        call = getattr(_local, "call", None)
+        if call is not None and call[0].cancelled:
+            # cancel() may have run while the connection had no socket yet
+            _abort(self)
+
+    def request(self, method, url, *args, **kwargs):
+        call = getattr(_local, "call", None)
+        if call is not None:
+            call[0]._attach(self, call[1])
+        return super().request(method, url, *args, **kwargs)
+
+
+class CancellableHTTPConnection(_CancellableConnectionMixin, HTTPConnection):
+    pass
+
+
+class CancellableHTTPSConnection(_CancellableConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CancellableHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CancellableHTTPConnection
+
+
+class _CancellableHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CancellableHTTPSConnection
+
+
+class CancellableHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections can be aborted through a CancelToken."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CancellableHTTPConnectionPool,
+            "https": _CancellableHTTPSConnectionPool,
+        }
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when no recorded exchange matches a request."""
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:32]
+
+
+def _match_keys(url: str, payload: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Keys from most to least specific.
+
+    Mixed-LLM runs pick models at random, so replay falls back to matching on the
+    messages and temperature alone, and finally on the messages only.
+    """
+    messages = payload.get("messages")
+    return (
+        _digest({"url": url, "payload": payload}),
+        _digest({"messages": messages, "temperature": payload.get("temperature")}),
+        _digest({"messages": messages}),
+    )
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    """Recording of provider exchanges for offline, deterministic replays.
+
+    In record mode every exchange (request payload, status, response body and
+    observed latency) is appended to a JSON Lines file (gzip-compressed when the
+    path ends with .gz). In replay mode the exchanges are served from that file
+    without touching the network, sleeping for the recorded latency multiplied
+    by speed (0 replays instantly).
+    """
+
+    def __init__(self, path: str, mode: str, speed: float = 1.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"cassette mode must be one of {CASSETTE_MODES}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        # One queue per match level; identical requests are served in recorded order
+        self._exchanges: Tuple[Dict[str, deque], ...] = ({}, {}, {})
+        self._file = None
+        if mode == "replay":
+            self._load()
+        else:
+            self._file = _open(path, "a")
+
+    def _load(self) -> None:
+        count = 0
+        with _open(self.path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                exchange = json.loads(line)
+                for level, key in enumerate(exchange["keys"]):
+                    self._exchanges[level].setdefault(key, deque()).append(exchange)
+                count += 1
+        logger.info(f"Loaded {count} exchanges from cassette {self.path}")
+
+    def record(self, url: str, payload: Dict[str, Any], status: int, body: Any, latency: float) -> None:
+        """Append one exchange to the cassette file."""
+        exchange = {
+            "keys": _match_keys(url, payload),
+            "url": url,
+            "request": payload,
+            "status": status,
+            "response": body,
+            "latency": round(latency, 4),
+        }
+        line = json.dumps(exchange, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def replay(self, url: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Tuple[int, Any]:
+        """Serve the recorded (status, body) for a request, reproducing its latency.
+
+        Raises:
+            CassetteMiss: If no recorded exchange matches the request
+            TimeoutError: If the scaled latency exceeds timeout (after waiting timeout seconds)
+        """
+        exchange = None
+        with self._lock:
+            for level, key in enumerate(_match_keys(url, payload)):
+                queue = self._exchanges[level].get(key)
+                while queue:
+                    candidate = queue.popleft()
+                    if not candidate.get("_served"):
+                        candidate["_served"] = True
+                        exchange = candidate
+                        break
+                if exchange is not None:
+                    break
+        if exchange is None:
+            raise CassetteMiss(f"No recorded exchange for request to {url} (model={payload.get('model')})")
+        delay = exchange["latency"] * self.speed
+        if timeout is not None and delay > timeout:
+            time.sleep(max(timeout, 0))
+            raise TimeoutError(f"Replayed call takes {delay:.2f}s, exceeding timeout {timeout:.2f}s")
+        if delay > 0:
+            time.sleep(delay)
+        return exchange["status"], exchange["response"]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+# Jobs that may be queued or running at the same time; further submissions are rejected
+DEFAULT_MAX_JOBS = 16
+# Jobs that run at the same time (the others wait in the queue)
+DEFAULT_RUNNING_JOBS = 4
+# Seconds a finished job's result is kept for polling
+DEFAULT_RETENTION = 3600.0
+# Finished jobs kept at most (the oldest are dropped first)
+DEFAULT_MAX_FINISHED = 100
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while max_jobs jobs are queued or running."""
+
+
+class JobManager:
+    """Background thinking jobs of one server process.
+
+    Jobs are asyncio tasks on the server's event loop; the thinking runs they start
+    are handed to the worker pool like those of the synchronous tools. At most
+    max_running jobs run at once and at most max_jobs are queued or running.
+    Finished jobs are kept for retention seconds, and at most max_finished of them.
+    """
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_JOBS, max_running: int = DEFAULT_RUNNING_JOBS,
+                 retention: float = DEFAULT_RETENTION, max_finished: int = DEFAULT_MAX_FINISHED):
+        self.max_jobs = max_jobs
+        self.max_running = max_running
+        self.retention = retention
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._slots = asyncio.Semaphore(max_running)
+
+    def submit(self, tool: str, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Queue a job (must be called on the event loop).
+
+        Args:
+            tool: Name of the tool the job runs
+            run: Coroutine function producing the tool response
+
+        Returns:
+            The job's status
+
+        Raises:
+            JobQueueFull: If max_jobs jobs are already queued or running
+        """
+        self._purge()
+        active = sum(job["state"] not in FINISHED_STATES for job in self._jobs.values())
+        if active >= self.max_jobs:
+            raise JobQueueFull(f"{active} jobs are queued or running (limit {self.max_jobs})")
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "tool": tool,
+            "state": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+        }
+        job["task"] = asyncio.get_running_loop().create_task(self._execute(job, run))
+        self._jobs[job["job_id"]] = job
+        logger.info(f"Job {job['job_id']} ({tool}) queued")
+        return self._view(job)
+
+    async def _execute(self, job: Dict[str, Any], run: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        try:
+            async with self._slots:
+                job["state"] = "running"
+                job["started_at"] = time.time()
+                result = await run()
+            job["result"] = result
+            job["state"] = "failed" if isinstance(result, dict) and "error" in result else "succeeded"
+        except asyncio.CancelledError:
+            job["state"] = "cancelled"
+        except Exception as e:
+            logger.exception(f"Job {job['job_id']} failed: {e}")
+            job["result"] = {"error": f"Failed to process request: {e}"}
+            job["state"] = "failed"
+        job["finished_at"] = time.time()
+        logger.info(f"Job {job['job_id']} {job['state']}")
+
+    def _purge(self) -> None:
+        """Drop finished jobs past their retention time or beyond max_finished."""
+        now = time.time()
+        finished = sorted((job for job in self._jobs.values() if job["state"] in FINISHED_STATES), key=lambda job: job["finished_at"])
+        excess = len(finished) - self.max_finished
+        for i, job in enumerate(finished):
+            if i < excess or now - job["finished_at"] > self.retention:
+                del self._jobs[job["job_id"]]
+
+    def _view(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        view = {key: job[key] for key in ("job_id", "tool", "state", "submitted_at", "started_at", "finished_at")}
+        end = job["finished_at"] or time.time()
+        view["elapsed_seconds"] = round(end - job["started_at"], 3) if job["started_at"] else 0.0
+        if job["state"] == "queued":
+            view["queue_position"] = [other for other in self._jobs.values() if other["state"] == "queued"].index(job) + 1
+        return view
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's state and timing, or None if the job is unknown or expired."""
+        job = self.get(job_id)
+        return self._view(job) if job is not None else None
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's status with its tool response under "result" once it has finished."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        view = self._view(job)
+        if job["state"] in FINISHED_STATES:
+            view["result"] = job["result"]
+        return view
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job (finished jobs are left as they are)."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job["state"] not in FINISHED_STATES:
+            job["task"].cancel()
+            # Report the outcome right away. The job keeps its running slot until its
+            # thinking run has actually stopped (see server.run_blocking).
+            job["state"] = "cancelled"
+            job["finished_at"] = time.time()
+            logger.info(f"Job {job_id} cancelled")
+        return self._view(job)
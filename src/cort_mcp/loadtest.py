@@ -0,0 +1,322 @@
+"""Concurrent MCP client load generator for the cort-mcp stdio server.
+
+Starts one or more cort-mcp server processes, points their provider traffic at a
+local stub, drives them with concurrent MCP clients calling a weighted mix of the
+cort.think.* tools, and reports throughput, latency percentiles, event-loop lag
+(ping round trips while tools are running) and server memory growth.
+
+Example:
+    cort-mcp-loadtest --clients 16 --instances 2 --duration 60 \\
+        --mix cort.think.simple=3,cort.think.details_mixed_llm=1
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import AsyncExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+TOOLS = [
+    "cort.think.simple",
+    "cort.think.simple.neweval",
+    "cort.think.details",
+    "cort.think.details.neweval",
+    "cort.think.simple_mixed_llm",
+    "cort.think.simple_mixed_llm.neweval",
+    "cort.think.details_mixed_llm",
+    "cort.think.details_mixed_llm.neweval",
+]
+PING_INTERVAL = 0.25
+MEMORY_SAMPLE_INTERVAL = 1.0
+
+
+# --- Provider stub ---
+
+class StubProvider:
+    """Local OpenAI-compatible chat completions endpoint with configurable latency."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, rounds: int):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rounds = rounds
+        self.requests = 0
+        self._counter = itertools.count()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                stub.requests += 1
+                prompt = payload.get("messages", [{}])[-1].get("content", "")
+                # Honour the n parameter like OpenAI-compatible servers do
+                choices = [{"index": i, "message": {"role": "assistant", "content": stub.answer(prompt)}} for i in range(payload.get("n", 1))]
+                time.sleep(max(stub.latency_ms + random.uniform(-stub.jitter_ms, stub.jitter_ms), 0) / 1000)
+                body = json.dumps({"choices": choices}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def answer(self, content: str) -> str:
+        if "How many rounds" in content:
+            return str(self.rounds)
+        if "Alternatives:" in content:
+            return "current\nThe current response is already the best (stub evaluation)."
+        if "Response A:" in content:
+            # Pairwise evaluation: the current best is always response A
+            return "A\nResponse A is already the better one (stub evaluation)."
+        return f"Stub response {next(self._counter)}: " + " ".join(random.choice(["alpha", "beta", "gamma", "delta", "epsilon"]) for _ in range(40))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Measurements ---
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for an empty list)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def _children_rss_kb() -> Dict[int, int]:
+    """RSS of the cort-mcp processes started by this process (Linux /proc only)."""
+    rss = {}
+    if not os.path.isdir("/proc"):
+        return rss
+    me = os.getpid()
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if int(status.get("PPid", "0").strip()) == me and "cort" in cmdline and "VmRSS" in status:
+            rss[int(pid)] = int(status["VmRSS"].split()[0])
+    return rss
+
+
+def parse_mix(mix: Optional[str]) -> Dict[str, float]:
+    """Parse "tool=weight,tool=weight" into a weight map (all eight tools equally by default)."""
+    if not mix:
+        return {tool: 1.0 for tool in TOOLS}
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in TOOLS:
+            raise ValueError(f"Unknown tool in --mix: {name}")
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+# --- Driver ---
+
+async def run_load(args) -> Dict:
+    from mcp import ClientSession
+    from mcp.client.stdio import StdioServerParameters, stdio_client
+
+    stub = StubProvider(args.stub_latency_ms, args.stub_jitter_ms, args.stub_rounds)
+    stub.start()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "stub",
+        "OPENROUTER_API_KEY": "stub",
+        "CORT_OPENAI_BASE_URL": stub.url,
+        "CORT_OPENROUTER_BASE_URL": stub.url,
+    }
+    command = args.server_command.split()
+    params = StdioServerParameters(command=command[0], args=command[1:] + ["--log=off"] + args.server_arg, env=env)
+    weights = parse_mix(args.mix)
+    tools, tool_weights = list(weights), list(weights.values())
+    latencies: Dict[str, List[float]] = {tool: [] for tool in tools}
+    errors: Dict[str, int] = {tool: 0 for tool in tools}
+    lags: List[float] = []
+    memory: List[Dict] = []
+    request_ids = itertools.count()
+    stop = asyncio.Event()
+
+    async with AsyncExitStack() as stack:
+        sessions = []
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        for _ in range(args.instances):
+            read, write = await stack.enter_async_context(stdio_client(params, errlog=devnull))
+            session = await stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+            sessions.append(session)
+        baseline_rss = _children_rss_kb()
+        started = time.monotonic()
+
+        async def client(index: int):
+            session = sessions[index % len(sessions)]
+            while not stop.is_set():
+                request_id = next(request_ids)
+                if args.requests and request_id >= args.requests:
+                    stop.set()
+                    return
+                tool = random.choices(tools, tool_weights)[0]
+                arguments = {"prompt": f"Load test prompt #{request_id}: explain topic {request_id % 97}"}
+                if args.eval_mode:
+                    arguments["eval_mode"] = args.eval_mode
+                t0 = time.monotonic()
+                try:
+                    result = await session.call_tool(tool, arguments)
+                    # The flag is isError in mcp 1.x and is_error in later releases
+                    if result.is_error if hasattr(result, "is_error") else result.isError:
+                        errors[tool] += 1
+                        continue
+                except Exception:
+                    errors[tool] += 1
+                    continue
+                latencies[tool].append(time.monotonic() - t0)
+
+        async def probe_lag():
+            # A ping is answered by the server's event loop; blocking work in async tools shows up here
+            while not stop.is_set():
+                for session in sessions:
+                    t0 = time.monotonic()
+                    try:
+                        await session.send_ping()
+                        lags.append(time.monotonic() - t0)
+                    except Exception:
+                        pass
+                await asyncio.sleep(PING_INTERVAL)
+
+        async def sample_memory():
+            while not stop.is_set():
+                rss = _children_rss_kb()
+                memory.append({"t": round(time.monotonic() - started, 2), "rss_kb": sum(rss.values())})
+                await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+        async def timer():
+            if args.duration:
+                await asyncio.sleep(args.duration)
+                stop.set()
+
+        tasks = [asyncio.create_task(client(i)) for i in range(args.clients)]
+        monitors = [asyncio.create_task(probe_lag()), asyncio.create_task(sample_memory()), asyncio.create_task(timer())]
+        await asyncio.gather(*tasks)
+        stop.set()
+        elapsed = time.monotonic() - started
+        for task in monitors:
+            task.cancel()
+        await asyncio.gather(*monitors, return_exceptions=True)
+        final_rss = _children_rss_kb()
+    stub.stop()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    baseline_total = sum(baseline_rss.values())
+    return {
+        "clients": args.clients,
+        "instances": args.instances,
+        "elapsed_s": round(elapsed, 3),
+        "completed": len(all_latencies),
+        "errors": sum(errors.values()),
+        "throughput_rps": round(len(all_latencies) / elapsed, 3) if elapsed else None,
+        "latency_s": summarize(all_latencies),
+        "latency_by_tool_s": {tool: {**summarize(values), "errors": errors[tool]} for tool, values in latencies.items()},
+        "event_loop_lag_s": summarize(lags),
+        "memory": {
+            "start_rss_kb": baseline_total or None,
+            "end_rss_kb": sum(final_rss.values()) or None,
+            "growth_kb": (sum(final_rss.values()) - baseline_total) if baseline_total and final_rss else None,
+            "samples": memory,
+        },
+        "provider_requests": stub.requests,
+    }
+
+
+def _fmt(value: Optional[float], scale: float = 1000.0, unit: str = "ms") -> str:
+    return "-" if value is None else f"{value * scale:.1f}{unit}"
+
+
+def print_report(report: Dict) -> None:
+    latency = report["latency_s"]
+    lag = report["event_loop_lag_s"]
+    print(f"clients={report['clients']} instances={report['instances']} elapsed={report['elapsed_s']}s")
+    print(f"completed={report['completed']} errors={report['errors']} throughput={report['throughput_rps']} req/s provider_requests={report['provider_requests']}")
+    print(f"latency       p50={_fmt(latency['p50'])} p95={_fmt(latency['p95'])} p99={_fmt(latency['p99'])} max={_fmt(latency['max'])}")
+    print(f"loop lag      p50={_fmt(lag['p50'])} p95={_fmt(lag['p95'])} p99={_fmt(lag['p99'])} max={_fmt(lag['max'])}")
+    memory = report["memory"]
+    if memory["start_rss_kb"] is not None:
+        print(f"memory        start={memory['start_rss_kb']}kB end={memory['end_rss_kb']}kB growth={memory['growth_kb']}kB")
+    else:
+        print("memory        unavailable (requires Linux /proc)")
+    for tool, stats in report["latency_by_tool_s"].items():
+        print(f"  {tool:<40} n={stats['count']:<5} err={stats['errors']:<3} p50={_fmt(stats['p50'])} p95={_fmt(stats['p95'])} p99={_fmt(stats['p99'])}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Concurrent MCP client load generator for cort-mcp")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent simulated MCP clients (default: 8)")
+    parser.add_argument("--instances", type=int, default=1, help="Number of cort-mcp server processes; clients are spread over them (default: 1)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (default: 30; 0 runs until --requests are done)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many tool calls (default: 0, unlimited)")
+    parser.add_argument("--mix", type=str, default=None, help="Weighted tool mix, e.g. 'cort.think.simple=3,cort.think.details=1' (default: all eight tools equally)")
+    parser.add_argument("--server-command", type=str, default=f"{sys.executable} -m cort_mcp.server", help="Command starting the stdio server (--log=off is appended)")
+    parser.add_argument("--server-arg", action="append", default=[], help="Extra argument for the server command (repeatable)")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0, help="Latency of each stubbed provider call (default: 50)")
+    parser.add_argument("--stub-jitter-ms", type=float, default=10.0, help="Uniform jitter added to the stub latency (default: 10)")
+    parser.add_argument("--stub-rounds", type=int, default=1, help="Thinking rounds the stub asks for (default: 1)")
+    parser.add_argument("--eval-mode", choices=["batch", "pairwise"], default=None, help="eval_mode passed to every tool call (default: the server default)")
+    parser.add_argument("--json", type=str, default=None, help="Also write the full report (including memory samples) to this JSON file")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("either --duration or --requests must be set")
+
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
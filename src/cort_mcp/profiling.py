@@ -0,0 +1,230 @@
+import cProfile
+import contextlib
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Directory profiles are written to unless one is configured
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "cort-profiles")
+# Seconds between two wall-clock stack samples
+SAMPLE_INTERVAL = 0.005
+
+# Since Python 3.12 cProfile is built on sys.monitoring, so a profiler sees every thread and
+# only one can be enabled in the whole interpreter at a time
+INTERPRETER_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+_enabled = False
+_directory = DEFAULT_PROFILE_DIR
+_sequence = itertools.count(1)
+# The profile of the run the current thread works for (set on the engine thread and on worker threads)
+_current = threading.local()
+# Held by the profiled call owning the interpreter-wide profiler (INTERPRETER_WIDE_PROFILER only)
+_profiler_lock = threading.Lock()
+
+
+def configure_profiling(enabled: bool = False, directory: Optional[str] = None) -> None:
+    """Profile every thinking call (enabled) and choose the output directory for profiles."""
+    global _enabled, _directory
+    _enabled = enabled
+    _directory = directory or DEFAULT_PROFILE_DIR
+
+
+def profiling_enabled() -> bool:
+    return _enabled
+
+
+def current_profile() -> Optional["RunProfile"]:
+    """The profile of the run executing on this thread, or None when it is not profiled."""
+    return getattr(_current, "profile", None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RunProfile:
+    """CPU profile and wall-clock stage breakdown of one thinking call.
+
+    Used as a context manager around the call on the thread that runs it. The
+    engine thread and every worker task started through run_parallel are profiled
+    with cProfile and their stats are merged into one pstats file. On Python 3.12+
+    cProfile can only profile the whole interpreter: the call then runs a single
+    profiler that also records unrelated threads, and profiled calls wait for each
+    other so that each one gets its own profile. A sampler thread
+    records the stacks of the same threads every SAMPLE_INTERVAL seconds into a
+    collapsed-stack file (one "frame;frame;... count" line per stack, the input of
+    flamegraph tools); unlike the pstats file it also shows where threads wait.
+
+    The report separates Python time (CPU time of the run's threads) from time spent
+    waiting for provider responses, per stage.
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.name = name
+        self.directory = directory or _directory
+        self.interpreter_wide = INTERPRETER_WIDE_PROFILER
+        self._lock = threading.Lock()
+        self._threads: Dict[int, int] = {}
+        self._profilers = []
+        self._samples: Counter = Counter()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._cpu_seconds = 0.0
+        self._stop = threading.Event()
+        self._report: Optional[Dict[str, Any]] = None
+
+    def __enter__(self) -> "RunProfile":
+        if self.interpreter_wide:
+            _profiler_lock.acquire()
+        self._previous = current_profile()
+        _current.profile = self
+        self._sampler = threading.Thread(target=self._sample, name="cort-profile-sampler", daemon=True)
+        self._sampler.start()
+        self._started = time.perf_counter()
+        self._main = self._enter_thread(profile=True)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._leave_thread(self._main)
+        if self.interpreter_wide:
+            _profiler_lock.release()
+        wall = time.perf_counter() - self._started
+        self._stop.set()
+        self._sampler.join()
+        _current.profile = self._previous
+        try:
+            self._report = self._write(wall)
+        except OSError as e:
+            logger.error(f"Could not write profile of {self.name} to {self.directory}: {e}")
+            self._report = self._breakdown(wall)
+
+    def _enter_thread(self, profile: bool = False):
+        """Start measuring the current thread (with its own profiler when profile is set
+        or each thread needs one)."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+        profiler = None
+        if profile or not self.interpreter_wide:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active, e.g. one wrapped around the whole server
+                profiler = None
+        return profiler, time.thread_time()
+
+    def _leave_thread(self, state) -> None:
+        profiler, cpu_started = state
+        if profiler is not None:
+            profiler.disable()
+        ident = threading.get_ident()
+        with self._lock:
+            self._cpu_seconds += time.thread_time() - cpu_started
+            if profiler is not None:
+                self._profilers.append(profiler)
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    def wrap(self, fn: Callable) -> Callable:
+        """fn, profiled as part of this run when called on a worker thread."""
+        def profiled(*args, **kwargs):
+            previous = current_profile()
+            _current.profile = self
+            state = self._enter_thread()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._leave_thread(state)
+                _current.profile = previous
+        return profiled
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Measure the wall-clock time the engine thread spends in a stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, wall_seconds=time.perf_counter() - started)
+
+    def network(self, stage: Optional[str], seconds: float) -> None:
+        """Count one provider call and the time spent waiting for its response."""
+        self._add(stage or "other", network_seconds=seconds, calls=1)
+
+    def _add(self, stage: str, **amounts) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"wall_seconds": 0.0, "network_seconds": 0.0, "calls": 0})
+            for key, amount in amounts.items():
+                entry[key] += amount
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            frames = sys._current_frames()
+            with self._lock:
+                idents = [ident for ident in self._threads if ident != own]
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    self._samples[";".join(reversed(stack))] += 1
+
+    def _breakdown(self, wall: float) -> Dict[str, Any]:
+        stages = {name: {key: round(value, 4) if isinstance(value, float) else value for key, value in entry.items()}
+                  for name, entry in self._stages.items()}
+        staged = sum(entry["wall_seconds"] for entry in self._stages.values())
+        return {
+            "wall_seconds": round(wall, 4),
+            # Python time of the engine thread and the worker tasks of this run
+            "cpu_seconds": round(self._cpu_seconds, 4),
+            # Summed over concurrent calls, so it can exceed wall_seconds
+            "network_seconds": round(sum(entry["network_seconds"] for entry in self._stages.values()), 4),
+            "unstaged_seconds": round(max(wall - staged, 0.0), 4),
+            "stages": stages,
+        }
+
+    def _write(self, wall: float) -> Dict[str, Any]:
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", self.name)
+        base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}-{os.getpid()}-{next(_sequence)}")
+        report = self._breakdown(wall)
+        report["files"] = {}
+        if self._profilers:
+            stats = pstats.Stats(*self._profilers)
+            stats.dump_stats(base + ".pstats")
+            report["files"]["pstats"] = base + ".pstats"
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in self._samples.most_common():
+                f.write(f"{stack} {count}\n")
+        report["files"]["collapsed"] = base + ".collapsed"
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({"name": self.name, **report}, f, indent=1)
+        report["files"]["breakdown"] = base + ".json"
+        logger.info(f"Profile of {self.name} written to {base}.*")
+        return report
+
+    def report(self) -> Optional[Dict[str, Any]]:
+        """Stage breakdown and file paths (available once the context has exited)."""
+        return self._report
+
+
+def profile_stage(name: str):
+    """Stage timer of the current thread's profile, or a no-op context when the run is not profiled."""
+    profile = current_profile()
+    return profile.stage(name) if profile is not None else contextlib.nullcontext()
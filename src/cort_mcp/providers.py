@@ -0,0 +1,176 @@
+import copy
+import logging
+import os
+import threading
+from typing import Dict, Any, List, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Fields a provider entry may set in the providers file
+PROVIDER_FIELDS = ("base_url", "api_key_env", "api_key", "auth", "headers", "payload", "default_model", "mixed_models", "supports_n",
+                   "supports_reasoning", "max_tokens_field")
+AUTH_MODES = ("bearer", "none")
+
+# Built-in OpenAI-compatible chat completion endpoints.
+# base_url_env lets a single endpoint be redirected without a providers file.
+BUILTIN_PROVIDERS: Dict[str, Dict[str, Any]] = {
+    "openai": {
+        "base_url": "https://api.openai.com/v1/chat/completions",
+        "base_url_env": "CORT_OPENAI_BASE_URL",
+        "api_key_env": "OPENAI_API_KEY",
+        "auth": "bearer",
+        "headers": {},
+        "payload": {},
+        "supports_n": True,
+        "default_model": "gpt-4.1-nano",
+    },
+    "openrouter": {
+        "base_url": "https://openrouter.ai/api/v1/chat/completions",
+        "base_url_env": "CORT_OPENROUTER_BASE_URL",
+        "api_key_env": "OPENROUTER_API_KEY",
+        "auth": "bearer",
+        "headers": {
+            "HTTP-Referer": "http://localhost:3000",
+            "X-Title": "Recursive Thinking Chat",
+        },
+        "payload": {"reasoning": {"max_tokens": 10386}},
+        # Stage limits may replace the reasoning budget above
+        "supports_reasoning": True,
+        # OpenRouter forwards n only to some upstream providers
+        "supports_n": False,
+        "default_model": "mistralai/mistral-small-3.1-24b-instruct:free",
+    },
+    # Local inference servers (no API key needed with their default settings)
+    "vllm": {
+        "base_url": "http://127.0.0.1:8000/v1/chat/completions",
+        "base_url_env": "CORT_VLLM_BASE_URL",
+        "api_key_env": "VLLM_API_KEY",
+        "auth": "none",
+        "headers": {},
+        "payload": {},
+        "supports_n": True,
+    },
+    "llamacpp": {
+        "base_url": "http://127.0.0.1:8080/v1/chat/completions",
+        "base_url_env": "CORT_LLAMACPP_BASE_URL",
+        "api_key_env": "LLAMACPP_API_KEY",
+        "auth": "none",
+        "headers": {},
+        "payload": {},
+        "supports_n": False,
+    },
+    "ollama": {
+        "base_url": "http://127.0.0.1:11434/v1/chat/completions",
+        "base_url_env": "CORT_OLLAMA_BASE_URL",
+        "api_key_env": None,
+        "auth": "none",
+        "headers": {},
+        "payload": {},
+        "supports_n": False,
+    },
+}
+
+_lock = threading.Lock()
+_providers: Dict[str, Dict[str, Any]] = copy.deepcopy(BUILTIN_PROVIDERS)
+
+
+def load_providers_file(path: str) -> Dict[str, Dict[str, Any]]:
+    """Read provider entries from a YAML or JSON file.
+
+    The file holds a "providers" mapping of provider name to entry. Entries for a
+    built-in provider override its fields; other names define new providers and
+    must set base_url.
+
+    Raises:
+        ValueError: If the file does not describe valid providers
+    """
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    entries = data.get("providers") if isinstance(data, dict) else None
+    if not isinstance(entries, dict):
+        raise ValueError(f"{path}: expected a 'providers' mapping")
+    for name, entry in entries.items():
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: provider {name!r} must be a mapping")
+        unknown = set(entry) - set(PROVIDER_FIELDS)
+        if unknown:
+            raise ValueError(f"{path}: provider {name!r} has unknown fields {sorted(unknown)}")
+        if name not in BUILTIN_PROVIDERS and not entry.get("base_url"):
+            raise ValueError(f"{path}: provider {name!r} needs a base_url")
+        if entry.get("auth", "bearer") not in AUTH_MODES:
+            raise ValueError(f"{path}: provider {name!r} auth must be one of {AUTH_MODES}")
+    return entries
+
+
+def configure_providers(path: Optional[str] = None) -> None:
+    """Reset the registry to the built-in providers and apply a providers file, if any."""
+    providers = copy.deepcopy(BUILTIN_PROVIDERS)
+    if path:
+        for name, entry in load_providers_file(path).items():
+            spec = providers.setdefault(name, {"auth": "bearer", "headers": {}, "payload": {}, "supports_n": False})
+            if "base_url" in entry:
+                # An explicit base URL wins over the environment override
+                spec.pop("base_url_env", None)
+            spec.update(copy.deepcopy(entry))
+        logger.info(f"Loaded providers from {path}: {sorted(providers)}")
+    global _providers
+    with _lock:
+        _providers = providers
+
+
+def get_provider(name: str) -> Optional[Dict[str, Any]]:
+    """Resolved settings of a provider (base URL and headers with overrides applied), or None if unknown."""
+    with _lock:
+        spec = _providers.get(name)
+    if spec is None:
+        return None
+    base_url = spec["base_url"]
+    if spec.get("base_url_env"):
+        base_url = os.getenv(spec["base_url_env"], base_url)
+    return {
+        "name": name,
+        "base_url": base_url,
+        "auth": spec.get("auth", "bearer"),
+        # Header values may reference environment variables, e.g. "${MY_GATEWAY_TOKEN}"
+        "headers": {key: os.path.expandvars(str(value)) for key, value in spec.get("headers", {}).items()},
+        "payload": copy.deepcopy(spec.get("payload", {})),
+        "supports_n": bool(spec.get("supports_n", False)),
+        "supports_reasoning": bool(spec.get("supports_reasoning", False)),
+        "max_tokens_field": spec.get("max_tokens_field", "max_tokens"),
+        "default_model": spec.get("default_model"),
+    }
+
+
+def provider_names() -> List[str]:
+    with _lock:
+        return list(_providers)
+
+
+def provider_api_key(name: str) -> Optional[str]:
+    """API key of a provider from its environment variable (or the providers file), if set."""
+    with _lock:
+        spec = _providers.get(name)
+    if spec is None:
+        return None
+    if spec.get("api_key_env"):
+        key = os.getenv(spec["api_key_env"])
+        if key:
+            return key
+    return spec.get("api_key")
+
+
+def provider_available(name: str) -> bool:
+    """Whether a provider is known and has the credentials it needs."""
+    spec = get_provider(name)
+    if spec is None:
+        return False
+    return spec["auth"] == "none" or bool(provider_api_key(name))
+
+
+def mixed_models() -> List[Dict[str, str]]:
+    """Models that providers contribute to the mixed-LLM pool (their mixed_models entries)."""
+    with _lock:
+        return [{"provider": name, "model": model}
+                for name, spec in _providers.items() for model in spec.get("mixed_models", [])]
@@ -1,11 +1,462 @@
 import requests
+import contextlib
+import hashlib
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable
+
+try:
+    from .cancellation import CancellableHTTPAdapter, CancelToken, RunCancelled, current_cancel_token
+    from .cassette import CassetteMiss
+    from .profiling import current_profile, profile_stage
+    from .providers import get_provider
+    from .similarity import estimate_similarity, minhash_signature
+except ImportError:
+    from cancellation import CancellableHTTPAdapter, CancelToken, RunCancelled, current_cancel_token
+    from cassette import CassetteMiss
+    from profiling import current_profile, profile_stage
+    from providers import get_provider
+    from similarity import estimate_similarity, minhash_signature
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Upper bound for num_alternatives exposed on the MCP tools
+MAX_ALTERNATIVES = 32
+# Number of alternatives the evaluator sees in a single prompt.
+# Wider rounds are split into shards and the shard winners are merged hierarchically.
+EVAL_SHARD_SIZE = 4
+# Upper bound for concurrent provider calls issued by a single round
+MAX_PARALLEL_CALLS = 8
+# Upper bound for thinking rounds (also the round budget of deadline-driven runs)
+MAX_ROUNDS = 5
+# Cascade runs call the escalation tier when the judge's confidence in the final response is below this (0-1)
+DEFAULT_ESCALATION_THRESHOLD = 0.7
+# Latency assumed for a model before any call to it has been observed (seconds)
+DEFAULT_CALL_LATENCY = 10.0
+# Weight of the newest observation in the per-model latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+
+
+# Size of the per-process HTTP connection pool (per provider host)
+HTTP_POOL_SIZE = 32
+
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def get_http_session() -> requests.Session:
+    """Process-wide HTTP session so provider connections stay warm across calls and requests."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            # Connections can be aborted mid-request when a run is cancelled
+            adapter = CancellableHTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _reset_http_session() -> None:
+    """Drop the inherited session in forked worker processes; pooled sockets must not be shared."""
+    global _session, _session_lock
+    _session_lock = threading.Lock()
+    _session = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_http_session)
+
+
+# Alternatives at least this similar to the current best or to an earlier alternative are
+# collapsed before evaluation (None disables the check)
+DEFAULT_DEDUP_THRESHOLD = 0.9
+# Evaluation strategies selectable per run
+EVAL_MODES = ("batch", "pairwise")
+# Consecutive pairwise wins after which the incumbent is considered settled
+DEFAULT_PAIRWISE_LEAD = 6
+
+# Instruction following the current response when generating alternatives
+ALTERNATIVE_PROMPT = "Generate an alternative response to my previous message that might be better than your current response. Be creative and consider different approaches.\nAlternative response:"
+# Appended to the alternative prompt when a near-duplicate is regenerated
+DUPLICATE_PERTURBATION = "\n\nA previous attempt was nearly identical to an existing response. Take a clearly different approach: change the structure, the angle or the examples."
+
+# How alternatives are produced: "full" regenerates the whole response, "edit" asks for
+# SEARCH/REPLACE blocks against the current response and applies them locally
+ALTERNATIVE_MODES = ("full", "edit")
+# Instruction following the current response in edit mode
+EDIT_PROMPT = """Improve your previous response with targeted edits instead of rewriting it. Be creative and fix what matters most: errors, gaps, unclear or weak parts.
+Write each edit as a block in exactly this format:
+<<<<<<< SEARCH
+exact text copied from your previous response
+=======
+improved text
+>>>>>>> REPLACE
+Output only the edit blocks."""
+# Responses shorter than this (characters) are regenerated in full even in edit mode
+EDIT_MIN_LENGTH = 800
+EDIT_BLOCK = re.compile(r"<{7} ?SEARCH[ \t]*\n(.*?)\n={7}[ \t]*\n(.*?)\n?>{7} ?REPLACE", re.DOTALL)
+
+_dedup_settings = {"threshold": DEFAULT_DEDUP_THRESHOLD, "regenerate": False}
+_alternative_mode = "full"
+
+
+def configure_dedup(threshold: Optional[float] = DEFAULT_DEDUP_THRESHOLD, regenerate: bool = False) -> None:
+    """Configure near-duplicate collapsing of alternatives.
+
+    Args:
+        threshold: Estimated similarity at or above which an alternative is a duplicate (None disables)
+        regenerate: Whether to try once to replace each duplicate using a perturbed prompt
+    """
+    _dedup_settings["threshold"] = threshold
+    _dedup_settings["regenerate"] = regenerate
+
+
+def configure_alternative_mode(mode: str = "full") -> None:
+    """Set the process-wide alternative mode (one of ALTERNATIVE_MODES), used when a run does not choose one."""
+    if mode not in ALTERNATIVE_MODES:
+        raise ValueError(f"alternative mode must be one of {ALTERNATIVE_MODES}, got {mode!r}")
+    global _alternative_mode
+    _alternative_mode = mode
+
+
+def apply_edits(text: str, answer: str) -> Optional[str]:
+    """Apply the SEARCH/REPLACE blocks of an edit answer to text.
+
+    Each search text must occur exactly once, either verbatim or with its
+    surrounding whitespace stripped; an ambiguous search does not apply.
+
+    Returns:
+        The edited text, or None when the answer holds no blocks or a block does not apply
+    """
+    blocks = EDIT_BLOCK.findall(answer)
+    if not blocks:
+        return None
+    for search, replacement in blocks:
+        if not search.strip():
+            return None
+        if search not in text:
+            search = search.strip()
+            replacement = replacement.strip()
+        if text.count(search) != 1:
+            return None
+        text = text.replace(search, replacement)
+    return text
+
+
+def perturbed_temperature(temperature: float) -> float:
+    """Temperature used when regenerating a duplicate alternative generated at temperature."""
+    return round(min(temperature + 0.2, 1.5), 1)
+
+
+def dedup_alternatives(current_best: str, alternatives: List[str], regenerate: Optional[Callable[[int], Optional[Dict[str, Any]]]] = None,
+                       exact: bool = False):
+    """Collapse alternatives that nearly duplicate current_best or an earlier alternative.
+
+    Args:
+        current_best: The incumbent response
+        alternatives: The candidate responses
+        regenerate: Optional callable producing a replacement alternative (a dict with its
+            "response" text) for the alternative at an index, or None on failure. Only used
+            when regeneration is enabled.
+        exact: Only collapse exact copies (for edited alternatives, which share most of
+            their text with current_best by design)
+
+    Returns:
+        A tuple of (indices of the alternatives to evaluate, {index: replacement} for the
+        regenerated ones among them, {"deduplicated": n, "regenerated": m})
+    """
+    threshold = _dedup_settings["threshold"]
+    stats = {"deduplicated": 0, "regenerated": 0}
+    if threshold is None or not alternatives:
+        return list(range(len(alternatives))), {}, stats
+    if exact:
+        seen_texts = {current_best}
+        kept = []
+        for i, alternative in enumerate(alternatives):
+            if alternative not in seen_texts:
+                seen_texts.add(alternative)
+                kept.append(i)
+        stats["deduplicated"] = len(alternatives) - len(kept)
+        return kept, {}, stats
+    seen = [minhash_signature(current_best)]
+
+    def is_duplicate(signature):
+        return any(estimate_similarity(signature, other) >= threshold for other in seen)
+
+    kept, duplicates, replacements = [], [], {}
+    for i, alternative in enumerate(alternatives):
+        signature = minhash_signature(alternative)
+        if is_duplicate(signature):
+            duplicates.append(i)
+        else:
+            seen.append(signature)
+            kept.append(i)
+    if duplicates and regenerate is not None and _dedup_settings["regenerate"]:
+        logger.info(f"Regenerating {len(duplicates)} near-duplicate alternatives")
+        for i, replacement in zip(duplicates, run_parallel(regenerate, duplicates)):
+            if replacement is None:
+                continue
+            signature = minhash_signature(replacement["response"])
+            if not is_duplicate(signature):
+                replacements[i] = replacement
+                seen.append(signature)
+                kept.append(i)
+                stats["regenerated"] += 1
+        kept.sort()
+    stats["deduplicated"] = len(alternatives) - len(kept)
+    if stats["deduplicated"]:
+        logger.info(f"Dropped {stats['deduplicated']} near-duplicate alternatives before evaluation")
+    return kept, replacements, stats
+
+
+# Rounds run on top of an answer seeded from the answer store (unless rounds are given explicitly)
+SEEDED_ROUNDS = 1
+ANSWER_STORE_MODES = ("off", "reuse", "seed")
+
+# Opt-in answer store shared by all runs in this process (see configure_answer_store)
+_answer_store = None
+_answer_store_mode = "off"
+
+
+# Generation stages with their own limits
+STAGES = ("rounds", "base", "alternatives", "evaluation")
+STAGE_LIMIT_FIELDS = ("reasoning", "max_tokens", "stop")
+# reasoning: reasoning token budget (0 disables reasoning, None keeps the provider default)
+# max_tokens: cap on output tokens (None for no cap); stop: stop sequences (not sent to providers
+# with supports_reasoning, whose replies may open with a newline). OpenAI's o-series models reject
+# max_tokens and stop: use max_tokens_field: max_completion_tokens and clear stop for them
+DEFAULT_STAGE_LIMITS = {
+    # The meta call only has to answer with a single digit
+    "rounds": {"reasoning": 0, "max_tokens": 16, "stop": ["\n"]},
+    "base": {"reasoning": None, "max_tokens": None, "stop": None},
+    "alternatives": {"reasoning": None, "max_tokens": None, "stop": None},
+    # A choice plus a short explanation; the cap stays above the reasoning budget because some
+    # providers count reasoning toward it (and reject budgets that reach it)
+    "evaluation": {"reasoning": 1024, "max_tokens": 1536, "stop": None},
+}
+
+_stage_limits = {stage: dict(limits) for stage, limits in DEFAULT_STAGE_LIMITS.items()}
+
+
+def merge_stage_limits(base: Dict[str, Dict[str, Any]], overrides: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Apply per-stage overrides (only the fields they set) on top of base limits.
+
+    Raises:
+        ValueError: If a stage, field or value is invalid, or a stage's reasoning budget
+            is not below its max_tokens
+    """
+    merged = {stage: dict(limits) for stage, limits in base.items()}
+    for stage, limits in (overrides or {}).items():
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r}; stages are {STAGES}")
+        if not isinstance(limits, dict):
+            raise ValueError(f"Limits of stage {stage!r} must be a mapping")
+        for field, value in limits.items():
+            if field not in STAGE_LIMIT_FIELDS:
+                raise ValueError(f"Unknown limit {field!r} for stage {stage!r}; limits are {STAGE_LIMIT_FIELDS}")
+            if field in ("reasoning", "max_tokens") and value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < (0 if field == "reasoning" else 1)):
+                raise ValueError(f"{stage}.{field} must be {'a non-negative' if field == 'reasoning' else 'a positive'} integer or null")
+            if field == "stop" and value is not None:
+                if isinstance(value, str):
+                    value = [value]
+                if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                    raise ValueError(f"{stage}.stop must be a string, a list of strings or null")
+            merged[stage][field] = value
+    for stage, limits in merged.items():
+        reasoning, max_tokens = limits.get("reasoning"), limits.get("max_tokens")
+        if reasoning and max_tokens is not None and reasoning >= max_tokens:
+            raise ValueError(f"{stage}.reasoning ({reasoning}) must be below {stage}.max_tokens ({max_tokens}); "
+                             "some providers count reasoning toward max_tokens or reject the budget")
+    return merged
+
+
+def configure_stage_limits(overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    """Set the process-wide stage limits to the defaults with overrides applied."""
+    global _stage_limits
+    _stage_limits = merge_stage_limits(DEFAULT_STAGE_LIMITS, overrides)
+
+
+def get_stage_limits() -> Dict[str, Dict[str, Any]]:
+    """The process-wide stage limits."""
+    return _stage_limits
+
+
+_adaptive_policy = None
+
+
+def configure_adaptive(policy) -> None:
+    """Use an AdaptivePolicy (or None to disable) to plan and learn alternative settings."""
+    global _adaptive_policy
+    _adaptive_policy = policy
+
+
+def get_adaptive_policy():
+    """The configured AdaptivePolicy, or None."""
+    return _adaptive_policy
+
+
+def configure_answer_store(store, mode: str) -> None:
+    """Enable answer reuse across runs.
+
+    Args:
+        store: An AnswerStore instance (or None to disable)
+        mode: "reuse" returns a stored answer for similar prompts as-is,
+            "seed" starts the run from it with fewer rounds, "off" disables the store
+    """
+    global _answer_store, _answer_store_mode
+    if mode not in ANSWER_STORE_MODES:
+        raise ValueError(f"answer store mode must be one of {ANSWER_STORE_MODES}, got {mode!r}")
+    _answer_store = store if mode != "off" else None
+    _answer_store_mode = mode if store is not None else "off"
+
+
+def lookup_stored_answer(prompt: str, scope: str = "") -> Optional[Dict[str, Any]]:
+    """Stored answer for a similar prompt of the same scope (with the store "mode" added), or None."""
+    if _answer_store is None:
+        return None
+    stored = _answer_store.lookup(prompt, scope)
+    if stored is None:
+        return None
+    return {**stored, "mode": _answer_store_mode}
+
+
+def remember_answer(prompt: str, response: str, model: str, provider: str, scope: str = "") -> None:
+    """Add a final answer to the answer store, if one is configured."""
+    if _answer_store is None or not response or response.startswith("Error:"):
+        return
+    _answer_store.add(prompt, response, model, provider, scope)
+
+
+def stored_answer_report(stored: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary of an answer store hit as reported in results."""
+    return {"mode": stored["mode"], "similarity": round(stored["similarity"], 3), "matched_prompt": stored["prompt"]}
+
+
+# Cassette that records or replays provider exchanges (see configure_cassette)
+_cassette = None
+
+
+def configure_cassette(cassette) -> None:
+    """Route provider calls through a Cassette (record or replay mode), or back to the network with None."""
+    global _cassette
+    _cassette = cassette
+
+
+def _compact_body(body: Any) -> Any:
+    """The parts of a provider response body worth keeping in a cassette."""
+    if isinstance(body, dict) and "choices" in body:
+        return {key: body[key] for key in ("choices", "usage") if key in body}
+    return body
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a provider call cannot complete before the run's deadline."""
+
+
+_latency_lock = threading.Lock()
+_latency_ewma: Dict[tuple, float] = {}
+
+
+def record_latency(provider: str, model: str, seconds: float) -> None:
+    """Fold an observed call latency into the per-model moving average."""
+    key = (provider, model)
+    with _latency_lock:
+        previous = _latency_ewma.get(key)
+        _latency_ewma[key] = seconds if previous is None else previous + LATENCY_EWMA_ALPHA * (seconds - previous)
+
+
+def estimate_latency(provider: str, model: str) -> float:
+    """Expected latency of one call to the given model (seconds)."""
+    with _latency_lock:
+        return _latency_ewma.get((provider, model), DEFAULT_CALL_LATENCY)
+
+
+def _eval_levels(num_alternatives: int) -> int:
+    """Number of sequential evaluator calls needed to judge num_alternatives candidates."""
+    levels = 1
+    while num_alternatives > EVAL_SHARD_SIZE:
+        num_alternatives = math.ceil(num_alternatives / EVAL_SHARD_SIZE)
+        levels += 1
+    return levels
+
+
+def plan_alternatives(remaining: float, alt_latency: float, eval_latency: float, requested: int) -> int:
+    """Largest number of alternatives (up to requested) whose round is expected to fit in remaining seconds.
+
+    Returns 0 when not even a single-alternative round is expected to finish in time.
+    """
+    for n in range(requested, 0, -1):
+        waves = math.ceil(n / MAX_PARALLEL_CALLS)
+        if waves * alt_latency + _eval_levels(n) * eval_latency <= remaining:
+            return n
+    return 0
+
+
+def alternative_temperature(index: int) -> float:
+    """Temperature for the alternative at the given slot (0.7, 0.8, ... 1.2, then wraps around)."""
+    return round(0.7 + (index % 6) * 0.1, 1)
+
+
+def sample_temperature(temperatures: List[float]) -> float:
+    """Temperature for a single request returning one sample per slot (the mean of the slot temperatures)."""
+    return round(sum(temperatures) / len(temperatures), 2)
+
+
+def run_parallel(fn: Callable, items: List[Any], max_workers: int = MAX_PARALLEL_CALLS) -> List[Any]:
+    """Apply fn to every item concurrently and return the results in input order."""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    profile = current_profile()
+    if profile is not None:
+        # Worker threads of a profiled run are profiled as part of it
+        fn = profile.wrap(fn)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+
+def parse_evaluation(evaluation: str, num_alternatives: int):
+    """Parse an evaluator answer into (selected index, explanation).
+
+    The selected index is -1 when the current best is kept or the answer cannot be parsed.
+    """
+    lines = [line.strip() for line in evaluation.split('\n') if line.strip()]
+    explanation_text = "No explanation provided"
+    if not lines:
+        return -1, explanation_text
+    if len(lines) > 1:
+        explanation_text = ' '.join(lines[1:])
+    first_line = lines[0].lower()
+    if 'current' in first_line:
+        return -1, explanation_text
+    match = re.search(r"\d+", first_line)
+    if not match:
+        return -1, explanation_text
+    idx = int(match.group()) - 1
+    if 0 <= idx < num_alternatives:
+        return idx, explanation_text
+    logger.info("Invalid selection, keeping current response")
+    return -1, explanation_text
+
+def parse_confidence(answer: str) -> Optional[float]:
+    """Parse a 0-10 confidence rating into 0-1, or None when the answer holds no rating."""
+    if answer.startswith("Error:"):
+        return None
+    match = re.search(r"\d+(?:\.\d+)?", answer)
+    if not match:
+        return None
+    return min(max(float(match.group()) / 10, 0.0), 1.0)
+
 class EnhancedRecursiveThinkingChat:
     def __init__(self, api_key: str, model: str, provider: str = "openai"):
         """Initialize the Enhanced Recursive Thinking Chat.
@@ -13,57 +464,176 @@ class EnhancedRecursiveThinkingChat:
         Args:
             api_key: The API key for the provider
             model: The model name to use
-            provider: The provider to use ("openai" or "openrouter")
+            provider: The provider to use (a name from the provider registry, e.g. "openai",
+                "openrouter" or a local server such as "vllm")
+
+        Raises:
+            ValueError: If the provider is not in the registry
         """
         self.api_key = api_key
         self.model = model
         self.provider = provider
-        if provider == "openai":
-            self.base_url = "https://api.openai.com/v1/chat/completions"
-            self.headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-        else:
-            self.base_url = "https://openrouter.ai/api/v1/chat/completions"
-            self.headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "HTTP-Referer": "http://localhost:3000",
-                "X-Title": "Recursive Thinking Chat",
-                "Content-Type": "application/json"
-            }
+        spec = get_provider(provider)
+        if spec is None:
+            raise ValueError(f"Unknown provider: {provider}")
+        self.base_url = spec["base_url"]
+        self.headers = {"Content-Type": "application/json", **spec["headers"]}
+        if spec["auth"] == "bearer" or self.api_key:
+            self.headers["Authorization"] = f"Bearer {self.api_key}"
+        # Provider-specific request options merged into every payload
+        self.payload_options = spec["payload"]
+        # Whether one request can return several samples (the "n" parameter)
+        self.supports_n = spec["supports_n"]
+        # Whether the provider takes a reasoning token budget, and its name for the output cap
+        self.supports_reasoning = spec["supports_reasoning"]
+        self.max_tokens_field = spec["max_tokens_field"]
+        # Per-stage generation limits of the current run (None uses the process-wide limits)
+        self.stage_limits: Optional[Dict[str, Dict[str, Any]]] = None
         self.conversation_history = []
+        # Monotonic time after which provider calls are abandoned (set by deadline-aware runs)
+        self.deadline: Optional[float] = None
+        # Cancellation of the current run; in-flight requests are aborted when it is cancelled
+        self.cancel_token: Optional[CancelToken] = None
+        # Calls, latency and token usage of this client (the per-tier metrics of cascade runs)
+        self.usage = {"calls": 0, "errors": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
 
-    def _call_api(self, messages: List[Dict], temperature: float = 0.7, stream: bool = False) -> str:
+    def _call_api(self, messages: List[Dict], temperature: float = 0.7, stream: bool = False, stage: Optional[str] = None) -> str:
         """Make an API call to the provider.
         
         Args:
             messages: The messages to send to the API
             temperature: The temperature to use
             stream: Whether to stream the response
+            stage: The generation stage (one of STAGES) whose limits apply, if any
             
         Returns:
             The response from the API
+
+        Raises:
+            DeadlineExceeded: If a deadline is set and the call cannot finish before it
+            RunCancelled: If the run is cancelled before or during the call
+        """
+        return self._request(messages, temperature, n=1, stage=stage)[0]
+
+    def _call_api_samples(self, messages: List[Dict], temperature: float, n: int, stage: Optional[str] = None) -> List[str]:
+        """Request n samples for the same messages in a single API call.
+
+        Only meaningful for providers with supports_n. Providers may return fewer
+        samples than requested; on failure the list holds a single "Error: ..." entry.
+
+        Raises:
+            DeadlineExceeded: If a deadline is set and the call cannot finish before it
         """
-        logger.debug(f"Making API call with {len(messages)} messages, temperature={temperature}")
+        return self._request(messages, temperature, n=n, stage=stage)
+
+    def _apply_limits(self, payload: Dict[str, Any], stage: Optional[str]) -> None:
+        """Add the stage's reasoning budget, output cap and stop sequences to a payload."""
+        if stage is None:
+            return
+        limits = (self.stage_limits or _stage_limits)[stage]
+        if limits["reasoning"] is not None and self.supports_reasoning:
+            payload["reasoning"] = {"max_tokens": limits["reasoning"]} if limits["reasoning"] > 0 else {"enabled": False}
+        if limits["max_tokens"] is not None:
+            payload[self.max_tokens_field] = limits["max_tokens"]
+        if limits["stop"] and not self.supports_reasoning:
+            payload["stop"] = limits["stop"]
+
+    def _request(self, messages: List[Dict], temperature: float, n: int, stage: Optional[str] = None) -> List[str]:
+        logger.debug(f"Making API call with {len(messages)} messages, temperature={temperature}, n={n}, stage={stage}")
         
         payload = {
+            **self.payload_options,
             "model": self.model,
             "messages": messages,
             "temperature": temperature,
         }
-        if self.provider != "openai":
-            payload["reasoning"] = {"max_tokens": 10386}
+        if n > 1:
+            payload["n"] = n
+        self._apply_limits(payload, stage)
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline - time.monotonic()
+            if timeout <= 0:
+                raise DeadlineExceeded("deadline reached before the call was sent")
         try:
             logger.debug(f"Sending request to {self.base_url}")
-            response = requests.post(self.base_url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            content = response.json()['choices'][0]['message']['content'].strip()
-            logger.debug(f"Received response with {len(content)} characters")
-            return content
+            started = time.monotonic()
+            call = self.cancel_token.http_call() if self.cancel_token is not None else contextlib.nullcontext()
+            try:
+                with call:
+                    body = self._post(payload, timeout)
+            finally:
+                profile = current_profile()
+                if profile is not None:
+                    profile.network(stage, time.monotonic() - started)
+            # Reasoning models may spend the whole output cap on reasoning and return no content
+            contents = [(choice['message'].get('content') or '').strip() for choice in body['choices']]
+            if not contents:
+                raise ValueError("response contains no choices")
+            if stage is not None and any(choice.get('finish_reason') == 'length' for choice in body['choices']):
+                logger.warning(f"Reply cut off by the max_tokens limit of the '{stage}' stage")
+            elapsed = time.monotonic() - started
+            record_latency(self.provider, self.model, elapsed)
+            self._record_usage(elapsed, body.get("usage"))
+            logger.debug(f"Received {len(contents)} responses with {sum(map(len, contents))} characters")
+            return contents
+        except requests.exceptions.Timeout as e:
+            self._raise_if_cancelled(e)
+            if self.deadline is not None:
+                logger.warning(f"API call abandoned at deadline: {e}")
+                raise DeadlineExceeded(str(e)) from e
+            logger.error(f"API Error: {e}")
+            self._record_usage(time.monotonic() - started, error=True)
+            return [f"Error: Could not get response from API: {e}"]
+        except (CassetteMiss, RunCancelled):
+            raise
         except Exception as e:
+            # An aborted connection surfaces as a connection error
+            self._raise_if_cancelled(e)
             logger.error(f"API Error: {e}")
-            return f"Error: Could not get response from API: {e}"
+            self._record_usage(time.monotonic() - started, error=True)
+            return [f"Error: Could not get response from API: {e}"]
+
+    def _raise_if_cancelled(self, error: Exception) -> None:
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            logger.info(f"API call aborted, run cancelled: {error}")
+            raise RunCancelled("run cancelled") from error
+
+    def _record_usage(self, seconds: float, usage: Optional[Dict[str, Any]] = None, error: bool = False) -> None:
+        """Count one provider call (with the token usage the provider reported, if any)."""
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["errors"] += int(error)
+            self.usage["seconds"] += seconds
+            for field in ("prompt_tokens", "completion_tokens"):
+                self.usage[field] += int((usage or {}).get(field) or 0)
+
+    def _post(self, payload: Dict[str, Any], timeout: Optional[float]) -> Any:
+        """Send a chat completion request and return the decoded response body.
+
+        When a cassette is configured, replays are served from it without network
+        access and recordings capture the exchange with its observed latency.
+        """
+        cassette = _cassette
+        if cassette is not None and cassette.mode == "replay":
+            try:
+                status, body = cassette.replay(self.base_url, payload, timeout=timeout)
+            except TimeoutError as e:
+                raise requests.exceptions.Timeout(str(e)) from e
+            if status >= 400:
+                raise requests.exceptions.HTTPError(f"{status} Error (replayed) for url: {self.base_url}")
+            return body
+        started = time.monotonic()
+        response = get_http_session().post(self.base_url, headers=self.headers, json=payload, timeout=timeout)
+        if cassette is not None:
+            try:
+                recorded = _compact_body(response.json())
+            except ValueError:
+                recorded = response.text
+            cassette.record(self.base_url, payload, response.status_code, recorded, time.monotonic() - started)
+        response.raise_for_status()
+        return response.json()
 
     def _determine_thinking_rounds(self, prompt: str) -> int:
         """Let the model decide how many rounds of thinking are needed.
@@ -83,9 +653,12 @@ Respond with just a number between 1 and 5."""
         messages = [{"role": "user", "content": meta_prompt}]
         
         logger.info("=== DETERMINING THINKING ROUNDS ===")
-        response = self._call_api(messages, temperature=0.3, stream=False)
+        response = self._call_api(messages, temperature=0.3, stream=False, stage="rounds")
         logger.info("=" * 50)
 
+        if not response.strip():
+            logger.warning("Empty reply to the rounds question (check the 'rounds' stage limits), using 3 rounds")
+            return 3
         try:
             rounds = int(''.join(filter(str.isdigit, response)))
             logger.info(f"\n🤔 Thinking... ({rounds} rounds needed)")
@@ -102,6 +675,17 @@ Respond with just a number between 1 and 5."""
             logger.warning(f"Could not determine rounds, using default: {e}")
             return 3  # Default to 3 rounds
             
+    def _rate_confidence(self, prompt: str, response: str) -> Optional[float]:
+        """Ask the model how confident it is that response answers prompt.
+
+        Returns:
+            The confidence (0-1), or None when the answer holds no rating
+        """
+        confidence_prompt = f"""Original message: {prompt}\n\nResponse: {response}\n\nHow confident are you that this response fully and correctly answers the original message?\nRespond with ONLY a number from 0 (not at all) to 10 (completely)."""
+        logger.info("=== RATING CONFIDENCE ===")
+        answer = self._call_api([{"role": "user", "content": confidence_prompt}], temperature=0.2, stream=False, stage="evaluation")
+        return parse_confidence(answer)
+
     def _build_eval_prompt(self, prompt, current_best, alternatives, neweval=False):
         if neweval:
             logger.info("[EVAL PROMPT] neweval=True: new eval prompt")
@@ -110,131 +694,855 @@ Respond with just a number between 1 and 5."""
             logger.info("[EVAL PROMPT] neweval=False: original eval prompt")
             return f"""Original message: {prompt}\n\nEvaluate these responses and choose the best one:\n\nCurrent best: {current_best}\n\nAlternatives:\n{chr(10).join([f"{i+1}. {alt}" for i, alt in enumerate(alternatives)])}\n\nWhich response best addresses the original message? Consider accuracy, clarity, and completeness.\nFirst, respond with ONLY 'current' or a number (1-{len(alternatives)}).\nThen on a new line, explain your choice in one sentence."""
 
-    def think(self, prompt: str, rounds: Optional[int] = None, num_alternatives: int = 3, details: bool = False, neweval: bool = False) -> Dict[str, Any]:
+    def _evaluate_alternatives(self, prompt: str, current_best: str, alternatives: List[Optional[str]], neweval: bool = False, drop_losers: bool = False):
+        """Select the best response among current_best and the alternatives.
+
+        Up to EVAL_SHARD_SIZE alternatives are judged in a single evaluator call.
+        Wider rounds are split into shards that are evaluated in parallel against
+        current_best; the shard winners are then merged hierarchically until one
+        evaluator call can decide between the remaining candidates.
+
+        Args:
+            prompt: The user's prompt
+            current_best: The incumbent response
+            alternatives: The candidate responses
+            neweval: Whether to use the new evaluation prompt
+            drop_losers: Replace eliminated alternatives with None to release their texts early
+
+        Returns:
+            A tuple of (selected index or -1 for current_best, explanation)
+        """
+        candidates = list(range(len(alternatives)))
+        level = 0
+        while True:
+            shards = [candidates[i:i + EVAL_SHARD_SIZE] for i in range(0, len(candidates), EVAL_SHARD_SIZE)]
+            if len(shards) > 1:
+                logger.info(f"Evaluating {len(candidates)} alternatives in {len(shards)} shards (level {level})")
+
+            def evaluate_shard(shard):
+                eval_prompt = self._build_eval_prompt(prompt, current_best, [alternatives[i] for i in shard], neweval=neweval)
+                evaluation = self._call_api([{"role": "user", "content": eval_prompt}], temperature=0.2, stream=False, stage="evaluation")
+                idx, explanation = parse_evaluation(evaluation, len(shard))
+                return (shard[idx] if idx >= 0 else -1), explanation
+
+            results = run_parallel(evaluate_shard, shards)
+            winners = [winner for winner, _ in results if winner >= 0]
+            if drop_losers:
+                for i in set(candidates) - set(winners):
+                    alternatives[i] = None
+            if len(shards) == 1 or not winners:
+                return results[0] if len(shards) == 1 else (-1, results[0][1])
+            candidates = winners
+            level += 1
+
+    def think(self, prompt: str, rounds: Optional[int] = None, num_alternatives: int = 3, details: bool = False, neweval: bool = False, deadline_ms: Optional[int] = None, eval_mode: str = "batch",
+              stage_limits: Optional[Dict[str, Dict[str, Any]]] = None, alternative_mode: Optional[str] = None) -> Dict[str, Any]:
         """Process user input with recursive thinking.
         
         Args:
             prompt: The user's prompt
             rounds: The number of thinking rounds (if None, will be determined automatically)
-            num_alternatives: The number of alternative responses to generate
+            num_alternatives: The number of alternative responses to generate (1 to MAX_ALTERNATIVES)
             details: Whether to include thinking details in the result
+            neweval: Whether to use the new evaluation prompt
+            deadline_ms: Optional latency budget. Rounds and alternatives are planned from the
+                observed per-model latency and the best response so far is returned when the
+                budget runs out.
+            eval_mode: "batch" judges all alternatives of a round together, "pairwise" compares
+                them one by one with the incumbent and remembers verdicts across rounds
+            stage_limits: Per-stage overrides of the generation limits (see STAGES and
+                STAGE_LIMIT_FIELDS)
+            alternative_mode: "full" regenerates whole alternatives, "edit" asks for SEARCH/REPLACE
+                edits of the current response (None uses the process-wide mode)
             
         Returns:
             A dictionary with the response and optionally thinking details
         """
-        # Determine thinking rounds if not specified
-        thinking_rounds = rounds if rounds is not None else self._determine_thinking_rounds(prompt)
-        logger.info(f"\n\n🤔 Thinking... ({thinking_rounds} rounds needed)")
-        
-        thinking_history = []
+        engine = ThinkingEngine(SingleModelStrategy(self), make_evaluator(eval_mode, neweval=neweval))
+        run = engine.run(prompt, rounds=rounds, num_alternatives=num_alternatives, details=details,
+                         deadline_ms=deadline_ms, conversation=self.conversation_history, stage_limits=stage_limits,
+                         alternative_mode=alternative_mode)
+        # Add to conversation history
         self.conversation_history.append({"role": "user", "content": prompt})
-        messages = self.conversation_history.copy()
+        self.conversation_history.append({"role": "assistant", "content": run["response"]})
         
+        # Keep conversation history manageable
+        if len(self.conversation_history) > 10:
+            self.conversation_history = self.conversation_history[-10:]
+        
+        result = {
+            "response": run["response"],
+            "model": run["model"],
+            "provider": run["provider"]
+        }
+        result.update(run_report(run))
+        if details:
+            result["thinking_rounds"] = run["thinking_rounds"]
+            result["thinking_history"] = run["thinking_history"]
+        return result
+
+
+def run_report(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Run bookkeeping of a thinking result (deadline, answer store and evaluator information), if any."""
+    return {key: result[key] for key in ("rounds_completed", "deadline_reached", "answer_store", "evaluation", "cascade") if key in result}
+
+
+# --- Model selection strategies ---
+
+def model_key(provider: str, model: str) -> str:
+    return f"{provider}/{model}"
+
+
+class SingleModelStrategy:
+    """Every stage (base response, alternatives, evaluation) uses one provider client."""
+
+    records_models = False
+
+    def __init__(self, client: EnhancedRecursiveThinkingChat):
+        self.client = client
+
+    def base_client(self) -> EnhancedRecursiveThinkingChat:
+        return self.client
+
+    def evaluator_client(self) -> EnhancedRecursiveThinkingChat:
+        return self.client
+
+    def alternative_client(self, slot: int, model: Optional[str] = None) -> EnhancedRecursiveThinkingChat:
+        return self.client
+
+    def model_keys(self) -> List[str]:
+        return []
+
+    def answer_scope(self) -> str:
+        """Answer store scope: stored answers are only reused for runs of the same scope."""
+        return f"single:{model_key(self.client.provider, self.client.model)}"
+
+    def alternative_latency(self) -> float:
+        return estimate_latency(self.client.provider, self.client.model)
+
+
+class MixedModelStrategy:
+    """Each alternative comes from a randomly chosen LLM.
+
+    A base LLM, picked at random once per run, generates the initial response and
+    performs the evaluations (following current CoRT practice).
+    """
+
+    records_models = True
+
+    def __init__(self, llms: List[Dict[str, Any]]):
+        """
+        Args:
+            llms: Candidate LLMs as dicts with "provider", "model" and "api_key"
+        """
+        self.llms = llms
+        self._by_key = {model_key(llm["provider"], llm["model"]): llm for llm in llms}
+        self.base_llm = random.choice(llms)
+        self._base_client = self._client(self.base_llm)
+
+    @staticmethod
+    def _client(llm: Dict[str, Any]) -> EnhancedRecursiveThinkingChat:
+        return EnhancedRecursiveThinkingChat(api_key=llm["api_key"], model=llm["model"], provider=llm["provider"])
+
+    def base_client(self) -> EnhancedRecursiveThinkingChat:
+        return self._base_client
+
+    def evaluator_client(self) -> EnhancedRecursiveThinkingChat:
+        return self._base_client
+
+    def alternative_client(self, slot: int, model: Optional[str] = None) -> EnhancedRecursiveThinkingChat:
+        """Client for an alternative slot; model is a key from model_keys() or None for a random LLM."""
+        llm = self._by_key.get(model) or random.choice(self.llms)
+        return self._client(llm)
+
+    def model_keys(self) -> List[str]:
+        return list(self._by_key)
+
+    def answer_scope(self) -> str:
+        return "mixed:" + ",".join(sorted(self._by_key))
+
+    def alternative_latency(self) -> float:
+        # Alternatives may come from any of the LLMs, so plan with their mean latency
+        return sum(estimate_latency(llm["provider"], llm["model"]) for llm in self.llms) / len(self.llms)
+
+
+class CascadeStrategy:
+    """Tiered models: a fast draft tier writes, a strong judge tier only evaluates.
+
+    The draft client generates the base response and every alternative, the judge
+    client performs the evaluations. An optional escalation client (usually the
+    strongest and most expensive model) is called only when the judge's confidence
+    in the final response is below escalate_below; its answer then has to beat the
+    drafted one in one more evaluation.
+    """
+
+    records_models = True
+
+    def __init__(self, draft: EnhancedRecursiveThinkingChat, judge: EnhancedRecursiveThinkingChat,
+                 escalation: Optional[EnhancedRecursiveThinkingChat] = None, escalate_below: float = DEFAULT_ESCALATION_THRESHOLD):
+        self.draft = draft
+        self.judge = judge
+        self.escalation = escalation
+        self.escalate_below = escalate_below
+
+    def base_client(self) -> EnhancedRecursiveThinkingChat:
+        return self.draft
+
+    def evaluator_client(self) -> EnhancedRecursiveThinkingChat:
+        return self.judge
+
+    def alternative_client(self, slot: int, model: Optional[str] = None) -> EnhancedRecursiveThinkingChat:
+        return self.draft
+
+    def escalation_client(self) -> Optional[EnhancedRecursiveThinkingChat]:
+        return self.escalation
+
+    def model_keys(self) -> List[str]:
+        return []
+
+    def answer_scope(self) -> str:
+        return "cascade:" + ",".join(f"{tier}={model_key(client.provider, client.model)}" for tier, client in self.tiers().items())
+
+    def alternative_latency(self) -> float:
+        return estimate_latency(self.draft.provider, self.draft.model)
+
+    def tiers(self) -> Dict[str, EnhancedRecursiveThinkingChat]:
+        tiers = {"draft": self.draft, "judge": self.judge}
+        if self.escalation is not None:
+            tiers["escalation"] = self.escalation
+        return tiers
+
+
+def tier_report(tiers: Dict[str, EnhancedRecursiveThinkingChat]) -> Dict[str, Dict[str, Any]]:
+    """Provider, model, calls, latency and token usage of each tier's client."""
+    report = {}
+    for tier, client in tiers.items():
+        with client._usage_lock:
+            usage = dict(client.usage)
+        usage["seconds"] = round(usage["seconds"], 3)
+        report[tier] = {"provider": client.provider, "model": client.model, **usage}
+    return report
+
+
+# --- Evaluation strategies ---
+
+class BatchEvaluator:
+    """Judges current_best and all alternatives of a round together (sharded for wide rounds)."""
+
+    def __init__(self, neweval: bool = False):
+        self.neweval = neweval
+
+    def answer_scope(self) -> str:
+        """Answer store scope of the evaluation settings (see SingleModelStrategy.answer_scope)."""
+        return "batch:neweval" if self.neweval else "batch"
+
+    def evaluate(self, client: EnhancedRecursiveThinkingChat, prompt: str, current_best: str, alternatives: List[Optional[str]], drop_losers: bool = False):
+        """Return (selected index or -1 for current_best, explanation)."""
+        return client._evaluate_alternatives(prompt, current_best, alternatives, neweval=self.neweval, drop_losers=drop_losers)
+
+    @property
+    def settled(self) -> bool:
+        return False
+
+    def report(self) -> Optional[Dict[str, Any]]:
+        return None
+
+
+def parse_pairwise(evaluation: str):
+    """Parse a pairwise verdict into (challenger won, explanation).
+
+    Answers that name neither response keep the incumbent.
+    """
+    lines = [line.strip() for line in evaluation.split('\n') if line.strip()]
+    if not lines:
+        return False, "No explanation provided"
+    explanation_text = ' '.join(lines[1:]) if len(lines) > 1 else "No explanation provided"
+    match = re.search(r"\b([ab])\b", lines[0].lower())
+    return bool(match and match.group(1) == "b"), explanation_text
+
+
+class PairwiseEvaluator:
+    """Compares each new alternative only against the incumbent, remembering verdicts for the run.
+
+    A score table keeps every candidate's wins and losses, and decided pairs are
+    never judged again. When several alternatives beat the incumbent they play a
+    knockout among themselves. Once the incumbent has defended itself lead times
+    in a row the run is considered settled: further evaluation is skipped and the
+    engine stops generating rounds.
+    """
+
+    def __init__(self, neweval: bool = False, lead: int = DEFAULT_PAIRWISE_LEAD):
+        self.neweval = neweval
+        self.lead = lead
+        # digest -> {"wins", "losses", "defended", "reason"}
+        self.scores: Dict[str, Dict[str, Any]] = {}
+        # (digest, digest) sorted -> (winner digest, explanation)
+        self.decided: Dict[tuple, tuple] = {}
+        self.incumbent: Optional[str] = None
+        self.calls = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> Dict[str, Any]:
+        return self.scores.setdefault(key, {"wins": 0, "losses": 0, "defended": 0, "reason": None})
+
+    def answer_scope(self) -> str:
+        return f"pairwise:{'neweval:' if self.neweval else ''}{self.lead}"
+
+    @property
+    def settled(self) -> bool:
+        return self.incumbent is not None and self._entry(self.incumbent)["defended"] >= self.lead
+
+    def _build_prompt(self, prompt: str, first: str, second: str, reason: Optional[str]) -> str:
+        criteria = ("Consider the user's true needs, practicality, consistency and special cases."
+                    if self.neweval else "Consider accuracy, clarity, and completeness.")
+        record = f"\n\nResponse A was preferred earlier because: {reason}" if reason else ""
+        return f"""Original message: {prompt}\n\nResponse A: {first}\n\nResponse B: {second}{record}\n\nWhich response better addresses the original message? {criteria}\nFirst, respond with ONLY 'A' or 'B'.\nThen on a new line, explain your choice in one sentence."""
+
+    def _compare(self, client: EnhancedRecursiveThinkingChat, prompt: str, texts: Dict[str, str], first: str, second: str):
+        """Judge first against second, reusing an earlier verdict on the same pair.
+
+        Returns (winner key, explanation).
+        """
+        pair = tuple(sorted((first, second)))
+        with self._lock:
+            if pair in self.decided:
+                self.reused += 1
+                return self.decided[pair]
+            reason = self._entry(first)["reason"]
+        eval_prompt = self._build_prompt(prompt, texts[first], texts[second], reason)
+        evaluation = client._call_api([{"role": "user", "content": eval_prompt}], temperature=0.2, stream=False, stage="evaluation")
+        second_won, explanation = parse_pairwise(evaluation)
+        winner, loser = (second, first) if second_won else (first, second)
+        with self._lock:
+            self.calls += 1
+            self.decided[pair] = (winner, explanation)
+            self._entry(winner)["wins"] += 1
+            self._entry(winner)["reason"] = explanation
+            self._entry(loser)["losses"] += 1
+        return winner, explanation
+
+    def evaluate(self, client: EnhancedRecursiveThinkingChat, prompt: str, current_best: str, alternatives: List[Optional[str]], drop_losers: bool = False):
+        """Return (selected index or -1 for current_best, explanation)."""
+        incumbent = self._key(current_best)
+        if incumbent != self.incumbent:
+            # A new incumbent starts defending from zero
+            self.incumbent = incumbent
+            self._entry(incumbent)["defended"] = 0
+        if self.settled:
+            return -1, f"Current response has a clear lead ({self._entry(incumbent)['defended']} consecutive wins)"
+        texts = {incumbent: current_best}
+        keys = [self._key(alt) for alt in alternatives]
+        for key, alt in zip(keys, alternatives):
+            texts.setdefault(key, alt)
+        challengers = [key for key in dict.fromkeys(keys) if key != incumbent]
+
+        def compare(pair):
+            return self._compare(client, prompt, texts, *pair)
+
+        winners, explanation = [], "No new alternatives to compare"
+        # Explanation of the last comparison each remaining winner won
+        reasons: Dict[str, str] = {}
+        if challengers:
+            # Every new alternative against the incumbent only
+            verdicts = run_parallel(compare, [(incumbent, key) for key in challengers])
+            winners = [key for key, (winner, _) in zip(challengers, verdicts) if winner == key]
+            reasons = {winner: reason for winner, reason in verdicts if winner != incumbent}
+            explanation = verdicts[0][1]
+        if challengers and not winners:
+            self._entry(incumbent)["defended"] += len(challengers)
+        # Knockout among the alternatives that beat the incumbent
+        while len(winners) > 1:
+            verdicts = run_parallel(compare, [(winners[i], winners[i + 1]) for i in range(0, len(winners) - 1, 2)])
+            reasons.update(verdicts)
+            winners = [winner for winner, _ in verdicts] + winners[len(verdicts) * 2:]
+        if drop_losers:
+            for i, key in enumerate(keys):
+                if key not in winners:
+                    alternatives[i] = None
+        if not winners:
+            return -1, explanation
+        return keys.index(winners[0]), reasons[winners[0]]
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "mode": "pairwise",
+            "evaluator_calls": self.calls,
+            "reused_verdicts": self.reused,
+            "settled": self.settled,
+        }
+
+
+def make_evaluator(eval_mode: str = "batch", neweval: bool = False):
+    """Evaluator for an eval_mode name (one of EVAL_MODES)."""
+    if eval_mode == "pairwise":
+        return PairwiseEvaluator(neweval=neweval)
+    if eval_mode == "batch":
+        return BatchEvaluator(neweval=neweval)
+    raise ValueError(f"eval_mode must be one of {EVAL_MODES}, got {eval_mode!r}")
+
+
+# --- Engine ---
+
+class ThinkingEngine:
+    """The recursive thinking loop shared by every tool.
+
+    Which models produce the base response, the alternatives and the evaluations is
+    decided by the model-selection strategy; how a round's winner is chosen is decided
+    by the evaluator. Deadlines, near-duplicate collapsing, the answer store and
+    provider call instrumentation are handled here once for all of them.
+    """
+
+    def __init__(self, selector, evaluator):
+        self.selector = selector
+        self.evaluator = evaluator
+        self.deadline: Optional[float] = None
+        self.stage_limits: Optional[Dict[str, Dict[str, Any]]] = None
+        self.cancel_token: Optional[CancelToken] = None
+        self.alternative_mode = _alternative_mode
+        # Whether the last run stopped early at its deadline (its answer is then not stored)
+        self.deadline_reached = False
+        self._clients: List[EnhancedRecursiveThinkingChat] = []
+
+    def _use(self, client: EnhancedRecursiveThinkingChat) -> EnhancedRecursiveThinkingChat:
+        """Apply the run's deadline, stage limits and cancel token to a client handed out by the strategy."""
+        client.deadline = self.deadline
+        client.stage_limits = self.stage_limits
+        client.cancel_token = self.cancel_token
+        self._clients.append(client)
+        return client
+
+    def _check_cancelled(self) -> None:
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
+    def _remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None when the run has no deadline."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def run(self, prompt: str, rounds: Optional[int] = None, num_alternatives: int = 3, details: bool = False,
+            deadline_ms: Optional[int] = None, conversation: Optional[List[Dict]] = None,
+            stage_limits: Optional[Dict[str, Dict[str, Any]]] = None, cancel_token: Optional[CancelToken] = None,
+            alternative_mode: Optional[str] = None) -> Dict[str, Any]:
+        """Run recursive thinking on a prompt.
+
+        Args:
+            prompt: The user's prompt
+            rounds: The number of thinking rounds (if None, will be determined automatically)
+            num_alternatives: The number of alternatives per round (1 to MAX_ALTERNATIVES)
+            details: Whether to keep every alternative in the history
+            deadline_ms: Optional latency budget for the whole run
+            conversation: Earlier messages of the conversation, if any
+            stage_limits: Per-stage overrides of the process-wide generation limits, e.g.
+                {"alternatives": {"max_tokens": 800}}
+            cancel_token: Cancels the run (defaults to the cancel token of the calling thread, if any).
+                No further rounds are started and in-flight provider requests are aborted.
+            alternative_mode: "full" or "edit" (see ALTERNATIVE_MODES); defaults to the process-wide mode
+
+        Returns:
+            A dictionary with the response, the model/provider that produced it ("best"),
+            the thinking history and optional deadline/answer store bookkeeping
+
+        Raises:
+            ValueError: If stage_limits or alternative_mode is invalid
+            RunCancelled: If the run was cancelled
+        """
+        self.stage_limits = merge_stage_limits(get_stage_limits(), stage_limits)
+        self.alternative_mode = alternative_mode or _alternative_mode
+        if self.alternative_mode not in ALTERNATIVE_MODES:
+            raise ValueError(f"alternative_mode must be one of {ALTERNATIVE_MODES}, got {alternative_mode!r}")
+        self.cancel_token = cancel_token or current_cancel_token()
+        num_alternatives = min(max(num_alternatives, 1), MAX_ALTERNATIVES)
+        conversation = list(conversation or [])
+        # Stored answers only stand in for prompts that carry no earlier conversation
+        use_store = not conversation
+        scope = self._answer_scope()
+        stored = lookup_stored_answer(prompt, scope) if use_store else None
+        if stored is not None and stored["mode"] == "reuse":
+            return self._reused_result(prompt, stored, details)
+        if deadline_ms is not None:
+            self.deadline = time.monotonic() + deadline_ms / 1000
+        try:
+            result = self._run(prompt, rounds, num_alternatives, details, deadline_ms, conversation, stored)
+        finally:
+            self.deadline = None
+            self.cancel_token = None
+            for client in self._clients:
+                client.deadline = None
+                client.stage_limits = None
+                client.cancel_token = None
+            self._clients = []
+        # Answers of runs cut short by the deadline are partial and not worth reusing
+        if use_store and not self.deadline_reached:
+            remember_answer(prompt, result["response"], result["model"], result["provider"], scope)
+        return result
+
+    def _answer_scope(self) -> str:
+        """Answer store scope of the run: its model selection, evaluation, alternative mode and stage limits."""
+        limits = hashlib.sha1(json.dumps(self.stage_limits, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        return "|".join([self.selector.answer_scope(), self.evaluator.answer_scope(), self.alternative_mode, limits])
+
+    def _history_entry(self, round_number: int, llm_prompt, llm_response, response: Dict[str, Any], alternatives: List[Dict[str, Any]],
+                       selected: int, explanation: str, **extra) -> Dict[str, Any]:
+        entry = {
+            "round": round_number,
+            "llm_prompt": llm_prompt,
+            "llm_response": llm_response,
+            "response": response["response"],
+            "alternatives": alternatives if self.selector.records_models else [alt["response"] for alt in alternatives],
+            "selected": selected,
+            "explanation": explanation,
+        }
+        if self.selector.records_models:
+            if round_number > 0:
+                entry["alternatives_llm"] = extra.pop("alternatives_llm")
+            entry["provider"] = response["provider"]
+            entry["model"] = response["model"]
+        entry.update(extra)
+        return entry
+
+    def _result(self, best: Dict[str, Any], thinking_rounds: int, thinking_history: List[Dict[str, Any]], details: bool) -> Dict[str, Any]:
+        result = {
+            "response": best["response"],
+            "model": best["model"],
+            "provider": best["provider"],
+            "thinking_rounds": thinking_rounds,
+            "thinking_history": thinking_history,
+            "best": dict(best),
+        }
+        if details:
+            # Additional information only in details mode
+            result["alternatives"] = thinking_history[-1]["alternatives"] if thinking_history else []
+        return result
+
+    def _reused_result(self, prompt: str, stored: Dict[str, Any], details: bool) -> Dict[str, Any]:
+        """Result for a prompt answered straight from the answer store."""
+        logger.info(f"Reusing stored answer (similarity={stored['similarity']:.2f})")
+        best = {"response": stored["response"], "provider": stored["provider"], "model": stored["model"]}
+        history = [self._history_entry(0, prompt, stored["response"], best, [], -1,
+                                       f"Reused stored answer (similarity {stored['similarity']:.2f})")]
+        result = self._result(best, 0, history, details)
+        result["answer_store"] = stored_answer_report(stored)
+        return result
+
+    def _sample_alternatives(self, clients: List[EnhancedRecursiveThinkingChat], settings: List[Dict[str, Any]], messages: List[Dict],
+                             generate_alternative: Callable, exact_temperatures: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """Generate one alternative per slot (None for slots cut off by the deadline).
+
+        Slots that share a model on a provider supporting multiple samples per request
+        are served by a single request with n set, at the mean of their temperatures
+        (or only slots sharing the temperature too, with exact_temperatures); their
+        alternatives record that mean as the temperature actually used. The others,
+        and batches the provider answers only partially or with an error, fall back to
+        concurrent separate calls.
+        """
+        groups: Dict[tuple, List[int]] = {}
+        for i, client in enumerate(clients):
+            key = (client.provider, client.model) + ((settings[i]["temperature"],) if exact_temperatures else ())
+            groups.setdefault(key, []).append(i)
+        tasks = []
+        for slots in groups.values():
+            if len(slots) > 1 and clients[slots[0]].supports_n:
+                tasks.append(slots)
+            else:
+                tasks.extend([i] for i in slots)
+
+        def run_task(slots):
+            if len(slots) == 1:
+                return [(slots[0], generate_alternative(slots[0], clients[slots[0]]))]
+            client = clients[slots[0]]
+            logger.info(f"\n✨ ALTERNATIVES {slots[0]+1}-{slots[-1]+1} (one request, n={len(slots)}) ✨")
+            temperature = sample_temperature([settings[i]["temperature"] for i in slots])
+            try:
+                samples = client._call_api_samples(messages, temperature=temperature, n=len(slots), stage="alternatives")
+            except DeadlineExceeded:
+                return [(i, None) for i in slots]
+            if any(sample.startswith("Error:") for sample in samples):
+                samples = []
+            results = [(i, {"response": sample, "provider": client.provider, "model": client.model,
+                            "slot": settings[i]["slot"], "temperature": temperature}) for i, sample in zip(slots, samples)]
+            missing = slots[len(results):]
+            if missing:
+                logger.warning(f"{client.provider} returned {len(results)} of {len(slots)} samples, generating the rest separately")
+                results += list(zip(missing, run_parallel(lambda i: generate_alternative(i, clients[i]), missing)))
+            return results
+
+        generated = dict(pair for results in run_parallel(run_task, tasks) for pair in results)
+        return [generated[i] for i in range(len(clients))]
+
+    def _apply_edits(self, current_best: str, alternatives: List[Dict[str, Any]], regenerate: Callable) -> tuple:
+        """Turn edit answers into candidate responses by applying them to current_best.
+
+        Alternatives whose edits do not apply are regenerated in full, concurrently.
+
+        Returns:
+            A tuple of (alternatives, {"edited": n, "edit_fallbacks": m})
+        """
+        failed = []
+        for i, alt in enumerate(alternatives):
+            edited = apply_edits(current_best, alt["response"])
+            if edited is None:
+                failed.append(i)
+            else:
+                alt["response"] = edited
+                alt["edited"] = True
+        if failed:
+            logger.info(f"Edits of {len(failed)} alternatives did not apply, regenerating them in full")
+            for i, replacement in zip(failed, run_parallel(lambda i: regenerate(alternatives[i]), failed)):
+                alternatives[i] = replacement
+        stats = {"edited": len(alternatives) - len(failed), "edit_fallbacks": len(failed)}
+        return [alt for alt in alternatives if alt is not None], stats
+
+    def _slot_settings(self, count: int) -> List[Dict[str, Any]]:
+        """Slot, temperature and (mixed mode) model of each alternative of a round.
+
+        The adaptive policy plans them once it has learned enough; otherwise the fixed
+        temperature schedule is used and mixed mode picks models at random.
+        """
+        policy = _adaptive_policy
+        plan = policy.plan(count, self.selector.model_keys()) if policy is not None else None
+        if plan is None:
+            return [{"slot": i, "temperature": alternative_temperature(i), "model": None} for i in range(count)]
+        return [{"slot": i, "temperature": setting["temperature"], "model": setting["model"]} for i, setting in enumerate(plan)]
+
+    def _run(self, prompt: str, rounds: Optional[int], num_alternatives: int, details: bool, deadline_ms: Optional[int],
+             conversation: List[Dict], seed: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        base_client = self._use(self.selector.base_client())
+        # Determine thinking rounds if not specified.
+        # Deadline-driven runs skip the extra meta call and let the budget decide instead.
+        if rounds is not None:
+            thinking_rounds = rounds
+        elif seed is not None:
+            thinking_rounds = SEEDED_ROUNDS
+        elif self.deadline is not None:
+            thinking_rounds = MAX_ROUNDS
+        else:
+            with profile_stage("rounds"):
+                thinking_rounds = base_client._determine_thinking_rounds(prompt)
+        logger.info(f"\n\n🤔 Thinking... ({thinking_rounds} rounds needed)")
+
+        messages = conversation + [{"role": "user", "content": prompt}]
+        thinking_history = []
+
         # Generate initial response
         logger.info("\n=== GENERATING INITIAL RESPONSE ===")
-        base_llm_prompt = messages[-1]["content"] if messages else prompt
-        base_response = self._call_api(messages, temperature=0.7, stream=False)
-        current_best = base_response
+        logger.info(f"Base LLM: provider={base_client.provider}, model={base_client.model}, rounds={thinking_rounds}")
+        deadline_reached = False
+        explanation = "Initial base response"
+        if seed is not None:
+            current = {"response": seed["response"], "provider": seed["provider"], "model": seed["model"]}
+            explanation = f"Seeded from stored answer (similarity {seed['similarity']:.2f})"
+            logger.info(explanation)
+        else:
+            try:
+                with profile_stage("base"):
+                    base_response = base_client._call_api(messages, temperature=0.7, stream=False, stage="base")
+            except DeadlineExceeded:
+                base_response = f"Error: Deadline of {deadline_ms} ms reached before an initial response was generated"
+                deadline_reached = True
+            current = {"response": base_response, "provider": base_client.provider, "model": base_client.model}
         logger.info("=" * 50)
         # Record the base response in the history as well (set round=0)
-        thinking_history.append({
-            "round": 0,
-            "llm_prompt": base_llm_prompt,
-            "llm_response": base_response,
-            "response": base_response,
-            "alternatives": [],
-            "selected": -1,
-            "explanation": "Initial base response"
-        })
+        thinking_history.append(self._history_entry(0, prompt, current["response"], current, [], -1, explanation))
+
+        rounds_completed = 0
         for r in range(thinking_rounds):
+            self._check_cancelled()
+            if deadline_reached:
+                break
+            if self.evaluator.settled:
+                logger.info(f"Current response has a clear lead, stopping after {rounds_completed} rounds")
+                break
+            round_alternatives = num_alternatives
+            remaining = self._remaining()
+            if remaining is not None:
+                eval_client = self.selector.evaluator_client()
+                eval_latency = estimate_latency(eval_client.provider, eval_client.model)
+                round_alternatives = plan_alternatives(remaining, self.selector.alternative_latency(), eval_latency, num_alternatives)
+                if round_alternatives == 0:
+                    logger.info(f"Deadline approaching ({remaining:.1f}s left), stopping after {rounds_completed} rounds")
+                    deadline_reached = True
+                    break
             logger.info(f"\n=== ROUND {r+1}/{thinking_rounds} ===")
-            
-            alternatives = []
-            alt_prompts = []
-            alt_llm_prompts = []
-            alt_llm_responses = []
-            
-            # Generate alternatives
-            for i in range(num_alternatives):
+
+            # Generate alternatives.
+            # The conversation and the original message come first so every alternative call
+            # (and every round) shares the same prompt prefix, which providers can cache.
+            alt_messages = messages + [
+                {"role": "assistant", "content": current["response"]},
+                {"role": "user", "content": ALTERNATIVE_PROMPT},
+            ]
+            # Edit mode asks for SEARCH/REPLACE blocks instead of a whole new response (long responses only)
+            edit = self.alternative_mode == "edit" and len(current["response"]) >= EDIT_MIN_LENGTH
+            edit_messages = alt_messages[:-1] + [{"role": "user", "content": EDIT_PROMPT}]
+
+            slot_settings = self._slot_settings(round_alternatives)
+
+            def generate_alternative(i, client=None, perturbed=False, edit=False):
                 logger.info(f"\n✨ ALTERNATIVE {i+1} ✨")
-                alt_prompt = f"""Original message: {prompt}\n\nCurrent response: {current_best}\n\nGenerate an alternative response that might be better. Be creative and consider different approaches.\nAlternative response:"""
-                alt_messages = self.conversation_history + [{"role": "user", "content": alt_prompt}]
-                alternative = self._call_api(alt_messages, temperature=0.7 + i * 0.1, stream=False)
-                alternatives.append(alternative)
-                alt_prompts.append(alt_prompt)
-                alt_llm_prompts.append(alt_prompt)
-                alt_llm_responses.append(alternative)
+                client = client or self._use(self.selector.alternative_client(i, slot_settings[i]["model"]))
+                temperature = slot_settings[i]["temperature"]
+                try:
+                    if perturbed:
+                        temperature = perturbed_temperature(temperature)
+                        regen_messages = alt_messages[:-1] + [{"role": "user", "content": ALTERNATIVE_PROMPT + DUPLICATE_PERTURBATION}]
+                        text = client._call_api(regen_messages, temperature=temperature, stream=False, stage="alternatives")
+                    else:
+                        text = client._call_api(edit_messages if edit else alt_messages, temperature=temperature, stream=False, stage="alternatives")
+                except DeadlineExceeded:
+                    return None
+                if self.selector.records_models:
+                    logger.info(f"Alternative {i+1}: provider={client.provider}, model={client.model}")
+                return {"response": text, "provider": client.provider, "model": client.model, "slot": i, "temperature": temperature}
+
+            slot_clients = [self._use(self.selector.alternative_client(i, setting["model"])) for i, setting in enumerate(slot_settings)]
+            with profile_stage("alternatives"):
+                if edit:
+                    alternatives = self._sample_alternatives(slot_clients, slot_settings, edit_messages,
+                                                             lambda i, client: generate_alternative(i, client, edit=True),
+                                                             exact_temperatures=_adaptive_policy is not None)
+                else:
+                    alternatives = self._sample_alternatives(slot_clients, slot_settings, alt_messages, generate_alternative,
+                                                             exact_temperatures=_adaptive_policy is not None)
+                alternatives = [alt for alt in alternatives if alt is not None]
+            edit_stats = {}
+            if edit and alternatives:
+                with profile_stage("edits"):
+                    alternatives, edit_stats = self._apply_edits(current["response"], alternatives,
+                                                                 lambda alt: generate_alternative(alt["slot"], slot_clients[alt["slot"]]))
+            if not alternatives:
+                deadline_reached = True
+                break
+
+            def regenerate_alternative(i):
+                # i indexes the surviving alternatives; regenerate in the slot (client, temperature) it came from
+                slot = alternatives[i]["slot"]
+                return generate_alternative(slot, slot_clients[slot], perturbed=True)
+
+            with profile_stage("dedup"):
+                kept, replacements, dedup_stats = dedup_alternatives(current["response"], [alt["response"] for alt in alternatives],
+                                                                     regenerate=regenerate_alternative, exact=edit)
+            alternatives = [replacements.get(i, alternatives[i]) for i in kept]
+            alt_llm_info = [{"provider": alt["provider"], "model": alt["model"]} for alt in alternatives]
+            alt_llm_prompts = [EDIT_PROMPT if alt.get("edited") else ALTERNATIVE_PROMPT for alt in alternatives] if details else []
+            alt_llm_responses = [alt["response"] for alt in alternatives] if details else []
+            # Outside of details mode the texts live only in alt_texts so eliminated ones can be released
+            alt_texts = [alt["response"] if details else alt.pop("response") for alt in alternatives]
+
             # Evaluate responses
+            self._check_cancelled()
             logger.info("\n=== EVALUATING RESPONSES ===")
-            eval_prompt = self._build_eval_prompt(prompt, current_best, alternatives, neweval=neweval)
-            eval_messages = [{"role": "user", "content": eval_prompt}]
-            evaluation = self._call_api(eval_messages, temperature=0.2, stream=False)
+            if not alt_texts:
+                selected_idx, explanation_text = -1, "All alternatives were near-duplicates of the current response"
+            else:
+                try:
+                    eval_client = self._use(self.selector.evaluator_client())
+                    with profile_stage("evaluation"):
+                        selected_idx, explanation_text = self.evaluator.evaluate(eval_client, prompt, current["response"], alt_texts, drop_losers=not details)
+                except DeadlineExceeded:
+                    logger.info("Deadline reached during evaluation, keeping current response")
+                    deadline_reached = True
+                    break
+                if _adaptive_policy is not None:
+                    _adaptive_policy.record([
+                        {"slot": alt["slot"], "temperature": alt["temperature"],
+                         "model": model_key(alt["provider"], alt["model"]) if self.selector.records_models else None}
+                        for alt in alternatives
+                    ], selected_idx)
             logger.info("=" * 50)
-            # Better parsing of evaluation result
-            lines = [line.strip() for line in evaluation.split('\n') if line.strip()]
-            
-            choice = 'current'
-            explanation_text = "No explanation provided"
-            
-            if lines:
-                first_line = lines[0].lower()
-                if 'current' in first_line:
-                    choice = 'current'
-                else:
-                    for char in first_line:
-                        if char.isdigit():
-                            choice = char
-                            break
-                
-                if len(lines) > 1:
-                    explanation_text = ' '.join(lines[1:])
-            
-            if choice == 'current':
-                selected_response = current_best
-                selected_idx = -1
+            if selected_idx == -1:
                 logger.info(f"\n    ✓ Kept current response: {explanation_text}")
             else:
+                selected = alternatives[selected_idx]
+                current = {"response": alt_texts[selected_idx], "provider": selected["provider"], "model": selected["model"]}
+                logger.info(f"\n    ✓ Selected alternative {selected_idx+1}: {explanation_text}")
+            if details:
+                recorded = alternatives
+            else:
+                # Eliminated alternatives are not kept around outside of details mode
+                recorded, alt_llm_info = [], alt_llm_info if self.selector.records_models else []
+            del alt_texts
+            thinking_history.append(self._history_entry(
+                r + 1, alt_llm_prompts, alt_llm_responses, current, recorded, selected_idx, explanation_text,
+                alternatives_llm=alt_llm_info, **dedup_stats, **edit_stats
+            ))
+            rounds_completed += 1
+
+        cascade = None
+        if hasattr(self.selector, "tiers"):
+            cascade = {"escalated": False}
+            if not deadline_reached:
+                self._check_cancelled()
                 try:
-                    idx = int(choice) - 1
-                    if 0 <= idx < len(alternatives):
-                        selected_response = alternatives[idx]
-                        selected_idx = idx
-                        logger.info(f"\n    ✓ Selected alternative {idx+1}: {explanation_text}")
-                    else:
-                        selected_response = current_best
-                        selected_idx = -1
-                        logger.info(f"\n    ✓ Invalid selection, keeping current response")
-                except Exception:
-                    selected_response = current_best
-                    selected_idx = -1
-                    logger.info(f"\n    ✓ Could not parse selection, keeping current response")
-            thinking_history.append({
-                "round": r + 1,
-                "llm_prompt": alt_llm_prompts,
-                "llm_response": alt_llm_responses,
-                "response": selected_response,
-                "alternatives": alternatives,
-                "selected": selected_idx,
-                "explanation": explanation_text
-            })
-            current_best = selected_response
-        # Add to conversation history
-        self.conversation_history.append({"role": "assistant", "content": current_best})
-        
-        # Keep conversation history manageable
-        if len(self.conversation_history) > 10:
-            self.conversation_history = self.conversation_history[-10:]
-        
+                    with profile_stage("escalation"):
+                        current = self._escalate(prompt, messages, current, thinking_history, cascade, details)
+                except DeadlineExceeded:
+                    logger.info("Deadline reached during escalation, keeping current response")
+                    deadline_reached = True
+
         logger.info("\n" + "=" * 50)
         logger.info("🎯 FINAL RESPONSE SELECTED")
         logger.info("=" * 50)
-        
-        result = {
-            "response": current_best,
-            "model": self.model,
-            "provider": self.provider
-        }
-        if details:
-            result["thinking_rounds"] = thinking_rounds
-            result["thinking_history"] = thinking_history
+        self.deadline_reached = deadline_reached
+        result = self._result(current, thinking_rounds, thinking_history, details)
+        if deadline_ms is not None:
+            result["rounds_completed"] = rounds_completed
+            result["deadline_reached"] = deadline_reached
+        if seed is not None:
+            result["answer_store"] = stored_answer_report(seed)
+        evaluation = self.evaluator.report()
+        if evaluation is not None:
+            result["evaluation"] = evaluation
+        if cascade is not None:
+            cascade["tiers"] = tier_report(self.selector.tiers())
+            result["cascade"] = cascade
         return result
+
+    def _escalate(self, prompt: str, messages: List[Dict], current: Dict[str, Any], thinking_history: List[Dict[str, Any]],
+                  cascade: Dict[str, Any], details: bool):
+        """Let the escalation tier answer when the judge is not confident in the current response.
+
+        The judge rates the current response; below the strategy's threshold the
+        escalation client writes an alternative that has to win one more evaluation.
+        Updates cascade with the confidence and whether the run escalated.
+
+        Returns:
+            The current response after escalation
+        """
+        escalation = self.selector.escalation_client()
+        if escalation is None:
+            return current
+        judge = self._use(self.selector.evaluator_client())
+        confidence = judge._rate_confidence(prompt, current["response"])
+        cascade["confidence"] = confidence
+        if confidence is not None and confidence >= self.selector.escalate_below:
+            logger.info(f"Judge confidence {confidence:.2f}, no escalation needed")
+            return current
+        logger.info(f"\n=== ESCALATING TO {escalation.provider}/{escalation.model} (confidence {confidence}) ===")
+        escalation = self._use(escalation)
+        alt_messages = messages + [
+            {"role": "assistant", "content": current["response"]},
+            {"role": "user", "content": ALTERNATIVE_PROMPT},
+        ]
+        text = escalation._call_api(alt_messages, temperature=0.7, stream=False, stage="alternatives")
+        cascade["escalated"] = True
+        # One batch judgment: a settled pairwise evaluator would not look at the new answer
+        selected_idx, explanation_text = judge._evaluate_alternatives(prompt, current["response"], [text], neweval=self.evaluator.neweval)
+        alternative = {"response": text, "provider": escalation.provider, "model": escalation.model}
+        if selected_idx == 0:
+            current = alternative
+            logger.info(f"\n    ✓ Selected escalated response: {explanation_text}")
+        else:
+            logger.info(f"\n    ✓ Kept current response over the escalated one: {explanation_text}")
+        thinking_history.append(self._history_entry(
+            len(thinking_history), [ALTERNATIVE_PROMPT] if details else [], [text] if details else [], current,
+            [alternative] if details else [], selected_idx, explanation_text,
+            alternatives_llm=[{"provider": escalation.provider, "model": escalation.model}], escalation=True
+        ))
+        return current
@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Runs whose details are kept at most (the least recently used are dropped first)
+DEFAULT_MAX_RUNS = 200
+# Seconds a run's details are kept after they were last read or stored
+DEFAULT_TTL = 3600.0
+# URI scheme the details of a run are exposed under as MCP resources
+RUN_URI_PREFIX = "cort://runs/"
+
+
+def run_uri(run_id: str) -> str:
+    return RUN_URI_PREFIX + run_id
+
+
+class RunStore:
+    """Thinking history of recent details runs, kept server-side for lazy retrieval.
+
+    The details tools store a run's history here and return its id instead of the
+    history itself; clients then fetch the rounds or fields they need. Runs are
+    dropped ttl seconds after their last use, and the least recently used run is
+    dropped once max_runs is reached. Written from the worker threads.
+    """
+
+    def __init__(self, max_runs: int = DEFAULT_MAX_RUNS, ttl: float = DEFAULT_TTL):
+        self.max_runs = max_runs
+        self.ttl = ttl
+        self._runs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def _purge(self, now: float) -> None:
+        while self._runs:
+            run_id, entry = next(iter(self._runs.items()))
+            if len(self._runs) <= self.max_runs and now - entry["used_at"] <= self.ttl:
+                break
+            del self._runs[run_id]
+
+    def put(self, details: Dict[str, Any]) -> str:
+        """Store a run's details (thinking_rounds, thinking_history, ...) and return its run id."""
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._runs[run_id] = {"details": details, "used_at": now}
+            self._purge(now)
+        logger.debug(f"Stored details of run {run_id} ({len(self._runs)} runs kept)")
+        return run_id
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """A run's details, or None if the run is unknown or expired."""
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            entry = self._runs.get(run_id)
+            if entry is None:
+                return None
+            entry["used_at"] = now
+            self._runs.move_to_end(run_id)
+            return entry["details"]
+
+    def rounds(self, run_id: str, rounds: Optional[List[int]] = None, fields: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """History entries of a run, optionally only the given rounds and fields ("round" is always included).
+
+        Returns:
+            The entries in round order, or None if the run is unknown or expired
+
+        Raises:
+            ValueError: If a requested round does not exist
+        """
+        details = self.get(run_id)
+        if details is None:
+            return None
+        history = details["thinking_history"]
+        if rounds is not None:
+            available = {entry["round"] for entry in history}
+            missing = sorted(set(rounds) - available)
+            if missing:
+                raise ValueError(f"run {run_id} has no rounds {missing} (available: {sorted(available)})")
+            history = [entry for entry in history if entry["round"] in rounds]
+        if fields is not None:
+            history = [{key: entry[key] for key in ["round", *fields] if key in entry} for entry in history]
+        return history
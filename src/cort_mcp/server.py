@@ -2,24 +2,89 @@ import sys
 import os
 import traceback
 import argparse
+import asyncio
+import functools
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import json
 import logging as py_logging
-from typing import Annotated
-from pydantic import Field
+from typing import Annotated, Any, Dict, Literal
+from pydantic import ConfigDict, Field, ValidationError, create_model
 
 # Initialize logging
 py_logging.basicConfig(level=py_logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 # Support relative imports
 try:
-    from .recursive_thinking_ai import EnhancedRecursiveThinkingChat
+    from .recursive_thinking_ai import (
+        EnhancedRecursiveThinkingChat,
+        ThinkingEngine,
+        SingleModelStrategy,
+        MixedModelStrategy,
+        CascadeStrategy,
+        make_evaluator,
+        configure_adaptive,
+        configure_answer_store,
+        configure_stage_limits,
+        configure_alternative_mode,
+        configure_cassette,
+        configure_dedup,
+        MAX_ALTERNATIVES,
+        ALTERNATIVE_MODES,
+        DEFAULT_DEDUP_THRESHOLD,
+        DEFAULT_ESCALATION_THRESHOLD,
+        get_adaptive_policy,
+        get_stage_limits,
+        merge_stage_limits,
+        run_report,
+        DeadlineExceeded,
+    )
+    from .answer_store import AnswerStore, DEFAULT_MAX_ENTRIES as DEFAULT_ANSWER_STORE_SIZE, DEFAULT_THRESHOLD as DEFAULT_ANSWER_STORE_THRESHOLD
+    from .adaptive import AdaptivePolicy
+    from .cancellation import CancelToken, RunCancelled, run_with_cancel_token
+    from .cassette import Cassette
+    from .jobs import JobManager, JobQueueFull, DEFAULT_MAX_JOBS, DEFAULT_RUNNING_JOBS, DEFAULT_RETENTION
+    from .profiling import RunProfile, configure_profiling, profiling_enabled, DEFAULT_PROFILE_DIR
+    from .run_store import RunStore, run_uri, DEFAULT_MAX_RUNS, DEFAULT_TTL as DEFAULT_RUN_TTL
+    from .providers import configure_providers, get_provider, load_providers_file, mixed_models, provider_api_key, provider_available
     py_logging.debug("Imported EnhancedRecursiveThinkingChat via relative import")
 except ImportError as e:
     py_logging.debug(f"Relative import failed: {e}, trying absolute import")
     try:
         # When executed directly
-        from cort_mcp.recursive_thinking_ai import EnhancedRecursiveThinkingChat
+        from cort_mcp.recursive_thinking_ai import (
+            EnhancedRecursiveThinkingChat,
+            ThinkingEngine,
+            SingleModelStrategy,
+            MixedModelStrategy,
+            CascadeStrategy,
+            make_evaluator,
+            configure_adaptive,
+            configure_answer_store,
+            configure_stage_limits,
+            configure_alternative_mode,
+            configure_cassette,
+            configure_dedup,
+            MAX_ALTERNATIVES,
+            ALTERNATIVE_MODES,
+            DEFAULT_DEDUP_THRESHOLD,
+            DEFAULT_ESCALATION_THRESHOLD,
+            get_adaptive_policy,
+            get_stage_limits,
+            merge_stage_limits,
+            run_report,
+            DeadlineExceeded,
+        )
+        from cort_mcp.answer_store import AnswerStore, DEFAULT_MAX_ENTRIES as DEFAULT_ANSWER_STORE_SIZE, DEFAULT_THRESHOLD as DEFAULT_ANSWER_STORE_THRESHOLD
+        from cort_mcp.adaptive import AdaptivePolicy
+        from cort_mcp.cancellation import CancelToken, RunCancelled, run_with_cancel_token
+        from cort_mcp.cassette import Cassette
+        from cort_mcp.jobs import JobManager, JobQueueFull, DEFAULT_MAX_JOBS, DEFAULT_RUNNING_JOBS, DEFAULT_RETENTION
+        from cort_mcp.profiling import RunProfile, configure_profiling, profiling_enabled, DEFAULT_PROFILE_DIR
+        from cort_mcp.run_store import RunStore, run_uri, DEFAULT_MAX_RUNS, DEFAULT_TTL as DEFAULT_RUN_TTL
+        from cort_mcp.providers import configure_providers, get_provider, load_providers_file, mixed_models, provider_api_key, provider_available
         py_logging.debug("Imported EnhancedRecursiveThinkingChat via absolute import")
     except ImportError as e2:
         py_logging.debug(f"Absolute import failed: {e2}, trying sys.path modification")
@@ -28,7 +93,37 @@ except ImportError as e:
         py_logging.debug(f"Adding path to sys.path: {src_path}")
         sys.path.append(src_path)
         try:
-            from recursive_thinking_ai import EnhancedRecursiveThinkingChat
+            from recursive_thinking_ai import (
+                EnhancedRecursiveThinkingChat,
+                ThinkingEngine,
+                SingleModelStrategy,
+                MixedModelStrategy,
+                CascadeStrategy,
+                make_evaluator,
+                configure_adaptive,
+                configure_answer_store,
+                configure_stage_limits,
+                configure_alternative_mode,
+                configure_cassette,
+                configure_dedup,
+                MAX_ALTERNATIVES,
+                ALTERNATIVE_MODES,
+                DEFAULT_DEDUP_THRESHOLD,
+                DEFAULT_ESCALATION_THRESHOLD,
+                get_adaptive_policy,
+                get_stage_limits,
+                merge_stage_limits,
+                run_report,
+                DeadlineExceeded,
+            )
+            from answer_store import AnswerStore, DEFAULT_MAX_ENTRIES as DEFAULT_ANSWER_STORE_SIZE, DEFAULT_THRESHOLD as DEFAULT_ANSWER_STORE_THRESHOLD
+            from adaptive import AdaptivePolicy
+            from cancellation import CancelToken, RunCancelled, run_with_cancel_token
+            from cassette import Cassette
+            from jobs import JobManager, JobQueueFull, DEFAULT_MAX_JOBS, DEFAULT_RUNNING_JOBS, DEFAULT_RETENTION
+            from profiling import RunProfile, configure_profiling, profiling_enabled, DEFAULT_PROFILE_DIR
+            from run_store import RunStore, run_uri, DEFAULT_MAX_RUNS, DEFAULT_TTL as DEFAULT_RUN_TTL
+            from providers import configure_providers, get_provider, load_providers_file, mixed_models, provider_api_key, provider_available
             py_logging.debug("Imported EnhancedRecursiveThinkingChat via sys.path modification")
         except ImportError as e3:
             py_logging.error(f"All import attempts failed: {e3}")
@@ -50,6 +145,13 @@ except ImportError as e:
 # Define default values as constants
 DEFAULT_MODEL = "mistralai/mistral-small-3.1-24b-instruct:free"
 DEFAULT_PROVIDER = "openrouter"
+# Number of think runs executed concurrently by one server process
+DEFAULT_THINK_WORKERS = 8
+DEFAULT_HTTP_HOST = "127.0.0.1"
+# Not 8000, where local inference servers such as vLLM listen by default
+DEFAULT_HTTP_PORT = 8765
+# Seconds in-flight requests are given to finish when an HTTP server shuts down
+DEFAULT_GRACEFUL_TIMEOUT = 300
 
 # --- Logging Setup ---
 def setup_logging(log: str, logfile: str):
@@ -148,7 +250,7 @@ def setup_logging(log: str, logfile: str):
         sys.exit(1)
 
 def resolve_model_and_provider(params):
-    print("=== resolve_model_and_provider called ===")
+    # Never print here: stdout is the MCP channel of the stdio transport
     py_logging.info("=== resolve_model_and_provider called ===")
     import os
     # Use existing py_logging (already imported as py_logging)
@@ -163,342 +265,294 @@ def resolve_model_and_provider(params):
     model = params.get("model")
     provider = params.get("provider")
     py_logging.info(f"[DEBUG] params: model={model}, provider={provider}")
-    if not model:
-        model = DEFAULT_MODEL
     if not provider:
         provider = DEFAULT_PROVIDER
+    if not model:
+        # Providers may declare their own default model (e.g. the model a local server has loaded)
+        spec = get_provider(provider)
+        model = (spec and spec["default_model"]) or DEFAULT_MODEL
     py_logging.info(f"[DEBUG] after default: model={model}, provider={provider}")
-    # Check API key existence here (including invalid/unset provider)
-    api_key = get_api_key(provider)
-    py_logging.info(f"[DEBUG] get_api_key(provider={provider}) -> {mask_key(api_key)}")
-    if not api_key:
+    # Check credentials here (including invalid/unset provider); local providers may need none
+    if not provider_available(provider):
         # Invalid provider or no API key -> fallback to default
         provider = DEFAULT_PROVIDER
         model = DEFAULT_MODEL
-        api_key = get_api_key(provider)
-        py_logging.info(f"[DEBUG] fallback: model={model}, provider={provider}, api_key={mask_key(api_key)}")
+        py_logging.info(f"[DEBUG] fallback: model={model}, provider={provider}")
+    api_key = get_api_key(provider)
+    py_logging.info(f"[DEBUG] get_api_key(provider={provider}) -> {mask_key(api_key)}")
     # Additional checks like "model not existing in provider" are detected by exceptions in AI-side API
     return model, provider, api_key
 
 def get_api_key(provider):
-    if provider == "openai":
-        key = os.getenv("OPENAI_API_KEY")
-    elif provider == "openrouter":
-        key = os.getenv("OPENROUTER_API_KEY")
-    else:
-        key = None
-    return key
+    """API key of a registered provider, or None (unknown provider or key not set)."""
+    return provider_api_key(provider)
 
-# Create FastMCP instance
-server = FastMCP(
-    name="Chain-of-Recursive-Thoughts MCP Server",
-    instructions="Provide deeper recursive thinking and reasoning for the given prompt. Use the MCP Server when you encounter complex problems.",
-)
+def multi_worker():
+    """Whether this process is one of several HTTP worker processes (--workers > 1).
 
-# Define tools using decorators
-@server.tool(
-    name="cort.think.simple",
-    description="""
-    Return a simple recursive thinking AI response.
+    The workers share a listening socket in stateless mode, so consecutive requests of
+    a client land on any of them and nothing kept in process memory can be looked up again.
+    """
+    return int(os.getenv("CORT_MCP_WORKERS", "1")) > 1
 
-    Parameters:
-        prompt (str, required): Input prompt for the AI.
-        model (str, optional): LLM model name. If not specified, uses default.
-        provider (str, optional): API provider name. If not specified, uses default.
+# --- Worker pool ---
+# Thinking runs use blocking HTTP calls, so tools hand them to this pool instead of
+# running them on the event loop (which would serialize every client on the process).
+_think_pool = None
 
-    Returns:
-        dict: {
-            "response": AI response (string),
-            "model": model name used (string),
-            "provider": provider name used (string)
-        }
+def get_think_pool():
+    global _think_pool
+    if _think_pool is None:
+        workers = int(os.getenv("CORT_MCP_THINK_WORKERS", DEFAULT_THINK_WORKERS))
+        _think_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cort-think")
+    return _think_pool
 
-    Notes:
-        - If model/provider is omitted, defaults are used.
-        - Do not pass null or empty string for optional params.
-        - See README for fallback logic on API errors.
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking thinking call on the worker pool and await its result.
+
+    When the awaiting task is cancelled (the MCP client cancelled the request or went
+    away, or a background job was cancelled), the run is cancelled as well: no further
+    rounds are started and in-flight provider requests are aborted. The cancellation
+    is passed on once the worker has stopped, so a job keeps its running slot until then.
     """
-)
-async def cort_think_simple(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")],
-    model: Annotated[str | None, Field(description="LLM model name. If not specified, uses default.")]=None,
-    provider: Annotated[str | None, Field(description="API provider name. If not specified, uses default.")]=None
-):
-    resolved_model, resolved_provider, api_key = resolve_model_and_provider({"model": model, "provider": provider})
-    py_logging.info(f"cort_think_simple called: prompt={prompt} model={resolved_model} provider={resolved_provider}")
-    if not prompt:
-        py_logging.warning("cort_think_simple: prompt is required")
-        return {
-            "error": "prompt is required"
-        }
+    token = CancelToken()
+    work = get_think_pool().submit(run_with_cancel_token, token, fn, *args, **kwargs)
     try:
-        chat = EnhancedRecursiveThinkingChat(api_key=api_key, model=resolved_model, provider=resolved_provider)
-        result = chat.think(prompt, details=False)
-        py_logging.info("cort_think_simple: result generated successfully")
-        return {
-            "response": result.get("response"),
-            "model": result.get("model"),
-            "provider": result.get("provider")
-        }
-    except Exception as e:
-        py_logging.exception(f"[ERROR] cort_think_simple failed: {e}")
-        fallback_api_key = get_api_key(DEFAULT_PROVIDER)
-        if fallback_api_key:
-            try:
-                chat = EnhancedRecursiveThinkingChat(api_key=fallback_api_key, model=DEFAULT_MODEL, provider=DEFAULT_PROVIDER)
-                result = chat.think(prompt, details=False)
-                py_logging.info("cort_think_simple: fallback result generated successfully")
-                return {
-                    "response": result.get("response"),
-                    "model": result.get("model"),
-                    "provider": result.get("provider")
-                }
-            except Exception as e2:
-                py_logging.exception(f"[ERROR] cort_think_simple fallback also failed: {e2}")
-                return {
-                    "error": f"Failed to process request: {str(e)}. Fallback also failed: {str(e2)}"
-                }
-        else:
-            py_logging.error("cort_think_simple: API key for OpenAI is missing (cannot fallback)")
-            return {
-                "error": f"Failed to process request: {str(e)}. API key for OpenAI is missing (cannot fallback)"
-            }
+        return await asyncio.wrap_future(work)
+    except asyncio.CancelledError:
+        py_logging.info("Request cancelled, stopping its thinking run")
+        token.cancel()
+        if not work.cancel():
+            await asyncio.wait([asyncio.wrap_future(work)])
+        raise
 
-@server.tool(
-    name="cort.think.simple.neweval",
-    description="""
-    Return a simple recursive thinking AI response (new evaluation prompt version).
+def details_yaml(result):
+    """Thinking rounds and history of a result as a YAML string."""
+    return yaml.safe_dump({
+        "thinking_rounds": result.get("thinking_rounds"),
+        "thinking_history": result.get("thinking_history")
+    }, allow_unicode=True, sort_keys=False)
 
-    Parameters:
-        prompt (str, required): Input prompt for the AI.
-        model (str, optional): LLM model name. If not specified, uses default.
-        provider (str, optional): API provider name. If not specified, uses default.
+_run_store = None
 
-    Returns:
-        dict: {
-            "response": AI response (string),
-            "model": model name used (string),
-            "provider": provider name used (string)
-        }
+def get_run_store():
+    global _run_store
+    if _run_store is None:
+        _run_store = RunStore(
+            max_runs=int(os.getenv("CORT_MCP_RUN_STORE_SIZE", DEFAULT_MAX_RUNS)),
+            ttl=float(os.getenv("CORT_MCP_RUN_TTL", DEFAULT_RUN_TTL)),
+        )
+    return _run_store
+
+def details_fields(result, inline_details=False):
+    """Response fields of a details tool: the id and URI of the stored history (and the history as YAML if inlined).
 
-    Notes:
-        - If model/provider is omitted, defaults are used.
-        - Do not pass null or empty string for optional params.
-        - See README for fallback logic on API errors.
+    With several worker processes the follow-up reads would usually reach another
+    worker, so the history is inlined instead of stored.
     """
-)
-async def cort_think_simple_neweval(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")],
-    model: Annotated[str | None, Field(description="LLM model name. If not specified, uses default.")]=None,
-    provider: Annotated[str | None, Field(description="API provider name. If not specified, uses default.")]=None
-):
-    resolved_model, resolved_provider, api_key = resolve_model_and_provider({"model": model, "provider": provider})
-    py_logging.info(f"cort_think_simple_neweval called: prompt={prompt} model={resolved_model} provider={resolved_provider}")
-    if not prompt:
-        py_logging.warning("cort_think_simple_neweval: prompt is required")
-        return {
-            "error": "prompt is required"
-        }
+    if multi_worker():
+        return {"thinking_rounds": result.get("thinking_rounds"), "details": details_yaml(result)}
+    run_id = get_run_store().put({"thinking_rounds": result.get("thinking_rounds"), "thinking_history": result.get("thinking_history")})
+    fields = {"run_id": run_id, "details_uri": run_uri(run_id), "thinking_rounds": result.get("thinking_rounds")}
+    if inline_details:
+        fields["details"] = details_yaml(result)
+    return fields
+
+def generate_with_single_llm(prompt, api_key, model, provider, details=False, neweval=False, num_alternatives=3, deadline_ms=None, eval_mode="batch", stage_limits=None, alternative_mode=None):
+    """Run the thinking engine with one model for every stage."""
+    chat = EnhancedRecursiveThinkingChat(api_key=api_key, model=model, provider=provider)
+    engine = ThinkingEngine(SingleModelStrategy(chat), make_evaluator(eval_mode, neweval=neweval))
+    return engine.run(prompt, num_alternatives=num_alternatives, details=details, deadline_ms=deadline_ms, stage_limits=stage_limits,
+                      alternative_mode=alternative_mode)
+
+def check_stage_limits(stage_limits):
+    """Error response for invalid per-call stage limits, or None."""
     try:
-        chat = EnhancedRecursiveThinkingChat(api_key=api_key, model=resolved_model, provider=resolved_provider)
-        result = chat.think(prompt, details=False, neweval=True)
-        py_logging.info("cort_think_simple_neweval: result generated successfully")
-        return {
-            "response": result.get("response"),
-            "model": result.get("model"),
-            "provider": result.get("provider")
-        }
-    except Exception as e:
-        py_logging.exception(f"[ERROR] cort_think_simple_neweval failed: {e}")
-        fallback_api_key = get_api_key(DEFAULT_PROVIDER)
-        if fallback_api_key:
-            try:
-                chat = EnhancedRecursiveThinkingChat(api_key=fallback_api_key, model=DEFAULT_MODEL, provider=DEFAULT_PROVIDER)
-                result = chat.think(prompt, details=False, neweval=True)
-                py_logging.info("cort_think_simple_neweval: fallback result generated successfully")
-                return {
-                    "response": result["response"],
-                    "model": DEFAULT_MODEL,
-                    "provider": f"{DEFAULT_PROVIDER} (fallback)"
-                }
-            except Exception as e2:
-                py_logging.exception(f"[ERROR] cort_think_simple_neweval fallback also failed: {e2}")
-                return {
-                    "error": f"Failed to process request: {str(e)}. Fallback also failed: {str(e2)}"
-                }
-        else:
-            py_logging.error("cort_think_simple_neweval: API key for OpenAI is missing (cannot fallback)")
-            return {
-                "error": f"Failed to process request: {str(e)}. API key for OpenAI is missing (cannot fallback)"
-            }
+        merge_stage_limits(get_stage_limits(), stage_limits)
+    except ValueError as e:
+        py_logging.warning(f"Invalid stage_limits: {e}")
+        return {"error": f"Invalid stage_limits: {e}"}
+    return None
 
-@server.tool(
-    name="cort.think.details",
-    description="""
-    Returns a recursive thinking AI response with full reasoning details.
+def single_model_response(result, model, provider, details, inline_details=False):
+    response = {"response": result["response"]}
+    if details:
+        response.update(details_fields(result, inline_details))
+    response.update({"model": model, "provider": provider, **run_report(result)})
+    return response
 
-    Parameters:
-        prompt (str, required): Input prompt for the AI.
-        model (str, optional): LLM model name. If not specified, the default model is used.
-        provider (str, optional): API provider name. If not specified, the default provider is used.
+def single_model_call(prompt, api_key, model, provider, label=None, inline_details=False, **options):
+    """Run generate_with_single_llm and build the tool response (label overrides the reported provider)."""
+    result = generate_with_single_llm(prompt, api_key, model, provider, **options)
+    return single_model_response(result, model, label or provider, options.get("details", False), inline_details)
 
-    Returns:
-        dict: {
-            "response": Final AI response (string),
-            "details": Reasoning process history (YAML string),
-            "model": Model name used (string),
-            "provider": Provider name used (string)
-        }
+def call_profiled(name, profile, fn, *args, **kwargs):
+    """Call fn, under a RunProfile when profile is set or the server runs with --profile.
 
-    Notes:
-        - If model/provider is omitted, defaults are applied automatically.
-        - On exceptions, fallback logic is applied.
-        - Reasoning history is included in the 'details' key as YAML.
+    fn builds the complete tool response (YAML dumps included) so the profile covers
+    everything the worker does for the call; the profile report is added to it.
+    """
+    if not (profile or profiling_enabled()):
+        return fn(*args, **kwargs)
+    with RunProfile(name) as run_profile:
+        response = fn(*args, **kwargs)
+    response["profile"] = run_profile.report()
+    return response
+
+async def run_single_model_tool(name, prompt, model, provider, details=False, neweval=False, num_alternatives=3, deadline_ms=None, eval_mode="batch", stage_limits=None, alternative_mode=None, inline_details=False, profile=False):
+    """Shared body of the single-model tools.
+
+    Resolves model/provider, runs the engine on the worker pool and retries once with
+    the default model/provider when the run fails.
     """
-)
-async def cort_think_details(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")],
-    model: Annotated[str | None, Field(description="LLM model name to use.\n- Recommended (OpenAI): 'gpt-4.1-nano'\n- Recommended (OpenRouter): 'meta-llama/llama-4-maverick:free'\n- Default: mistralai/mistral-small-3.1-24b-instruct:free\nRefer to the official provider list for available models. If not specified, the default model will be used automatically.")]=None,
-    provider: Annotated[str | None, Field(description="API provider name to use.\n- Allowed: 'openai' or 'openrouter'\n- Default: openrouter\nModel availability depends on the provider. Please ensure the correct combination. If not specified, the default provider will be used automatically.")]=None
-):
     resolved_model, resolved_provider, api_key = resolve_model_and_provider({"model": model, "provider": provider})
-    py_logging.info(f"cort_think_details called: prompt={prompt} model={resolved_model} provider={resolved_provider}")
+    py_logging.info(f"{name} called: prompt={prompt} model={resolved_model} provider={resolved_provider}")
     if not prompt:
-        py_logging.warning("cort_think_details: prompt is required")
+        py_logging.warning(f"{name}: prompt is required")
         return {
             "error": "prompt is required"
         }
+    error = check_stage_limits(stage_limits)
+    if error:
+        return error
+    options = {"details": details, "neweval": neweval, "num_alternatives": num_alternatives, "deadline_ms": deadline_ms, "eval_mode": eval_mode, "stage_limits": stage_limits,
+               "alternative_mode": alternative_mode, "inline_details": inline_details}
+    started = time.monotonic()
     try:
-        chat = EnhancedRecursiveThinkingChat(api_key=api_key, model=resolved_model, provider=resolved_provider)
-        result = chat.think(prompt, details=True)
-        yaml_log = yaml.safe_dump({
-            "thinking_rounds": result.get("thinking_rounds"),
-            "thinking_history": result.get("thinking_history")
-        }, allow_unicode=True, sort_keys=False)
-        py_logging.info("cort_think_details: result generated successfully")
-        return {
-            "response": result["response"],
-            "details": yaml_log,
-            "model": resolved_model,
-            "provider": resolved_provider
-        }
+        response = await run_blocking(call_profiled, name, profile, single_model_call, prompt, api_key, resolved_model, resolved_provider, **options)
+        py_logging.info(f"{name}: result generated successfully")
+        return response
+    except (RunCancelled, DeadlineExceeded):
+        # A cancelled or timed-out run must not start another one on the fallback provider
+        raise
     except Exception as e:
-        py_logging.exception(f"[ERROR] cort_think_details failed: {e}")
+        py_logging.exception(f"[ERROR] {name} failed: {e}")
+        if deadline_ms is not None:
+            # The fallback only gets what is left of the caller's latency budget
+            options["deadline_ms"] = deadline_ms - int((time.monotonic() - started) * 1000)
+            if options["deadline_ms"] <= 0:
+                py_logging.error(f"{name}: deadline reached (cannot fallback)")
+                return {
+                    "error": f"Failed to process request: {str(e)}. Deadline reached (cannot fallback)"
+                }
         fallback_api_key = get_api_key(DEFAULT_PROVIDER)
         if fallback_api_key:
             try:
-                chat = EnhancedRecursiveThinkingChat(api_key=fallback_api_key, model=DEFAULT_MODEL, provider=DEFAULT_PROVIDER)
-                result = chat.think(prompt, details=True)
-                yaml_log = yaml.safe_dump({
-                    "thinking_rounds": result.get("thinking_rounds"),
-                    "thinking_history": result.get("thinking_history")
-                }, allow_unicode=True, sort_keys=False)
-                py_logging.info("cort_think_details: fallback result generated successfully")
-                return {
-                    "response": result["response"],
-                    "details": yaml_log,
-                    "model": DEFAULT_MODEL,
-                    "provider": f"{DEFAULT_PROVIDER} (fallback)"
-                }
+                response = await run_blocking(call_profiled, name, profile, single_model_call, prompt, fallback_api_key, DEFAULT_MODEL, DEFAULT_PROVIDER,
+                                              label=f"{DEFAULT_PROVIDER} (fallback)", **options)
+                py_logging.info(f"{name}: fallback result generated successfully")
+                return response
             except Exception as e2:
-                py_logging.exception(f"[ERROR] cort_think_details fallback also failed: {e2}")
+                py_logging.exception(f"[ERROR] {name} fallback also failed: {e2}")
                 return {
                     "error": f"Failed to process request: {str(e)}. Fallback also failed: {str(e2)}"
                 }
         else:
-            py_logging.error("cort_think_details: API key for OpenAI is missing (cannot fallback)")
+            py_logging.error(f"{name}: API key for {DEFAULT_PROVIDER} is missing (cannot fallback)")
             return {
-                "error": f"Failed to process request: {str(e)}. API key for OpenAI is missing (cannot fallback)"
+                "error": f"Failed to process request: {str(e)}. API key for {DEFAULT_PROVIDER} is missing (cannot fallback)"
             }
 
+# Create FastMCP instance
+server = FastMCP(
+    name="Chain-of-Recursive-Thoughts MCP Server",
+    instructions="Provide deeper recursive thinking and reasoning for the given prompt. Use the MCP Server when you encounter complex problems.",
+)
+
+# Parameters shared by the cort.think.* tools
+Prompt = Annotated[str, Field(description="Input prompt for the AI (required)")]
+Model = Annotated[str | None, Field(description="LLM model name to use.\n- Recommended (OpenAI): 'gpt-4.1-nano'\n- Recommended (OpenRouter): 'meta-llama/llama-4-maverick:free'\n- Default: mistralai/mistral-small-3.1-24b-instruct:free\nRefer to the official provider list for available models. If not specified, the default model will be used automatically.")]
+Provider = Annotated[str | None, Field(description="API provider name to use.\n- Allowed: 'openai', 'openrouter', the local servers 'vllm', 'llamacpp' and 'ollama', or a provider from the --providers file\n- Default: openrouter\nModel availability depends on the provider. Please ensure the correct combination. If not specified, the default provider will be used automatically.")]
+NumAlternatives = Annotated[int, Field(ge=1, le=MAX_ALTERNATIVES, description=f"Number of alternatives generated per round (1-{MAX_ALTERNATIVES}). Wide rounds are evaluated in parallel shards.")]
+DeadlineMs = Annotated[int | None, Field(ge=1, description="Optional latency budget in milliseconds. The best response so far is returned when the budget runs out, together with 'rounds_completed' and 'deadline_reached'.")]
+EvalMode = Annotated[Literal["batch", "pairwise"], Field(description="'batch' judges all alternatives of a round in one prompt. 'pairwise' compares each new alternative with the current best only, remembers verdicts across rounds and stops once the current best has a clear lead; the result then carries an 'evaluation' summary.")]
+StageLimits = Annotated[dict[str, dict[str, Any]] | None, Field(description="Optional per-stage generation limits overriding the server defaults. Stages: 'rounds', 'base', 'alternatives', 'evaluation'. Limits: 'reasoning' (reasoning token budget, 0 disables), 'max_tokens' (output cap), 'stop' (stop sequences). Example: {\"alternatives\": {\"max_tokens\": 800}}")]
+AlternativeMode = Annotated[Literal["full", "edit"] | None, Field(description="'full' regenerates each alternative from scratch. 'edit' asks for SEARCH/REPLACE edits of the current best response (long responses only), which cuts output tokens; edits that do not apply fall back to full regeneration. Defaults to the server setting ('full' unless --alternative-mode is given).")]
+InlineDetails = Annotated[bool, Field(description="Also return the full thinking history as YAML under 'details'. By default only 'run_id' and 'details_uri' are returned; fetch rounds or fields on demand with cort.think.history or the cort://runs/{run_id} resources.")]
+Profile = Annotated[bool, Field(description="Capture a CPU profile and a wall-clock stage breakdown (Python vs. network time) of this call. Files are written to the server's profile directory and the breakdown is returned under 'profile'.")]
+NewEval = Annotated[bool, Field(description="Use the new evaluation prompt.")]
+DraftModel = Annotated[str | None, Field(description="Fast model for the base response and the alternatives. If not specified, uses default.")]
+DraftProvider = Annotated[str | None, Field(description="API provider of the draft model (e.g. a local server such as 'vllm'). If not specified, uses default.")]
+JudgeModel = Annotated[str | None, Field(description="Stronger model used only for evaluation. If not specified, uses default.")]
+JudgeProvider = Annotated[str | None, Field(description="API provider of the judge model. If not specified, uses default.")]
+EscalationModel = Annotated[str | None, Field(description="Strong model called only when the judge's confidence in the final response is low. Omit (with escalation_provider) to disable escalation.")]
+EscalationProvider = Annotated[str | None, Field(description="API provider of the escalation model.")]
+EscalateBelow = Annotated[float, Field(ge=0, le=1, description="Judge confidence (0-1) below which the run escalates.")]
+
+# Define tools using decorators
 @server.tool(
-    name="cort.think.details.neweval",
-    description="""
-    Returns a recursive thinking AI response with full reasoning details (new evaluation prompt version).
+    name="cort.think.simple",
+    description="Return a recursive thinking AI response with its model and provider.",
+)
+async def cort_think_simple(
+    prompt: Prompt,
+    model: Model = None,
+    provider: Provider = None,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    profile: Profile = False
+):
+    return await run_single_model_tool("cort_think_simple", prompt, model, provider, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, profile=profile)
 
-    Features:
-        - Provides a recursive thinking AI response and the reasoning process/history (YAML format) for the given prompt.
 
-    Parameters:
-        prompt (str, required): Input prompt for the AI.
-        model (str, optional): LLM model name. If not specified, the default model is used.
-            - Recommended (OpenAI): "gpt-4.1-nano"
-            - Recommended (OpenRouter): "meta-llama/llama-4-maverick:free"
-            - Default: mistralai/mistral-small-3.1-24b-instruct:free
-            - Please refer to the official provider list for available models.
-        provider (str, optional): API provider name. If not specified, the default provider is used.
-            - Allowed: "openai" or "openrouter"
-            - Default: openrouter
-            - Model availability depends on the provider. Please ensure the correct combination.
+@server.tool(
+    name="cort.think.simple.neweval",
+    description="Return a recursive thinking AI response with its model and provider (new evaluation prompt version).",
+)
+async def cort_think_simple_neweval(
+    prompt: Prompt,
+    model: Model = None,
+    provider: Provider = None,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    profile: Profile = False
+):
+    return await run_single_model_tool("cort_think_simple_neweval", prompt, model, provider, neweval=True, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, profile=profile)
 
-    Returns:
-        dict: {
-            "response": AI response (string),
-            "details": Reasoning process/history (YAML string),
-            "model": Model name used (string),
-            "provider": Provider name used (string)
-        }
 
-    Notes:
-        - If model/provider is omitted, omit the parameter entirely.
-        - Passing null or empty string may cause API errors.
-        - For fallback behavior on API errors, see the "Parameter Specification and Fallback Handling" section in README.md.
-    """
+@server.tool(
+    name="cort.think.details",
+    description="Return a recursive thinking AI response with the run_id/details_uri of its thinking history (see cort.think.history).",
+)
+async def cort_think_details(
+    prompt: Prompt,
+    model: Model = None,
+    provider: Provider = None,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    inline_details: InlineDetails = False,
+    profile: Profile = False
+):
+    return await run_single_model_tool("cort_think_details", prompt, model, provider, details=True, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, inline_details=inline_details, profile=profile)
+
+
+@server.tool(
+    name="cort.think.details.neweval",
+    description="Return a recursive thinking AI response with the run_id/details_uri of its thinking history (new evaluation prompt version).",
 )
 async def cort_think_details_neweval(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")],
-    model: Annotated[str | None, Field(description="LLM model name to use.\n- Recommended (OpenAI): 'gpt-4.1-nano'\n- Recommended (OpenRouter): 'meta-llama/llama-4-maverick:free'\n- Default: mistralai/mistral-small-3.1-24b-instruct:free\nRefer to the official provider list for available models. If not specified, the default model will be used automatically.")]=None,
-    provider: Annotated[str | None, Field(description="API provider name to use.\n- Allowed: 'openai' or 'openrouter'\n- Default: openrouter\nModel availability depends on the provider. Please ensure the correct combination. If not specified, the default provider will be used automatically.")]=None
+    prompt: Prompt,
+    model: Model = None,
+    provider: Provider = None,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    inline_details: InlineDetails = False,
+    profile: Profile = False
 ):
-    resolved_model, resolved_provider, api_key = resolve_model_and_provider({"model": model, "provider": provider})
-    py_logging.info(f"cort_think_details_neweval called: prompt={prompt} model={resolved_model} provider={resolved_provider}")
-    if not prompt:
-        py_logging.warning("cort_think_details_neweval: prompt is required")
-        return {
-            "error": "prompt is required"
-        }
-    try:
-        chat = EnhancedRecursiveThinkingChat(api_key=api_key, model=resolved_model, provider=resolved_provider)
-        result = chat.think(prompt, details=True, neweval=True)
-        yaml_log = yaml.safe_dump({
-            "thinking_rounds": result.get("thinking_rounds"),
-            "thinking_history": result.get("thinking_history")
-        }, allow_unicode=True, sort_keys=False)
-        py_logging.info("cort_think_details_neweval: result generated successfully")
-        return {
-            "response": result["response"],
-            "details": yaml_log,
-            "model": resolved_model,
-            "provider": resolved_provider
-        }
-    except Exception as e:
-        py_logging.exception(f"[ERROR] cort_think_details_neweval failed: {e}")
-        fallback_api_key = get_api_key(DEFAULT_PROVIDER)
-        if fallback_api_key:
-            try:
-                chat = EnhancedRecursiveThinkingChat(api_key=fallback_api_key, model=DEFAULT_MODEL, provider=DEFAULT_PROVIDER)
-                result = chat.think(prompt, details=True)
-                yaml_log = yaml.safe_dump({
-                    "thinking_rounds": result.get("thinking_rounds"),
-                    "thinking_history": result.get("thinking_history")
-                }, allow_unicode=True, sort_keys=False)
-                py_logging.info("cort_think_details_neweval: fallback result generated successfully")
-                return {
-                    "response": result["response"],
-                    "details": yaml_log,
-                    "model": DEFAULT_MODEL,
-                    "provider": f"{DEFAULT_PROVIDER} (fallback)"
-                }
-            except Exception as e2:
-                py_logging.exception(f"[ERROR] cort_think_details_neweval fallback also failed: {e2}")
-                return {
-                    "error": f"Failed to process request: {str(e)}. Fallback also failed: {str(e2)}"
-                }
-        else:
-            py_logging.error("cort_think_details_neweval: API key for OpenAI is missing (cannot fallback)")
-            return {
-                "error": f"Failed to process request: {str(e)}. API key for OpenAI is missing (cannot fallback)"
-            }
+    return await run_single_model_tool("cort_think_details_neweval", prompt, model, provider, details=True, neweval=True, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, inline_details=inline_details, profile=profile)
+
 
 # --- Mixed LLM List Definition ---
 MIXED_LLM_LIST = [
@@ -511,18 +565,18 @@ MIXED_LLM_LIST = [
 ]
 
 def get_available_mixed_llms():
-    """Return only LLMs with valid API keys"""
+    """Return only LLMs whose provider is usable (API key set, or none needed).
+
+    Providers from the providers file join the pool through their mixed_models entries.
+    """
     available = []
-    for entry in MIXED_LLM_LIST:
-        api_key = get_api_key(entry["provider"])
-        if api_key:
-            available.append({**entry, "api_key": api_key})
+    for entry in MIXED_LLM_LIST + mixed_models():
+        if provider_available(entry["provider"]):
+            available.append({**entry, "api_key": get_api_key(entry["provider"])})
     return available
 
-import random
-from typing import Dict, Any
-
-def generate_with_mixed_llm(prompt: str, details: bool = False, neweval: bool = False) -> Dict[str, Any]:
+def generate_with_mixed_llm(prompt: str, details: bool = False, neweval: bool = False, num_alternatives: int = 3, deadline_ms: int | None = None, eval_mode: str = "batch", stage_limits: Dict[str, Dict[str, Any]] | None = None, alternative_mode: str | None = None) -> Dict[str, Any]:
+    """Run the thinking engine with a randomly chosen LLM for each alternative."""
     available_llms = get_available_mixed_llms()
     if not prompt:
         py_logging.warning("mixed_llm: prompt is required")
@@ -530,274 +584,507 @@ def generate_with_mixed_llm(prompt: str, details: bool = False, neweval: bool =
     if not available_llms:
         py_logging.error("mixed_llm: No available LLMs (API key missing)")
         return {"error": "No available LLMs (API key missing)"}
- 
-    # --- Number of rounds and alternatives are determined by AI based on existing logic ---
-    # First, randomly select a base LLM
-    base_llm = random.choice(available_llms)
-    chat = EnhancedRecursiveThinkingChat(api_key=base_llm["api_key"], model=base_llm["model"], provider=base_llm["provider"])
-    # Generate base response (initial)
-    thinking_rounds = chat._determine_thinking_rounds(prompt)
-    py_logging.info("\n=== GENERATING INITIAL RESPONSE ===")
-    py_logging.info(f"Base LLM: provider={base_llm['provider']}, model={base_llm['model']}, rounds={thinking_rounds}")
-    base_response = chat._call_api([{"role": "user", "content": prompt}], temperature=0.7, stream=False)
-    # --- base_response contains only AI response (similar to simple mode) ---
-    # If API response is a dict or structure, extract only content key; otherwise, use as is
-    if isinstance(base_response, dict) and "content" in base_response:
-        current_best = base_response["content"]
-    else:
-        current_best = base_response
-    py_logging.info("=" * 50)
-    thinking_history = [{
-        "round": 0,
-        "llm_prompt": prompt,
-        "llm_response": base_response,
-        "response": base_response,
-        "alternatives": [],
-        "selected": -1,
-        "explanation": "Initial base response",
-        "provider": base_llm["provider"],
-        "model": base_llm["model"]
-    }]
-    # Generate alternatives for each round
-    # Use the same logic as EnhancedRecursiveThinkingChat.think (num_alternatives)
-    num_alternatives = 3
-    if hasattr(chat, 'num_alternatives'):
-        num_alternatives = chat.num_alternatives
-    for r in range(thinking_rounds):
-        py_logging.info(f"\n=== ROUND {r+1}/{thinking_rounds} ===")
-        alternatives = []
-        alt_llm_info = []
-        alt_llm_responses = []
-        alt_llm_prompts = []
-        for i in range(num_alternatives):
-            py_logging.info(f"\n✨ ALTERNATIVE {i+1} ✨")
-            alt_llm = random.choice(available_llms)
-            alt_prompt = f"""Original message: {prompt}\n\nCurrent response: {current_best}\n\nGenerate an alternative response that might be better. Be creative and consider different approaches.\nAlternative response:"""
-            alt_messages = [{"role": "user", "content": alt_prompt}]
-            alt_chat = EnhancedRecursiveThinkingChat(api_key=alt_llm["api_key"], model=alt_llm["model"], provider=alt_llm["provider"])
-            alt_response = alt_chat._call_api(alt_messages, temperature=0.7 + i * 0.1, stream=False)
-            # --- alt_response also contains only AI response (similar to simple mode) ---
-            if isinstance(alt_response, dict) and "content" in alt_response:
-                alt_response_text = alt_response["content"]
-            else:
-                alt_response_text = alt_response
-            py_logging.info(f"Alternative {i+1}: provider={alt_llm['provider']}, model={alt_llm['model']}")
-            alternatives.append({
-                "response": alt_response_text,
-                "provider": alt_llm["provider"],
-                "model": alt_llm["model"]
-            })
-            alt_llm_info.append({"provider": alt_llm["provider"], "model": alt_llm["model"]})
-            alt_llm_responses.append(alt_response)
-            alt_llm_prompts.append(alt_prompt)
-        # Evaluation is performed by base LLM (following current CoRT practice)
-        py_logging.info("\n=== EVALUATING RESPONSES ===")
-        alts_text = "\n".join([f"{i+1}. {alt['response']}" for i, alt in enumerate(alternatives)])
-        # Evaluation prompt is centrally managed on AI core side
-        eval_prompt = chat._build_eval_prompt(prompt, current_best, [alt['response'] for alt in alternatives], neweval=neweval)
-        eval_messages = [{"role": "user", "content": eval_prompt}]
-        evaluation = chat._call_api(eval_messages, temperature=0.2, stream=False)
-        py_logging.info("=" * 50)
- 
-        lines = [line.strip() for line in evaluation.split('\n') if line.strip()]
-        choice = 'current'
-        explanation_text = "No explanation provided"
-        if lines:
-            first_line = lines[0].lower()
-            if 'current' in first_line:
-                choice = 'current'
-            else:
-                for char in first_line:
-                    if char.isdigit():
-                        choice = char
-                        break
-            if len(lines) > 1:
-                explanation_text = ' '.join(lines[1:])
-        if choice == 'current':
-            selected_response = current_best
-            selected_idx = -1
-            py_logging.info(f"\n    ✓ Kept current response: {explanation_text}")
-        else:
-            try:
-                idx = int(choice) - 1
-                if 0 <= idx < len(alternatives):
-                    selected_response = alternatives[idx]["response"]
-                    selected_idx = idx
-                    py_logging.info(f"\n    ✓ Selected alternative {idx+1}: {explanation_text}")
-                else:
-                    selected_response = current_best
-                    selected_idx = -1
-                    py_logging.info(f"\n    ✓ Invalid selection, keeping current response")
-            except Exception:
-                selected_response = current_best
-                selected_idx = -1
-                py_logging.info(f"\n    ✓ Could not parse selection, keeping current response")
-        # Record the selected provider/model
-        if selected_idx != -1 and 0 <= selected_idx < len(alternatives):
-            sel_provider = alternatives[selected_idx]["provider"]
-            sel_model = alternatives[selected_idx]["model"]
-        else:
-            # current_best is either base_llm or previous best
-            # Pick from the last thinking_history (if not, use base_llm)
-            if thinking_history:
-                sel_provider = thinking_history[-1].get("provider", base_llm["provider"])
-                sel_model = thinking_history[-1].get("model", base_llm["model"])
-            else:
-                sel_provider = base_llm["provider"]
-                sel_model = base_llm["model"]
-        thinking_history.append({
-            "round": r + 1,
-            "llm_prompt": alt_llm_prompts,
-            "llm_response": alt_llm_responses,
-            "response": selected_response,
-            "alternatives": alternatives,
-            "selected": selected_idx,
-            "explanation": explanation_text,
-            "alternatives_llm": alt_llm_info,
-            "provider": sel_provider,
-            "model": sel_model
-        })
-        current_best = selected_response
-    py_logging.info("\n" + "=" * 50)
-    py_logging.info("🎯 FINAL RESPONSE SELECTED")
-    py_logging.info("=" * 50)
-    result = {"response": current_best}
-    # Regardless of details, always return minimal meta information
-    result["thinking_rounds"] = thinking_rounds
-    result["thinking_history"] = thinking_history
-    # Always store the provider/model that generated the final response in best (for simple mode)
-    last_provider = None
-    last_model = None
-    if thinking_history and isinstance(thinking_history[-1], dict):
-        last_provider = thinking_history[-1].get("provider")
-        last_model = thinking_history[-1].get("model")
-    # Prevent null values just in case
-    if not last_provider or not last_model:
-        # Get from the last alternatives (if options exist)
-        last_alts = thinking_history[-1].get("alternatives", [])
-        if last_alts and isinstance(last_alts, list):
-            last_alt = last_alts[-1]
-            last_provider = last_provider or last_alt.get("provider")
-            last_model = last_model or last_alt.get("model")
-    # If still not found, use base_llm
-    if not last_provider:
-        last_provider = base_llm["provider"]
-    if not last_model:
-        last_model = base_llm["model"]
-    result["best"] = {
-        "response": current_best,
-        "provider": last_provider,
-        "model": last_model
-    }
+    engine = ThinkingEngine(MixedModelStrategy(available_llms), make_evaluator(eval_mode, neweval=neweval))
+    return engine.run(prompt, num_alternatives=num_alternatives, details=details, deadline_ms=deadline_ms, stage_limits=stage_limits,
+                      alternative_mode=alternative_mode)
+
+def mixed_llm_call(prompt, details=False, inline_details=False, **options):
+    """Run generate_with_mixed_llm and build the tool response."""
+    result = generate_with_mixed_llm(prompt, details=details, **options)
+    if "error" in result:
+        return result
+    best = result["best"]
+    response = {"response": result["response"]}
     if details:
-        # Additional information only in details mode
-        result["alternatives"] = thinking_history[-1]["alternatives"] if thinking_history else []
-    return result
+        response.update(details_fields(result, inline_details))
+    response.update({"model": best["model"], "provider": best["provider"], **run_report(result)})
+    return response
 
-# --- MCP Tool Definitions ---
-from typing import Annotated
-from pydantic import Field
+async def run_mixed_llm_tool(prompt, details=False, neweval=False, num_alternatives=3, deadline_ms=None, eval_mode="batch", stage_limits=None, alternative_mode=None, inline_details=False, profile=False):
+    """Shared body of the mixed-LLM tools."""
+    error = check_stage_limits(stage_limits)
+    if error:
+        return error
+    return await run_blocking(call_profiled, "mixed_llm", profile, mixed_llm_call, prompt, details=details, neweval=neweval, num_alternatives=num_alternatives,
+                              deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode,
+                              inline_details=inline_details)
 
+# --- MCP Tool Definitions ---
 @server.tool(
     name="cort.think.simple_mixed_llm",
-    description="Generate recursive thinking AI response using a different LLM (provider/model) for each alternative. No history/details output. Parameters: prompt (str, required). model/provider cannot be specified (randomly selected internally). Provider/model info for each alternative is always logged and included in the output.",
+    description="Return a recursive thinking AI response, generating each alternative with a randomly selected LLM (provider/model).",
 )
 async def cort_think_simple_mixed_llm(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")]
+    prompt: Prompt,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    profile: Profile = False
 ):
-    result = generate_with_mixed_llm(prompt, details=False)
-    # 必要な情報のみ抽出
-    response = result.get("response")
-    best = result.get("best")
-    return {
-        "response": response,
-        "model": best.get("model"),
-        "provider": best.get("provider")
-    }
+    return await run_mixed_llm_tool(prompt, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, profile=profile)
+
 
 @server.tool(
     name="cort.think.simple_mixed_llm.neweval",
-    description="""
-    Generate recursive thinking AI response using a different LLM (provider/model) for each alternative. No history/details output. (new evaluation prompt version)
+    description="Return a recursive thinking AI response, generating each alternative with a randomly selected LLM (new evaluation prompt version).",
+)
+async def cort_think_simple_mixed_llm_neweval(
+    prompt: Prompt,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    profile: Profile = False
+):
+    return await run_mixed_llm_tool(prompt, neweval=True, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, profile=profile)
 
-    Parameters:
-        prompt (str, required): Input prompt for the AI (required).
-        model/provider cannot be specified (randomly selected internally)。
-        Provider/model info for each alternative is always logged and included in the output.
+
+@server.tool(
+    name="cort.think.details_mixed_llm",
+    description="Return a recursive thinking AI response and the run_id/details_uri of its history, generating each alternative with a randomly selected LLM.",
+)
+async def cort_think_details_mixed_llm(
+    prompt: Prompt,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    inline_details: InlineDetails = False,
+    profile: Profile = False
+):
+    return await run_mixed_llm_tool(prompt, details=True, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, inline_details=inline_details, profile=profile)
+
+
+@server.tool(
+    name="cort.think.details_mixed_llm.neweval",
+    description="Return a recursive thinking AI response and the run_id/details_uri of its history, generating each alternative with a randomly selected LLM (new evaluation prompt version).",
+)
+async def cort_think_details_mixed_llm_neweval(
+    prompt: Prompt,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    inline_details: InlineDetails = False,
+    profile: Profile = False
+):
+    return await run_mixed_llm_tool(prompt, details=True, neweval=True, num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, inline_details=inline_details, profile=profile)
+
+
+# --- Tiered cascade ---
+
+def generate_with_cascade(prompt, tiers, escalate_below=DEFAULT_ESCALATION_THRESHOLD, details=False, neweval=False, num_alternatives=3, deadline_ms=None, eval_mode="batch", stage_limits=None, alternative_mode=None):
+    """Run the thinking engine with a draft tier for generation and a judge tier for evaluation.
+
+    tiers maps "draft", "judge" and optionally "escalation" to resolved (model, provider, api_key) tuples.
+    """
+    clients = {tier: EnhancedRecursiveThinkingChat(api_key=api_key, model=model, provider=provider)
+               for tier, (model, provider, api_key) in tiers.items()}
+    strategy = CascadeStrategy(clients["draft"], clients["judge"], clients.get("escalation"), escalate_below=escalate_below)
+    engine = ThinkingEngine(strategy, make_evaluator(eval_mode, neweval=neweval))
+    return engine.run(prompt, num_alternatives=num_alternatives, details=details, deadline_ms=deadline_ms, stage_limits=stage_limits,
+                      alternative_mode=alternative_mode)
+
+def cascade_call(prompt, tiers, details=False, inline_details=False, **options):
+    """Run generate_with_cascade and build the tool response."""
+    result = generate_with_cascade(prompt, tiers, details=details, **options)
+    return single_model_response(result, result["model"], result["provider"], details, inline_details)
+
+async def run_cascade_tool(name, prompt, tiers, escalate_below=DEFAULT_ESCALATION_THRESHOLD, details=False, neweval=False, num_alternatives=3, deadline_ms=None, eval_mode="batch", stage_limits=None, alternative_mode=None, inline_details=False, profile=False):
+    """Shared body of the cascade tools.
+
+    tiers maps "draft", "judge" and "escalation" to requested (model, provider) pairs. Each
+    tier is resolved like the model/provider of the single-model tools; the escalation tier
+    is left out when neither is given.
+    """
+    if not prompt:
+        py_logging.warning(f"{name}: prompt is required")
+        return {
+            "error": "prompt is required"
+        }
+    error = check_stage_limits(stage_limits)
+    if error:
+        return error
+    resolved = {tier: resolve_model_and_provider({"model": model, "provider": provider})
+                for tier, (model, provider) in tiers.items() if tier != "escalation" or model or provider}
+    tier_names = ", ".join(f"{tier}={provider}/{model}" for tier, (model, provider, _) in resolved.items())
+    py_logging.info(f"{name} called: prompt={prompt} {tier_names}")
+    try:
+        response = await run_blocking(call_profiled, name, profile, cascade_call, prompt, resolved, escalate_below=escalate_below, details=details, neweval=neweval,
+                                      num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode,
+                                      inline_details=inline_details)
+    except Exception as e:
+        py_logging.exception(f"[ERROR] {name} failed: {e}")
+        return {
+            "error": f"Failed to process request: {str(e)}"
+        }
+    py_logging.info(f"{name}: result generated successfully")
+    return response
+
+@server.tool(
+    name="cort.think.simple_cascade",
+    description="Return a recursive thinking AI response from a tiered cascade (a fast model drafts, a stronger model judges) with a 'cascade' report.",
+)
+async def cort_think_simple_cascade(
+    prompt: Prompt,
+    draft_model: DraftModel = None,
+    draft_provider: DraftProvider = None,
+    judge_model: JudgeModel = None,
+    judge_provider: JudgeProvider = None,
+    escalation_model: EscalationModel = None,
+    escalation_provider: EscalationProvider = None,
+    escalate_below: EscalateBelow = DEFAULT_ESCALATION_THRESHOLD,
+    neweval: NewEval = False,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    profile: Profile = False
+):
+    tiers = {"draft": (draft_model, draft_provider), "judge": (judge_model, judge_provider), "escalation": (escalation_model, escalation_provider)}
+    return await run_cascade_tool("cort_think_simple_cascade", prompt, tiers, escalate_below=escalate_below, details=False, neweval=neweval,
+                                  num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, profile=profile)
+
+
+@server.tool(
+    name="cort.think.details_cascade",
+    description="Return a recursive thinking AI response from a tiered cascade (fast drafts, strong judge) with a 'cascade' report and the run_id/details_uri of its history.",
+)
+async def cort_think_details_cascade(
+    prompt: Prompt,
+    draft_model: DraftModel = None,
+    draft_provider: DraftProvider = None,
+    judge_model: JudgeModel = None,
+    judge_provider: JudgeProvider = None,
+    escalation_model: EscalationModel = None,
+    escalation_provider: EscalationProvider = None,
+    escalate_below: EscalateBelow = DEFAULT_ESCALATION_THRESHOLD,
+    neweval: NewEval = False,
+    num_alternatives: NumAlternatives = 3,
+    deadline_ms: DeadlineMs = None,
+    eval_mode: EvalMode = "batch",
+    stage_limits: StageLimits = None,
+    alternative_mode: AlternativeMode = None,
+    inline_details: InlineDetails = False,
+    profile: Profile = False
+):
+    tiers = {"draft": (draft_model, draft_provider), "judge": (judge_model, judge_provider), "escalation": (escalation_model, escalation_provider)}
+    return await run_cascade_tool("cort_think_details_cascade", prompt, tiers, escalate_below=escalate_below, details=True, neweval=neweval,
+                                  num_alternatives=num_alternatives, deadline_ms=deadline_ms, eval_mode=eval_mode, stage_limits=stage_limits, alternative_mode=alternative_mode, inline_details=inline_details, profile=profile)
+
+
+@server.tool(
+    name="cort.adaptive.stats",
+    description="""
+    Return the statistics learned by the adaptive alternative policy (enabled with --adaptive).
 
     Returns:
         dict: {
-            "response": AI response (string),
-            "provider": provider name used (string),
-            "model": model name used (string)
+            "mode": "off", "record" or "on",
+            "rounds": evaluated rounds,
+            "kept_current": rounds in which no alternative won,
+            "temperatures" / "slots" / "models": per setting {"trials", "wins", "win_rate"}
         }
     """
 )
-async def cort_think_simple_mixed_llm_neweval(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")]
-):
-    result = generate_with_mixed_llm(prompt, details=False, neweval=True)
-    # neweval専用プロンプトで評価するために、details=False, neweval=Trueでthinkを呼び出す必要がある場合はここで明示
-    response = result.get("response")
-    best = result.get("best")
-    return {
-        "response": response,
-        "model": best.get("model"),
-        "provider": best.get("provider")
+async def cort_adaptive_stats():
+    policy = get_adaptive_policy()
+    if policy is None:
+        return {"mode": "off"}
+    return policy.stats()
+
+# --- Background jobs ---
+# Long runs can be submitted as jobs and polled, so clients do not hold a request open for minutes.
+_job_manager = None
+
+def get_job_manager():
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(
+            max_jobs=int(os.getenv("CORT_MCP_JOB_QUEUE_SIZE", DEFAULT_MAX_JOBS)),
+            max_running=int(os.getenv("CORT_MCP_JOB_WORKERS", DEFAULT_RUNNING_JOBS)),
+            retention=float(os.getenv("CORT_MCP_JOB_RETENTION", DEFAULT_RETENTION)),
+        )
+    return _job_manager
+
+def tool_function(tool):
+    """The function behind a tool (fastmcp 2.7-2.x decorators return a FunctionTool wrapping it in .fn)."""
+    return getattr(tool, "fn", tool)
+
+def tool_arguments_model(fn):
+    """Pydantic model of a tool function's parameters, to validate job arguments before queuing."""
+    fields = {
+        name: (param.annotation, ... if param.default is inspect.Parameter.empty else param.default)
+        for name, param in inspect.signature(fn).parameters.items()
     }
+    return create_model(f"{fn.__name__}_arguments", __config__=ConfigDict(extra="forbid"), **fields)
+
+# Tools that can run as background jobs
+JOB_TOOLS = {
+    "cort.think.simple": tool_function(cort_think_simple),
+    "cort.think.simple.neweval": tool_function(cort_think_simple_neweval),
+    "cort.think.details": tool_function(cort_think_details),
+    "cort.think.details.neweval": tool_function(cort_think_details_neweval),
+    "cort.think.simple_mixed_llm": tool_function(cort_think_simple_mixed_llm),
+    "cort.think.simple_mixed_llm.neweval": tool_function(cort_think_simple_mixed_llm_neweval),
+    "cort.think.details_mixed_llm": tool_function(cort_think_details_mixed_llm),
+    "cort.think.details_mixed_llm.neweval": tool_function(cort_think_details_mixed_llm_neweval),
+    "cort.think.simple_cascade": tool_function(cort_think_simple_cascade),
+    "cort.think.details_cascade": tool_function(cort_think_details_cascade),
+}
+JOB_TOOL_ARGUMENTS = {name: tool_arguments_model(fn) for name, fn in JOB_TOOLS.items()}
+
+# Tools that need follow-up requests to reach the same process (not offered with --workers > 1)
+JOB_TOOL_NAMES = ("cort.think.submit", "cort.think.status", "cort.think.result", "cort.think.cancel")
+
+def unknown_job(job_id):
+    return {"error": f"Unknown or expired job: {job_id}"}
+
+def jobs_unavailable():
+    return {"error": "Background jobs are not available with --workers > 1: jobs live in one worker process, "
+                     "but a client's requests are spread over all of them"}
 
 @server.tool(
-    name="cort.think.details_mixed_llm",
-    description="Generate recursive thinking AI response with full history, using a different LLM (provider/model) for each alternative. Parameters: prompt (str, required). model/provider cannot be specified (randomly selected internally). Provider/model info for each alternative is always logged and included in the output and history.",
+    name="cort.think.submit",
+    description="""
+    Start a cort.think.* tool as a background job and return its job id right away.
+    Poll it with cort.think.status, fetch the response with cort.think.result and stop it with cort.think.cancel.
+
+    Parameters:
+        tool (str, required): Name of the thinking tool to run, e.g. "cort.think.details_mixed_llm".
+        arguments (dict, required): The tool's parameters, e.g. {"prompt": "...", "num_alternatives": 4}.
+
+    Returns:
+        dict: {"job_id", "tool", "state" ("queued" or "running"), "submitted_at", "queue_position"}
+        or {"error"} when the arguments are invalid or the job queue is full.
+    """
 )
-async def cort_think_details_mixed_llm(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")]
+async def cort_think_submit(
+    tool: Annotated[Literal[tuple(JOB_TOOLS)], Field(description="Name of the thinking tool to run as a job.")],
+    arguments: Annotated[dict[str, Any], Field(description="Parameters of the tool, e.g. {\"prompt\": \"...\"}.")]
 ):
-    result = generate_with_mixed_llm(prompt, details=True)
-    import yaml
-    if "thinking_rounds" in result and "thinking_history" in result:
-        result["details"] = yaml.safe_dump({
-            "thinking_rounds": result["thinking_rounds"],
-            "thinking_history": result["thinking_history"]
-        }, allow_unicode=True, sort_keys=False)
-    return result
+    if multi_worker():
+        return jobs_unavailable()
+    try:
+        validated = dict(JOB_TOOL_ARGUMENTS[tool].model_validate(arguments))
+    except ValidationError as e:
+        return {"error": f"Invalid arguments for {tool}: {e}"}
+    try:
+        return get_job_manager().submit(tool, functools.partial(JOB_TOOLS[tool], **validated))
+    except JobQueueFull as e:
+        py_logging.warning(f"cort.think.submit rejected: {e}")
+        return {"error": f"Job queue is full: {e}"}
 
 @server.tool(
-    name="cort.think.details_mixed_llm.neweval",
+    name="cort.think.status",
     description="""
-    Generate recursive thinking AI response with full history, using a different LLM (provider/model) for each alternative. (new evaluation prompt version)
+    Return the state of a background job ("queued", "running", "succeeded", "failed" or "cancelled").
 
     Parameters:
-        prompt (str, required): Input prompt for the AI (required).
-        model/provider cannot be specified (randomly selected internally).
-        Provider/model info for each alternative is always logged and included in the output and history.
+        job_id (str, required): Id returned by cort.think.submit.
 
     Returns:
-        dict: {
-            "response": AI response (string),
-            "details": YAML-formatted thinking history (string),
-            "thinking_rounds": int,
-            "thinking_history": list,
-            "best": dict, # Information about the LLM that generated the best/final response
-            "alternatives": list (only when details=True) # List of alternative responses considered in the final round
-        }
+        dict: {"job_id", "tool", "state", "submitted_at", "started_at", "finished_at", "elapsed_seconds", "queue_position" (queued jobs)}
     """
 )
-async def cort_think_details_mixed_llm_neweval(
-    prompt: Annotated[str, Field(description="Input prompt for the AI (required)")]
+async def cort_think_status(
+    job_id: Annotated[str, Field(description="Id returned by cort.think.submit.")]
+):
+    if multi_worker():
+        return jobs_unavailable()
+    return get_job_manager().status(job_id) or unknown_job(job_id)
+
+@server.tool(
+    name="cort.think.result",
+    description="""
+    Return a background job's status and, once it has finished, the tool response under "result".
+    Results are kept for a limited time after the job finishes (see --job-retention).
+
+    Parameters:
+        job_id (str, required): Id returned by cort.think.submit.
+    """
+)
+async def cort_think_result(
+    job_id: Annotated[str, Field(description="Id returned by cort.think.submit.")]
 ):
-    result = generate_with_mixed_llm(prompt, details=True, neweval=True)
-    import yaml
-    if "thinking_rounds" in result and "thinking_history" in result:
-        result["details"] = yaml.safe_dump({
-            "thinking_rounds": result["thinking_rounds"],
-            "thinking_history": result["thinking_history"]
-        }, allow_unicode=True, sort_keys=False)
-    return result
+    if multi_worker():
+        return jobs_unavailable()
+    return get_job_manager().result(job_id) or unknown_job(job_id)
+
+@server.tool(
+    name="cort.think.cancel",
+    description="""
+    Cancel a queued or running background job. Finished jobs are left unchanged.
+
+    Parameters:
+        job_id (str, required): Id returned by cort.think.submit.
+    """
+)
+async def cort_think_cancel(
+    job_id: Annotated[str, Field(description="Id returned by cort.think.submit.")]
+):
+    if multi_worker():
+        return jobs_unavailable()
+    return get_job_manager().cancel(job_id) or unknown_job(job_id)
+
+# --- Stored thinking history ---
+# The details tools keep each run's history in the run store and return its run id, so
+# responses stay small; clients fetch the rounds or fields they need from here.
+
+# Stored histories are not kept with --workers > 1 (see details_fields)
+RUN_HISTORY_COMPONENTS = ("cort.think.history", "cort://runs/{run_id}", "cort://runs/{run_id}/rounds/{round}",
+                          "cort://runs/{run_id}/rounds/{round}/{field}")
+
+def unknown_run(run_id):
+    return {"error": f"Unknown run {run_id!r} (its history expired or is kept by another server process)"}
+
+def stored_rounds(run_id, rounds=None, fields=None):
+    """History entries of a stored run.
+
+    Raises:
+        ValueError: If the run is unknown or a round does not exist
+    """
+    entries = get_run_store().rounds(run_id, rounds, fields)
+    if entries is None:
+        raise ValueError(unknown_run(run_id)["error"])
+    return entries
+
+@server.tool(
+    name="cort.think.history",
+    description="""
+    Return (part of) the thinking history of a details run, by the run_id its response carried.
+    Histories are kept for a limited time after their last use (see --run-ttl).
+
+    Parameters:
+        run_id (str, required): Id returned by a cort.think.details* tool.
+        rounds (list[int], optional): Rounds to return (0 is the initial response). Default: all rounds.
+        fields (list[str], optional): Fields of each round to return, e.g. ["response", "selected", "explanation"].
+            "round" is always included. Default: all fields.
+
+    Returns:
+        dict: {"run_id", "thinking_rounds", "thinking_history": list of round entries} or {"error"}
+    """
+)
+async def cort_think_history(
+    run_id: Annotated[str, Field(description="Id returned by a cort.think.details* tool.")],
+    rounds: Annotated[list[int] | None, Field(description="Rounds to return (0 is the initial response). Default: all rounds.")]=None,
+    fields: Annotated[list[str] | None, Field(description="Fields of each round to return, e.g. ['response', 'selected', 'explanation', 'alternatives']. Default: all fields.")]=None
+):
+    details = get_run_store().get(run_id)
+    if details is None:
+        return unknown_run(run_id)
+    try:
+        entries = stored_rounds(run_id, rounds, fields)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"run_id": run_id, "thinking_rounds": details["thinking_rounds"], "thinking_history": entries}
+
+@server.resource(
+    "cort://runs/{run_id}",
+    name="run_history",
+    description="Full thinking history of a details run as YAML (the former inline 'details').",
+    mime_type="application/yaml",
+)
+def run_history_resource(run_id: str) -> str:
+    details = get_run_store().get(run_id)
+    if details is None:
+        raise ValueError(unknown_run(run_id)["error"])
+    return details_yaml(details)
+
+@server.resource(
+    "cort://runs/{run_id}/rounds/{round}",
+    name="run_round",
+    description="One round of a details run's thinking history (0 is the initial response).",
+    mime_type="application/json",
+)
+def run_round_resource(run_id: str, round: int) -> dict:
+    return stored_rounds(run_id, [round])[0]
+
+@server.resource(
+    "cort://runs/{run_id}/rounds/{round}/{field}",
+    name="run_round_field",
+    description="One field of a round of a details run, e.g. cort://runs/<run_id>/rounds/2/alternatives.",
+    mime_type="application/json",
+)
+def run_round_field_resource(run_id: str, round: int, field: str) -> Any:
+    entry = stored_rounds(run_id, [round], [field])[0]
+    if field not in entry:
+        raise ValueError(f"Round {round} of run {run_id} has no field {field!r}")
+    return entry[field]
 
 # Tools are registered with decorators
 
-def initialize_and_run_server():
+def load_stage_limits(value):
+    """Stage limit overrides from inline JSON or a YAML/JSON file (validated).
+
+    Raises:
+        ValueError: If the limits are invalid
+    """
+    if os.path.isfile(value):
+        with open(value, encoding="utf-8") as f:
+            value = f.read()
+    overrides = yaml.safe_load(value) or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("expected a mapping of stage to limits")
+    merge_stage_limits(get_stage_limits(), overrides)
+    return overrides
+
+def configure_engine_from_env():
+    """Apply the engine options passed through CORT_MCP_* environment variables (set by main())."""
+    configure_providers(os.getenv("CORT_MCP_PROVIDERS"))
+    configure_stage_limits(json.loads(os.getenv("CORT_MCP_STAGE_LIMITS") or "{}"))
+    configure_profiling(os.getenv("CORT_MCP_PROFILE") == "1", os.getenv("CORT_MCP_PROFILE_DIR") or None)
+    configure_alternative_mode(os.getenv("CORT_MCP_ALTERNATIVE_MODE", "full"))
+    threshold = float(os.getenv("CORT_MCP_DEDUP_THRESHOLD", DEFAULT_DEDUP_THRESHOLD))
+    configure_dedup(
+        threshold=threshold if threshold > 0 else None,
+        regenerate=os.getenv("CORT_MCP_REGENERATE_DUPLICATES") == "1",
+    )
+    cassette_path = os.getenv("CORT_MCP_CASSETTE")
+    if cassette_path:
+        cassette = Cassette(
+            cassette_path,
+            os.getenv("CORT_MCP_CASSETTE_MODE", "replay"),
+            speed=float(os.getenv("CORT_MCP_REPLAY_SPEED", "1.0")),
+        )
+        configure_cassette(cassette)
+        py_logging.info(f"Cassette enabled: mode={cassette.mode}, path={cassette.path}, speed={cassette.speed}")
+    adaptive_mode = os.getenv("CORT_MCP_ADAPTIVE", "off")
+    if adaptive_mode != "off":
+        policy = AdaptivePolicy(adaptive_mode, path=os.getenv("CORT_MCP_ADAPTIVE_STATE") or None)
+        configure_adaptive(policy)
+        py_logging.info(f"Adaptive alternatives enabled: mode={policy.mode}, state={policy.path}")
+    mode = os.getenv("CORT_MCP_ANSWER_STORE", "off")
+    if mode == "off":
+        return
+    store = AnswerStore(
+        max_entries=int(os.getenv("CORT_MCP_ANSWER_STORE_SIZE", DEFAULT_ANSWER_STORE_SIZE)),
+        threshold=float(os.getenv("CORT_MCP_ANSWER_STORE_THRESHOLD", DEFAULT_ANSWER_STORE_THRESHOLD)),
+    )
+    configure_answer_store(store, mode)
+    py_logging.info(f"Answer store enabled: mode={mode}, size={store.max_entries}, threshold={store.threshold}")
+
+def create_http_app():
+    """ASGI app factory used by uvicorn worker processes (--workers > 1).
+
+    Each worker is a fresh interpreter, so the CLI settings are passed through
+    environment variables set by main().
+    """
+    setup_logging(os.getenv("CORT_MCP_LOG", "off"), os.getenv("CORT_MCP_LOGFILE"))
+    configure_engine_from_env()
+    # Jobs and stored histories are unavailable here; hide their tools and resources where FastMCP allows it
+    if hasattr(server, "disable"):
+        server.disable(names=set(JOB_TOOL_NAMES) | set(RUN_HISTORY_COMPONENTS))
+    # Requests of one client may land on any worker, so sessions cannot be kept in process memory
+    return server.http_app(transport=os.getenv("CORT_MCP_TRANSPORT", "http"), stateless_http=True)
+
+def initialize_and_run_server(transport="stdio", host=DEFAULT_HTTP_HOST, port=DEFAULT_HTTP_PORT, workers=1, graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT):
     # Initialize and run the MCP server.
     # Logging should be configured by setup_logging by now.
     # We can get the logger instance.
@@ -809,16 +1096,61 @@ def initialize_and_run_server():
         logger.info("cort-mcp server starting... (using 'cort-mcp-server' logger in initialize_and_run_server)")
 
     # Run the MCP server
-    server.run()
+    if transport == "stdio":
+        server.run()
+    elif workers <= 1:
+        logger.info(f"Serving MCP over {transport} on {host}:{port} (single process)")
+        server.run(transport=transport, host=host, port=port, uvicorn_config={"timeout_graceful_shutdown": graceful_timeout})
+    else:
+        import uvicorn
+        logger.info(f"Serving MCP over {transport} on {host}:{port} with {workers} worker processes")
+        # uvicorn binds the socket once and shares it with the workers; on shutdown each
+        # worker stops accepting and drains in-flight requests for up to graceful_timeout seconds
+        uvicorn.run(
+            "cort_mcp.server:create_http_app",
+            factory=True,
+            host=host,
+            port=port,
+            workers=workers,
+            timeout_graceful_shutdown=graceful_timeout,
+        )
+    if _think_pool is not None:
+        _think_pool.shutdown(wait=True)
 
 def main():
     parser = argparse.ArgumentParser(description="Chain-of-Recursive-Thoughts MCP Server/CLI")
     parser.add_argument("--log", choices=["on", "off"], required=True, help="Enable or disable logging (on/off)")
     parser.add_argument("--logfile", type=str, default=None, help="Absolute path to log file (required if --log=on)")
+    parser.add_argument("--transport", choices=["stdio", "http", "sse"], default="stdio", help="MCP transport (default: stdio). 'http' is streamable HTTP.")
+    parser.add_argument("--host", type=str, default=DEFAULT_HTTP_HOST, help=f"Listen address for http/sse (default: {DEFAULT_HTTP_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_HTTP_PORT, help=f"Listen port for http/sse (default: {DEFAULT_HTTP_PORT})")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes sharing the listening socket (http only, default: 1)")
+    parser.add_argument("--think-workers", type=int, default=DEFAULT_THINK_WORKERS, help=f"Concurrent thinking runs per process (default: {DEFAULT_THINK_WORKERS})")
+    parser.add_argument("--answer-store", choices=["off", "reuse", "seed"], default="off", help="Reuse final answers of similar earlier prompts: 'reuse' returns them as-is, 'seed' starts the run from them (default: off)")
+    parser.add_argument("--answer-store-size", type=int, default=DEFAULT_ANSWER_STORE_SIZE, help=f"Maximum number of stored answers (default: {DEFAULT_ANSWER_STORE_SIZE})")
+    parser.add_argument("--answer-store-threshold", type=float, default=DEFAULT_ANSWER_STORE_THRESHOLD, help=f"Minimum prompt similarity (0-1) for a stored answer to be used (default: {DEFAULT_ANSWER_STORE_THRESHOLD})")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_DEDUP_THRESHOLD, help=f"Similarity (0-1) at which alternatives are collapsed as near-duplicates before evaluation; 0 disables (default: {DEFAULT_DEDUP_THRESHOLD})")
+    parser.add_argument("--alternative-mode", choices=list(ALTERNATIVE_MODES), default="full", help="How alternatives are produced: 'full' regenerates each one, 'edit' asks for SEARCH/REPLACE edits of the current best response when it is long, falling back to full regeneration when edits do not apply (default: full)")
+    parser.add_argument("--regenerate-duplicates", action="store_true", help="Regenerate each near-duplicate alternative once with a perturbed prompt instead of only dropping it")
+    parser.add_argument("--cassette", type=str, default=None, help="Cassette file (JSON Lines, gzip if it ends with .gz) to record provider exchanges to or replay them from")
+    parser.add_argument("--cassette-mode", choices=["record", "replay"], default="replay", help="Record provider exchanges to --cassette or replay them offline (default: replay)")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Multiplier for recorded latencies in replay mode; 0 replays instantly (default: 1.0)")
+    parser.add_argument("--adaptive", choices=["off", "record", "on"], default="off", help="Learn which alternative temperatures/slots/models win evaluations: 'record' only collects statistics, 'on' also allocates each round's alternatives by them (default: off)")
+    parser.add_argument("--adaptive-state", type=str, default=None, help="JSON file the adaptive statistics are loaded from and saved to")
+    parser.add_argument("--stage-limits", type=str, default=None, help="Per-stage generation limits as inline JSON or a YAML/JSON file, e.g. '{\"alternatives\": {\"max_tokens\": 800}}'. Stages: rounds, base, alternatives, evaluation; limits: reasoning, max_tokens, stop")
+    parser.add_argument("--providers", type=str, default=None, help="YAML/JSON file adding or overriding OpenAI-compatible providers (base URL, headers, auth, payload options), e.g. local vLLM, llama.cpp or Ollama servers")
+    parser.add_argument("--profile", action="store_true", help="Capture a CPU profile and a wall-clock stage breakdown of every cort.think.* call (single calls can use the profile parameter instead)")
+    parser.add_argument("--profile-dir", type=str, default=None, help=f"Directory profiles are written to as pstats, collapsed-stack and JSON files (default: {DEFAULT_PROFILE_DIR})")
+    parser.add_argument("--job-queue-size", type=int, default=DEFAULT_MAX_JOBS, help=f"Background jobs (cort.think.submit) that may be queued or running at once; further submissions are rejected (default: {DEFAULT_MAX_JOBS})")
+    parser.add_argument("--job-workers", type=int, default=DEFAULT_RUNNING_JOBS, help=f"Background jobs running at once (default: {DEFAULT_RUNNING_JOBS})")
+    parser.add_argument("--job-retention", type=float, default=DEFAULT_RETENTION, help=f"Seconds a finished job's result is kept for cort.think.result (default: {DEFAULT_RETENTION:.0f})")
+    parser.add_argument("--run-store-size", type=int, default=DEFAULT_MAX_RUNS, help=f"Thinking histories of details runs kept for cort.think.history and the cort://runs resources (default: {DEFAULT_MAX_RUNS})")
+    parser.add_argument("--run-ttl", type=float, default=DEFAULT_RUN_TTL, help=f"Seconds a stored thinking history is kept after its last use (default: {DEFAULT_RUN_TTL:.0f})")
+    parser.add_argument("--graceful-timeout", type=int, default=DEFAULT_GRACEFUL_TIMEOUT, help=f"Seconds to drain in-flight requests on shutdown (http/sse, default: {DEFAULT_GRACEFUL_TIMEOUT})")
  
     args = parser.parse_args()
 
-    print(f"[DEBUG_MAIN] Parsed arguments: log='{args.log}', logfile='{args.logfile}'", file=sys.stderr)
+    print(f"[DEBUG_MAIN] Parsed arguments: log='{args.log}', logfile='{args.logfile}', transport='{args.transport}', workers={args.workers}", file=sys.stderr)
 
     if args.log == "on" and not args.logfile:
         print("[FATAL_MAIN] --logfile is required when --log=on", file=sys.stderr)
@@ -826,11 +1158,67 @@ def main():
     if args.log == "on" and args.logfile and not os.path.isabs(args.logfile): # Check if logfile is not None
         print(f"[FATAL_MAIN] --logfile must be an absolute path when --log=on. Received: '{args.logfile}'", file=sys.stderr)
         sys.exit(1)
+    if args.cassette and args.cassette_mode == "record" and args.workers > 1:
+        print("[FATAL_MAIN] --cassette-mode=record cannot be combined with --workers > 1", file=sys.stderr)
+        sys.exit(1)
+    if args.stage_limits:
+        try:
+            stage_limits = load_stage_limits(args.stage_limits)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            print(f"[FATAL_MAIN] Invalid --stage-limits: {e}", file=sys.stderr)
+            sys.exit(1)
+    if args.providers:
+        try:
+            load_providers_file(args.providers)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            print(f"[FATAL_MAIN] Invalid --providers file: {e}", file=sys.stderr)
+            sys.exit(1)
+    if args.workers < 1 or args.think_workers < 1:
+        print("[FATAL_MAIN] --workers and --think-workers must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    if args.workers > 1 and args.transport != "http":
+        # stdio has a single client, and SSE keeps per-session state in the process that opened it
+        print(f"[FATAL_MAIN] --workers > 1 requires --transport=http (got '{args.transport}')", file=sys.stderr)
+        sys.exit(1)
+
+    # Worker processes (and the lazily created think pool) read their settings from the environment
+    os.environ["CORT_MCP_LOG"] = args.log
+    if args.logfile:
+        os.environ["CORT_MCP_LOGFILE"] = args.logfile
+    os.environ["CORT_MCP_TRANSPORT"] = args.transport
+    os.environ["CORT_MCP_WORKERS"] = str(args.workers)
+    os.environ["CORT_MCP_THINK_WORKERS"] = str(args.think_workers)
+    os.environ["CORT_MCP_JOB_QUEUE_SIZE"] = str(args.job_queue_size)
+    os.environ["CORT_MCP_JOB_WORKERS"] = str(args.job_workers)
+    os.environ["CORT_MCP_JOB_RETENTION"] = str(args.job_retention)
+    os.environ["CORT_MCP_RUN_STORE_SIZE"] = str(args.run_store_size)
+    os.environ["CORT_MCP_RUN_TTL"] = str(args.run_ttl)
+    os.environ["CORT_MCP_ANSWER_STORE"] = args.answer_store
+    os.environ["CORT_MCP_ADAPTIVE"] = args.adaptive
+    os.environ["CORT_MCP_PROFILE"] = "1" if args.profile else "0"
+    if args.profile_dir:
+        os.environ["CORT_MCP_PROFILE_DIR"] = os.path.abspath(args.profile_dir)
+    if args.stage_limits:
+        os.environ["CORT_MCP_STAGE_LIMITS"] = json.dumps(stage_limits)
+    if args.adaptive_state:
+        os.environ["CORT_MCP_ADAPTIVE_STATE"] = os.path.abspath(args.adaptive_state)
+    if args.providers:
+        os.environ["CORT_MCP_PROVIDERS"] = os.path.abspath(args.providers)
+    if args.cassette:
+        os.environ["CORT_MCP_CASSETTE"] = args.cassette
+        os.environ["CORT_MCP_CASSETTE_MODE"] = args.cassette_mode
+        os.environ["CORT_MCP_REPLAY_SPEED"] = str(args.replay_speed)
+    os.environ["CORT_MCP_DEDUP_THRESHOLD"] = str(args.dedup_threshold)
+    os.environ["CORT_MCP_ALTERNATIVE_MODE"] = args.alternative_mode
+    os.environ["CORT_MCP_REGENERATE_DUPLICATES"] = "1" if args.regenerate_duplicates else "0"
+    os.environ["CORT_MCP_ANSWER_STORE_SIZE"] = str(args.answer_store_size)
+    os.environ["CORT_MCP_ANSWER_STORE_THRESHOLD"] = str(args.answer_store_threshold)
     
     # Call setup_logging to configure logging based on arguments.
     print(f"[DEBUG_MAIN] Calling setup_logging with log='{args.log}', logfile='{args.logfile}'", file=sys.stderr)
     logger = setup_logging(args.log, args.logfile)
     print(f"[DEBUG_MAIN] setup_logging returned: {logger}", file=sys.stderr)
+    configure_engine_from_env()
 
     if logger: # If setup_logging returned a logger instance (i.e., log was 'on')
         logger.info("cort-mcp main() started, using 'cort-mcp-server' logger.")
@@ -844,14 +1232,20 @@ def main():
 
     try:
         if logger:
-            logger.info("Server mode: waiting for MCP stdio requests...")
+            logger.info(f"Server mode: waiting for MCP {args.transport} requests...")
         elif args.log == "on": # Log was on, but logger is None (error in setup_logging)
-            print("[INFO_MAIN] Server mode: waiting for MCP stdio requests... (logger not fully available)", file=sys.stderr)
+            print(f"[INFO_MAIN] Server mode: waiting for MCP {args.transport} requests... (logger not fully available)", file=sys.stderr)
         else: # log == "off"
-            print("[INFO_MAIN] Server mode: waiting for MCP stdio requests... (logging is off)", file=sys.stderr)
+            print(f"[INFO_MAIN] Server mode: waiting for MCP {args.transport} requests... (logging is off)", file=sys.stderr)
 
         # Start the server using FastMCP
-        initialize_and_run_server()
+        initialize_and_run_server(
+            transport=args.transport,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            graceful_timeout=args.graceful_timeout,
+        )
     except Exception as e:
         if logger:
             logger.exception(f"[ERROR_MAIN] main() unhandled exception: {e}")
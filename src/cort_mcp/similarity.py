@@ -0,0 +1,51 @@
+import hashlib
+import re
+from typing import List, Set
+
+# Length of the character shingles used for near-duplicate detection
+SHINGLE_SIZE = 4
+# Number of hash permutations in a MinHash signature
+NUM_PERMUTATIONS = 64
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(count: int):
+    # Deterministic coefficients so signatures are comparable across processes and restarts
+    params = []
+    for i in range(count):
+        digest = hashlib.blake2b(f"cort-minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], "little") % _MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+
+_PERMUTATIONS = _permutations(NUM_PERMUTATIONS)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Character shingles of the normalized text."""
+    normalized = normalize_text(text)
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash_signature(text: str) -> List[int]:
+    """MinHash signature of the text's shingle set."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") & _MAX_HASH
+              for s in shingles(text)]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(signature_a: List[int], signature_b: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
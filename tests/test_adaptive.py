@@ -0,0 +1,86 @@
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp.adaptive import MIN_ROUNDS, TEMPERATURE_ARMS, AdaptivePolicy
+from cort_mcp.recursive_thinking_ai import configure_adaptive
+
+from test_recursive_thinking_ai import ScriptedChat
+
+
+def six_alternatives():
+    return [{"slot": i, "temperature": t, "model": None} for i, t in enumerate(TEMPERATURE_ARMS)]
+
+
+def test_policy_allocates_slots_to_winning_temperature(tmp_path):
+    path = str(tmp_path / "adaptive.json")
+    policy = AdaptivePolicy("on", path=path, rng=random.Random(1))
+    assert policy.plan(3, []) is None
+    for _ in range(MIN_ROUNDS * 2):
+        policy.record(six_alternatives(), 2)
+    plan = policy.plan(3, [])
+    assert [slot["temperature"] for slot in plan] == [0.9, 0.9, 0.9]
+    policy.save()
+
+    reloaded = AdaptivePolicy("record", path=path)
+    stats = reloaded.stats()
+    assert stats["rounds"] == MIN_ROUNDS * 2
+    assert stats["temperatures"]["0.9"]["win_rate"] == 1.0
+    assert stats["slots"]["0"] == {"trials": MIN_ROUNDS * 2, "wins": 0, "win_rate": 0.0}
+    # Record mode never changes the schedule
+    assert reloaded.plan(3, []) is None
+
+
+def test_policy_drops_slots_that_rarely_win():
+    policy = AdaptivePolicy("on", rng=random.Random(1))
+    for _ in range(MIN_ROUNDS * 5):
+        policy.record(six_alternatives(), -1)
+    sizes = [len(policy.plan(3, [])) for _ in range(20)]
+    assert min(sizes) >= 1
+    assert sum(sizes) < 20 * 3 / 2
+
+
+def test_engine_records_selections():
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            return "2\nsecond is better"
+        return uuid.uuid4().hex
+
+    policy = AdaptivePolicy("record")
+    try:
+        configure_adaptive(policy)
+        ScriptedChat(answer).think("q", rounds=2, num_alternatives=3)
+    finally:
+        configure_adaptive(None)
+    stats = policy.stats()
+    assert stats["rounds"] == 2
+    assert stats["slots"]["1"] == {"trials": 2, "wins": 2, "win_rate": 1.0}
+    assert stats["temperatures"]["0.8"]["wins"] == 2
+
+
+def test_policy_cuts_rounds_after_the_last_winning_slot():
+    policy = AdaptivePolicy("on", rng=random.Random(1))
+    for _ in range(MIN_ROUNDS * 5):
+        policy.record(six_alternatives(), 1)
+    sizes = [len(policy.plan(6, [])) for _ in range(20)]
+    assert sizes.count(2) >= 18 and max(sizes) <= 3
+
+
+def test_saves_of_several_processes_are_merged(tmp_path):
+    path = str(tmp_path / "adaptive.json")
+    first, second = AdaptivePolicy("record", path=path), AdaptivePolicy("record", path=path)
+    for _ in range(3):
+        first.record(six_alternatives(), 0)
+    first.save()
+    second.record(six_alternatives(), -1)
+    second.save()
+    # Saving again without new rounds does not count them twice
+    first.save()
+    stats = AdaptivePolicy("record", path=path).stats()
+    assert stats["rounds"] == 4 and stats["kept_current"] == 1
+    assert stats["slots"]["0"] == {"trials": 4, "wins": 3, "win_rate": 0.75}
+    # A process sees the other processes' rounds once it has saved
+    assert second.stats()["rounds"] == 4 and first.stats()["rounds"] == 3
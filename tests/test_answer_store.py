@@ -0,0 +1,98 @@
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp.answer_store import AnswerStore
+from cort_mcp.recursive_thinking_ai import configure_answer_store
+from test_recursive_thinking_ai import ScriptedChat
+
+
+def test_near_duplicate_prompt_hits_store():
+    store = AnswerStore(max_entries=10, threshold=0.7)
+    store.add("How do I reverse a linked list in Python?", "answer", "m", "p")
+    hit = store.lookup("how do I reverse a linked list in python")
+    assert hit["response"] == "answer"
+    assert hit["similarity"] == 1.0
+    hit = store.lookup("How can I reverse a linked list in Python?")
+    assert hit is not None and 0.7 <= hit["similarity"] < 1.0
+    assert store.lookup("What is the capital of France?") is None
+
+
+def test_answers_are_only_reused_within_their_scope():
+    store = AnswerStore(threshold=0.7)
+    store.add("How do I reverse a linked list in Python?", "small answer", "small", "vllm", "single:vllm/small")
+    assert store.lookup("How do I reverse a linked list in Python?", "single:vllm/big") is None
+    assert store.lookup("How can I reverse a linked list in Python?", "single:vllm/big") is None
+    assert store.lookup("How can I reverse a linked list in Python?", "single:vllm/small")["response"] == "small answer"
+    store.add("How do I reverse a linked list in Python?", "big answer", "big", "vllm", "single:vllm/big")
+    assert len(store) == 2
+    assert store.lookup("How do I reverse a linked list in Python?", "single:vllm/big")["response"] == "big answer"
+
+
+def test_store_evicts_least_recently_used():
+    store = AnswerStore(max_entries=2, threshold=0.9)
+    store.add("first prompt about apples", "a", "m", "p")
+    store.add("second prompt about bananas", "b", "m", "p")
+    assert store.lookup("first prompt about apples")["response"] == "a"
+    store.add("third prompt about cherries", "c", "m", "p")
+    assert len(store) == 2
+    assert store.lookup("second prompt about bananas") is None
+    assert store.lookup("first prompt about apples") is not None
+
+
+def test_think_reuses_and_seeds_from_store():
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            return "current\nkeep"
+        if "Generate an alternative" in content:
+            return uuid.uuid4().hex
+        return "fresh"
+
+    store = AnswerStore(threshold=0.7)
+    try:
+        configure_answer_store(store, "reuse")
+        first = ScriptedChat(answer)
+        assert first.think("Explain the GIL in CPython", rounds=1)["response"] == "fresh"
+        second = ScriptedChat(answer)
+        result = second.think("explain the GIL in CPython!", rounds=1)
+        assert result["answer_store"]["mode"] == "reuse"
+        assert second.calls == []
+
+        configure_answer_store(store, "seed")
+        seeded = ScriptedChat(answer)
+        result = seeded.think("Explain the GIL in CPython please")
+        assert result["answer_store"]["mode"] == "seed"
+        # One seeded round: alternatives plus one evaluation, no base or round-count call
+        assert len(seeded.calls) == 4
+    finally:
+        configure_answer_store(None, "off")
+
+
+def test_partial_and_differently_evaluated_runs_are_not_shared():
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            return "1\nbetter"
+        if "Response B:" in content:
+            return "B\nbetter"
+        if "Generate an alternative" in content:
+            return "improved " + uuid.uuid4().hex
+        return "base"
+
+    store = AnswerStore(threshold=0.7)
+    try:
+        configure_answer_store(store, "reuse")
+        # A run cut short by its deadline is not stored
+        assert ScriptedChat(answer, delay=0.05).think("Explain the GIL in CPython", deadline_ms=120)["deadline_reached"] is True
+        assert len(store) == 0
+        ScriptedChat(answer).think("Explain the GIL in CPython", rounds=1)
+        assert len(store) == 1
+        # Other evaluation settings or alternative modes do not get that answer
+        pairwise = ScriptedChat(answer)
+        assert "answer_store" not in pairwise.think("Explain the GIL in CPython", rounds=1, eval_mode="pairwise")
+        assert "answer_store" not in ScriptedChat(answer).think("Explain the GIL in CPython", rounds=1, neweval=True)
+        assert "answer_store" not in ScriptedChat(answer).think("Explain the GIL in CPython", rounds=1, alternative_mode="edit")
+        assert "answer_store" in ScriptedChat(answer).think("Explain the GIL in CPython", rounds=1)
+    finally:
+        configure_answer_store(None, "off")
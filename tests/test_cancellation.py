@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp.cancellation import CancelToken, RunCancelled
+from cort_mcp.recursive_thinking_ai import BatchEvaluator, EnhancedRecursiveThinkingChat, SingleModelStrategy, ThinkingEngine
+
+
+class SlowProvider(ThreadingHTTPServer):
+    """Chat completion endpoint that answers the base prompt at once and holds every other request."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SlowHandler)
+        self.requests = []
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append(payload)
+        if payload["messages"][-1]["content"] != "q":
+            self.server.release.wait(30)
+        body = json.dumps({"choices": [{"message": {"content": "answer"}}]}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    server = SlowProvider()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("CORT_VLLM_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions")
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_cancel_aborts_in_flight_provider_calls(provider):
+    chat = EnhancedRecursiveThinkingChat(api_key=None, model="m", provider="vllm")
+    chat.supports_n = False
+    token = CancelToken()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = ThinkingEngine(SingleModelStrategy(chat), BatchEvaluator()).run("q", rounds=3, num_alternatives=3, cancel_token=token)
+        except Exception as e:
+            outcome["error"] = e
+        outcome["finished"] = time.monotonic()
+
+    runner = threading.Thread(target=run)
+    runner.start()
+    started = time.monotonic()
+    while len(provider.requests) < 4 and time.monotonic() - started < 10:
+        time.sleep(0.01)
+    # The base response plus three alternatives waiting for their answers
+    assert len(provider.requests) == 4
+
+    cancelled = time.monotonic()
+    token.cancel()
+    runner.join(5)
+    assert not runner.is_alive()
+    assert isinstance(outcome.get("error"), RunCancelled)
+    assert outcome["finished"] - cancelled < 1.0
+    # No evaluation and no further rounds after the cancellation
+    time.sleep(0.1)
+    assert len(provider.requests) == 4
+    assert chat.cancel_token is None
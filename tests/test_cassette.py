@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pytest
+
+from cort_mcp import recursive_thinking_ai
+from cort_mcp.cassette import Cassette, CassetteMiss
+from cort_mcp.recursive_thinking_ai import EnhancedRecursiveThinkingChat, configure_cassette
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, *contents):
+        self._body = {"id": "x", "choices": [{"message": {"content": content}} for content in contents], "usage": {"total_tokens": 3}}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = 0
+        self.samples = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.calls += 1
+        self.samples.append(json.get("n", 1))
+        time.sleep(0.02)
+        answer = f"answer to {json['messages'][-1]['content']} at {json['temperature']}"
+        if "Alternatives:" in json["messages"][-1]["content"]:
+            answer = "1\nfirst is better"
+        return FakeResponse(*[f"{answer} #{k}" if k else answer for k in range(json.get("n", 1))])
+
+
+def test_record_then_replay_offline(tmp_path, monkeypatch):
+    path = str(tmp_path / "run.jsonl.gz")
+    session = FakeSession()
+    monkeypatch.setattr(recursive_thinking_ai, "get_http_session", lambda: session)
+    chat = EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openai")
+    recorder = Cassette(path, "record")
+    try:
+        configure_cassette(recorder)
+        recorded = [chat._call_api([{"role": "user", "content": "hi"}], temperature=t) for t in (0.7, 0.8)]
+    finally:
+        recorder.close()
+        configure_cassette(None)
+    assert session.calls == 2
+
+    replayer = Cassette(path, "replay", speed=0)
+    try:
+        configure_cassette(replayer)
+        # A different model still matches on messages and temperature (mixed-LLM runs pick models at random)
+        other = EnhancedRecursiveThinkingChat(api_key="k", model="other", provider="openai")
+        replayed = [other._call_api([{"role": "user", "content": "hi"}], temperature=t) for t in (0.8, 0.7)]
+        assert replayed == recorded[::-1]
+        with pytest.raises(CassetteMiss):
+            other._call_api([{"role": "user", "content": "never recorded"}])
+    finally:
+        configure_cassette(None)
+    assert session.calls == 2
+
+
+def test_batched_alternatives_are_recorded_and_replayed_as_one_exchange(tmp_path, monkeypatch):
+    path = str(tmp_path / "run.jsonl.gz")
+    session = FakeSession()
+    monkeypatch.setattr(recursive_thinking_ai, "get_http_session", lambda: session)
+    recorder = Cassette(path, "record")
+    try:
+        configure_cassette(recorder)
+        recorded = EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openai").think("q", rounds=1, num_alternatives=3, details=True)
+    finally:
+        recorder.close()
+        configure_cassette(None)
+    # Base response, one n=3 request for the alternatives, evaluation
+    assert session.samples == [1, 3, 1]
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["request"].get("n", 1) for line in f] == [1, 3, 1]
+
+    replayer = Cassette(path, "replay", speed=0)
+    try:
+        configure_cassette(replayer)
+        replayed = EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openai").think("q", rounds=1, num_alternatives=3, details=True)
+    finally:
+        configure_cassette(None)
+    assert session.calls == 3
+    assert replayed["response"] == recorded["response"]
+    assert replayed["thinking_history"][1]["alternatives"] == recorded["thinking_history"][1]["alternatives"]
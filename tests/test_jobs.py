@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp.jobs import JobManager, JobQueueFull
+
+
+def test_jobs_queue_run_and_cancel():
+    async def scenario():
+        manager = JobManager(max_jobs=3, max_running=1)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return {"response": "done"}
+
+        first = manager.submit("cort.think.simple", slow)
+        second = manager.submit("cort.think.simple", slow)
+        third = manager.submit("cort.think.details", slow)
+        with pytest.raises(JobQueueFull):
+            manager.submit("cort.think.simple", slow)
+        await asyncio.sleep(0)
+        # One job runs at a time, the others wait in order
+        assert manager.status(first["job_id"])["state"] == "running"
+        assert manager.status(third["job_id"])["queue_position"] == 2
+        assert "result" not in manager.result(first["job_id"])
+
+        assert manager.cancel(second["job_id"])["state"] == "cancelled"
+        release.set()
+        await asyncio.sleep(0.01)
+        assert manager.result(first["job_id"])["result"] == {"response": "done"}
+        assert manager.status(third["job_id"])["state"] == "succeeded"
+        assert manager.status(second["job_id"])["state"] == "cancelled"
+        # Finished jobs no longer count toward the queue
+        manager.submit("cort.think.simple", slow)
+        release.set()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+
+def test_finished_jobs_are_retained_with_limits():
+    async def scenario():
+        async def failing():
+            return {"error": "prompt is required"}
+
+        manager = JobManager(max_finished=2)
+        jobs = [manager.submit("cort.think.simple", failing) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert manager.status(jobs[0]["job_id"]) is None
+        assert manager.result(jobs[2]["job_id"])["state"] == "failed"
+
+        manager.retention = 0
+        await asyncio.sleep(0.01)
+        assert manager.status(jobs[2]["job_id"]) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pytest
+
+from cort_mcp.loadtest import TOOLS, StubProvider, build_parser, parse_mix, percentile, run_load
+from cort_mcp.recursive_thinking_ai import PairwiseEvaluator, parse_pairwise
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 50) is None
+
+
+def test_parse_mix():
+    assert parse_mix(None) == {tool: 1.0 for tool in TOOLS}
+    assert parse_mix("cort.think.simple=3,cort.think.details") == {"cort.think.simple": 3.0, "cort.think.details": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("cort.think.unknown=1")
+
+
+def test_stub_answers_pairwise_evaluations():
+    stub = StubProvider(latency_ms=0, jitter_ms=0, rounds=1)
+    prompt = PairwiseEvaluator()._build_prompt("q", "current best", "alternative", None)
+    second_won, explanation = parse_pairwise(stub.answer(prompt))
+    assert not second_won and "stub evaluation" in explanation
+
+
+@pytest.mark.parametrize("eval_mode", ["batch", "pairwise"])
+def test_short_run_reports_latency_and_loop_lag(eval_mode):
+    args = build_parser().parse_args(["--clients", "2", "--requests", "4", "--duration", "0", "--mix", "cort.think.simple,cort.think.details",
+                                      "--stub-latency-ms", "5", "--stub-jitter-ms", "0", "--eval-mode", eval_mode])
+    report = asyncio.run(run_load(args))
+    assert report["completed"] == 4 and report["errors"] == 0
+    latency = report["latency_s"]
+    assert latency["count"] == 4 and 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    lag = report["event_loop_lag_s"]
+    assert lag["count"] >= 1 and lag["p50"] <= lag["max"]
+    # rounds question, base response, alternatives and the evaluation for every call
+    assert report["provider_requests"] >= 4 * 3
@@ -0,0 +1,77 @@
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp import profiling
+from cort_mcp.profiling import RunProfile, current_profile
+
+from test_recursive_thinking_ai import ScriptedChat
+
+
+class NetworkChat(ScriptedChat):
+    """ScriptedChat whose calls go through _request, so network time is measured."""
+
+    def _call_api_samples(self, messages, temperature, n, stage=None):
+        return self._request(messages, temperature, n, stage=stage)
+
+    def _post(self, payload, timeout):
+        content = payload["messages"][-1]["content"]
+        if "Alternatives:" in content:
+            answer = "current\nkeep"
+        else:
+            answer = uuid.uuid4().hex
+        return {"choices": [{"message": {"content": answer}}]}
+
+
+def test_profile_breaks_a_run_down_by_stage(tmp_path):
+    chat = NetworkChat(None)
+    with RunProfile("cort.think.simple", directory=str(tmp_path)) as profile:
+        chat.think("q", rounds=2, num_alternatives=3)
+    assert current_profile() is None
+    report = profile.report()
+    stages = report["stages"]
+    assert stages["base"]["calls"] == 1
+    assert stages["alternatives"]["calls"] == 2 * 3
+    assert stages["evaluation"]["calls"] == 2
+    assert set(stages) == {"base", "alternatives", "dedup", "evaluation"}
+    assert report["wall_seconds"] >= stages["alternatives"]["wall_seconds"]
+    assert report["cpu_seconds"] > 0
+    files = report["files"]
+    assert sorted(files) == ["breakdown", "collapsed", "pstats"]
+    # Worker threads are profiled too
+    functions = {name for _, _, name in pstats.Stats(files["pstats"]).stats}
+    assert "_post" in functions and "dedup_alternatives" in functions
+    assert all(os.path.exists(path) for path in files.values())
+
+
+@pytest.mark.parametrize("interpreter_wide", sorted({profiling.INTERPRETER_WIDE_PROFILER, True}))
+def test_concurrent_profiled_calls_each_get_a_profile(tmp_path, monkeypatch, interpreter_wide):
+    monkeypatch.setattr(profiling, "INTERPRETER_WIDE_PROFILER", interpreter_wide)
+    profiles, spans = [], []
+
+    def profiled_call(i):
+        with RunProfile(f"call-{i}", directory=str(tmp_path)) as profile:
+            started = time.monotonic()
+            NetworkChat(None, delay=0.05).think("q", rounds=1, num_alternatives=2)
+            spans.append((started, time.monotonic()))
+        profiles.append(profile)
+
+    threads = [threading.Thread(target=profiled_call, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for profile in profiles:
+        functions = {name for _, _, name in pstats.Stats(profile.report()["files"]["pstats"]).stats}
+        assert "_run" in functions
+    if interpreter_wide:
+        # The interpreter-wide profiler is held by one call at a time
+        first, second = sorted(spans)
+        assert first[1] <= second[0]
@@ -0,0 +1,131 @@
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp import recursive_thinking_ai
+from cort_mcp.providers import configure_providers, get_provider, load_providers_file, mixed_models, provider_available
+from cort_mcp.recursive_thinking_ai import EnhancedRecursiveThinkingChat, merge_stage_limits, DEFAULT_STAGE_LIMITS
+
+
+PROVIDERS_FILE = """
+providers:
+  local:
+    base_url: http://127.0.0.1:9000/v1/chat/completions
+    auth: none
+    headers:
+      X-Gateway-Token: ${CORT_TEST_GATEWAY_TOKEN}
+    payload:
+      max_tokens: 512
+    default_model: qwen2.5-7b-instruct
+    mixed_models: [qwen2.5-7b-instruct]
+  openrouter:
+    payload: {}
+"""
+
+
+@pytest.fixture
+def providers_file(tmp_path, monkeypatch):
+    path = tmp_path / "providers.yaml"
+    path.write_text(PROVIDERS_FILE)
+    monkeypatch.setenv("CORT_TEST_GATEWAY_TOKEN", "secret")
+    configure_providers(str(path))
+    yield str(path)
+    configure_providers()
+
+
+def test_local_provider_from_file(providers_file):
+    assert provider_available("local")
+    chat = EnhancedRecursiveThinkingChat(api_key=None, model="qwen2.5-7b-instruct", provider="local")
+    assert chat.base_url == "http://127.0.0.1:9000/v1/chat/completions"
+    assert chat.headers["X-Gateway-Token"] == "secret"
+    assert "Authorization" not in chat.headers
+    assert chat.payload_options == {"max_tokens": 512}
+    assert get_provider("local")["default_model"] == "qwen2.5-7b-instruct"
+    assert {"provider": "local", "model": "qwen2.5-7b-instruct"} in mixed_models()
+    # Built-in entries are overridden field by field
+    assert EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openrouter").payload_options == {}
+
+
+def test_builtin_providers_and_env_base_url(monkeypatch):
+    monkeypatch.setenv("CORT_OPENAI_BASE_URL", "http://127.0.0.1:1234/v1/chat/completions")
+    chat = EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openai")
+    assert chat.base_url == "http://127.0.0.1:1234/v1/chat/completions"
+    assert chat.headers["Authorization"] == "Bearer k"
+    assert EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openrouter").payload_options == {"reasoning": {"max_tokens": 10386}}
+    assert provider_available("ollama")
+    with pytest.raises(ValueError):
+        EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="nope")
+
+
+def test_invalid_providers_file(tmp_path):
+    path = tmp_path / "providers.yaml"
+    path.write_text("providers:\n  custom:\n    auth: none\n")
+    with pytest.raises(ValueError, match="base_url"):
+        load_providers_file(str(path))
+
+
+class CapturingSession:
+    def __init__(self, choice=None):
+        self.payloads = []
+        self.choice = choice or {"message": {"content": "3"}}
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.payloads.append(json)
+        body = {"choices": [self.choice]}
+        return type("Response", (), {
+            "status_code": 200,
+            "json": lambda self: body,
+            "raise_for_status": lambda self: None,
+        })()
+
+
+def test_stage_limits_shape_the_payload(monkeypatch):
+    session = CapturingSession()
+    monkeypatch.setattr(recursive_thinking_ai, "get_http_session", lambda: session)
+    chat = EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openrouter")
+    assert chat._determine_thinking_rounds("q") == 3
+    chat.stage_limits = merge_stage_limits(DEFAULT_STAGE_LIMITS, {"base": {"reasoning": 1000, "max_tokens": 1300, "stop": "END"}})
+    chat._call_api([{"role": "user", "content": "q"}], stage="base")
+    chat._call_api([{"role": "user", "content": "q"}])
+    rounds, base, unstaged = session.payloads
+    assert rounds["reasoning"] == {"enabled": False}
+    # Stop sequences are not sent to reasoning providers
+    assert rounds["max_tokens"] == 16 and "stop" not in rounds
+    assert base["reasoning"] == {"max_tokens": 1000}
+    assert base["max_tokens"] == 1300 and "stop" not in base
+    # Calls outside a stage keep the provider's payload options
+    assert unstaged["reasoning"] == {"max_tokens": 10386} and "max_tokens" not in unstaged
+
+    # Providers without a reasoning budget only get the output cap
+    chat = EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openai")
+    chat._call_api([{"role": "user", "content": "q"}], stage="evaluation")
+    assert "reasoning" not in session.payloads[-1] and session.payloads[-1]["max_tokens"] == 1536
+    chat._call_api([{"role": "user", "content": "q"}], stage="rounds")
+    assert session.payloads[-1]["stop"] == ["\n"]
+
+    with pytest.raises(ValueError):
+        merge_stage_limits(DEFAULT_STAGE_LIMITS, {"evaluation": {"max_tokens": 0}})
+    with pytest.raises(ValueError):
+        merge_stage_limits(DEFAULT_STAGE_LIMITS, {"judge": {}})
+    # The reasoning budget has to stay below the output cap (also against the defaults)
+    with pytest.raises(ValueError, match="below"):
+        merge_stage_limits(DEFAULT_STAGE_LIMITS, {"base": {"reasoning": 800, "max_tokens": 800}})
+    with pytest.raises(ValueError, match="below"):
+        merge_stage_limits(DEFAULT_STAGE_LIMITS, {"evaluation": {"max_tokens": 300}})
+    assert merge_stage_limits(DEFAULT_STAGE_LIMITS, {"evaluation": {"reasoning": 0, "max_tokens": 300}})["evaluation"]["max_tokens"] == 300
+
+
+def test_empty_or_cut_off_rounds_replies_are_logged(monkeypatch, caplog):
+    # A reasoning model that spends the whole cap on reasoning returns no content
+    session = CapturingSession({"message": {"content": None}, "finish_reason": "length"})
+    monkeypatch.setattr(recursive_thinking_ai, "get_http_session", lambda: session)
+    chat = EnhancedRecursiveThinkingChat(api_key="k", model="m", provider="openrouter")
+    with caplog.at_level(logging.WARNING, logger=recursive_thinking_ai.logger.name):
+        assert chat._determine_thinking_rounds("q") == 3
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("max_tokens limit of the 'rounds' stage" in message for message in messages)
+    assert any("Empty reply to the rounds question" in message for message in messages)
@@ -0,0 +1,388 @@
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp.recursive_thinking_ai import (
+    BatchEvaluator,
+    CascadeStrategy,
+    DeadlineExceeded,
+    EnhancedRecursiveThinkingChat,
+    MixedModelStrategy,
+    PairwiseEvaluator,
+    ThinkingEngine,
+    apply_edits,
+    configure_dedup,
+    parse_evaluation,
+    record_latency,
+)
+
+
+class ScriptedChat(EnhancedRecursiveThinkingChat):
+    """Chat whose provider calls are answered locally by a callable."""
+
+    def __init__(self, answer, delay=0.0, **kwargs):
+        super().__init__(api_key="test", model="test-model", provider=kwargs.pop("provider", "openai"))
+        self.answer = answer
+        self.delay = delay
+        self.supports_n = kwargs.pop("supports_n", False)
+        self.max_samples = kwargs.pop("max_samples", None)
+        self.calls = []
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _call_api(self, messages, temperature=0.7, stream=False, stage=None):
+        return self._call_api_samples(messages, temperature, 1, stage=stage)[0]
+
+    def _call_api_samples(self, messages, temperature, n, stage=None):
+        with self._lock:
+            self.calls.append(messages[-1]["content"])
+            self.requests.append({"messages": messages, "n": n, "stage": stage, "temperature": temperature})
+        if self.delay:
+            if self.deadline is not None and time.monotonic() + self.delay > self.deadline:
+                raise DeadlineExceeded("test deadline")
+            time.sleep(self.delay)
+            record_latency(self.provider, self.model, self.delay)
+        self._record_usage(self.delay)
+        return [self.answer(messages[-1]["content"], temperature) for _ in range(min(n, self.max_samples or n))]
+
+
+def test_parse_evaluation_handles_multi_digit_choice():
+    assert parse_evaluation("12\nbest one", 20) == (11, "best one")
+    assert parse_evaluation("Current\nstill best", 20) == (-1, "still best")
+    assert parse_evaluation("40", 20)[0] == -1
+
+
+def test_wide_round_is_evaluated_in_shards():
+    def answer(content, temperature):
+        if content.startswith("Original message") and "Alternatives:" in content:
+            # Prefer the candidate mentioning "alt-9" whenever it is shown
+            listed = [line for line in content.split("\n") if line[:1].isdigit()]
+            for line in listed:
+                if "alt-9" in line:
+                    return line.split(".")[0] + "\nit is the best"
+            return "current\nnothing better"
+        return "base"
+
+    chat = ScriptedChat(answer)
+    alternatives = [f"alt-{i}" for i in range(12)]
+    selected, explanation = chat._evaluate_alternatives("q", "base", alternatives, drop_losers=True)
+    assert selected == 9
+    assert explanation == "it is the best"
+    # 3 shards of 4 plus one merge call
+    assert len(chat.calls) == 4
+    assert [alt for alt in alternatives if alt is not None] == ["alt-9"]
+
+
+def test_think_generates_requested_number_of_alternatives():
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            return "current\nkeep"
+        return uuid.uuid4().hex
+
+    chat = ScriptedChat(answer)
+    result = chat.think("q", rounds=1, num_alternatives=6, details=True)
+    assert len(result["thinking_history"][1]["alternatives"]) == 6
+    assert result["thinking_history"][1]["deduplicated"] == 0
+
+
+def test_deadline_returns_best_so_far():
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            return "1\nbetter"
+        if "Generate an alternative" in content:
+            return "improved " + uuid.uuid4().hex
+        return "base"
+
+    chat = ScriptedChat(answer, delay=0.05)
+    started = time.monotonic()
+    result = chat.think("q", deadline_ms=250)
+    assert time.monotonic() - started < 0.4
+    assert result["response"].startswith("improved")
+    assert result["deadline_reached"] is True
+    assert 1 <= result["rounds_completed"] < 5
+    assert chat.deadline is None
+
+
+def test_near_duplicate_alternatives_are_collapsed_before_evaluation():
+    answer_text = "The quick brown fox jumps over the lazy dog near the river bank."
+
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            assert content.count("quick brown fox") == 1
+            return "current\nkeep"
+        if "clearly different approach" in content:
+            return uuid.uuid4().hex
+        if "Generate an alternative" in content:
+            return answer_text + ("" if temperature < 0.85 else " ")
+        return "base response"
+
+    chat = ScriptedChat(answer)
+    result = chat.think("q", rounds=1, num_alternatives=3, details=True)
+    round_one = result["thinking_history"][1]
+    assert round_one["deduplicated"] == 2
+    assert len(round_one["alternatives"]) == 1
+
+    try:
+        configure_dedup(regenerate=True)
+        chat = ScriptedChat(lambda content, temperature: "current\nkeep" if "Alternatives:" in content else answer(content, temperature))
+        round_one = chat.think("q", rounds=1, num_alternatives=3, details=True)["thinking_history"][1]
+        assert round_one["regenerated"] == 2
+        assert round_one["deduplicated"] == 0
+        assert len(round_one["alternatives"]) == 3
+    finally:
+        configure_dedup()
+
+
+def test_duplicates_are_regenerated_in_their_own_slot():
+    chats = []
+
+    def answer_for(index):
+        def answer(content, temperature):
+            if "Alternatives:" in content:
+                return "current\nkeep"
+            if "clearly different approach" in content:
+                return f"{index} {uuid.uuid4().hex}"
+            if "Generate an alternative" in content:
+                if index == 1:
+                    raise DeadlineExceeded("slot 0 fails")
+                return "The quick brown fox jumps over the lazy dog near the river bank."
+            return "base response"
+        return answer
+
+    class ScriptedMixed(MixedModelStrategy):
+        @staticmethod
+        def _client(llm):
+            chat = ScriptedChat(answer_for(len(chats)), provider=llm["provider"])
+            chat.model = llm["model"]
+            chats.append(chat)
+            return chat
+
+    llms = [{"provider": "openai", "model": f"m{i}", "api_key": "test"} for i in range(3)]
+    try:
+        configure_dedup(regenerate=True)
+        result = ThinkingEngine(ScriptedMixed(llms), BatchEvaluator()).run("q", rounds=1, num_alternatives=3, details=True)
+    finally:
+        configure_dedup()
+    round_one = result["thinking_history"][1]
+    assert round_one["regenerated"] == 1
+    # Slot 0 failed, so the duplicate (the second surviving alternative) belongs to slot 2, whose client is chats[3]
+    assert len(chats) == 4
+    assert [alt["slot"] for alt in round_one["alternatives"]] == [1, 2]
+    assert round_one["alternatives"][1]["response"].startswith("3 ")
+    assert round_one["alternatives"][1]["model"] == chats[3].model
+
+
+def test_mixed_engine_records_the_model_of_each_alternative():
+    def answer_for(model):
+        def answer(content, temperature):
+            if "Alternatives:" in content:
+                return "1\nfirst is better"
+            return f"{model} {uuid.uuid4().hex}"
+        return answer
+
+    clients = {}
+
+    class ScriptedMixed(MixedModelStrategy):
+        @staticmethod
+        def _client(llm):
+            chat = ScriptedChat(answer_for(llm["model"]), provider=llm["provider"])
+            chat.model = llm["model"]
+            clients.setdefault(llm["model"], []).append(chat)
+            return chat
+
+    llms = [{"provider": "openai", "model": f"m{i}", "api_key": "test"} for i in range(3)]
+    result = ThinkingEngine(ScriptedMixed(llms), BatchEvaluator()).run("q", rounds=2, num_alternatives=4, details=True)
+    rounds = result["thinking_history"][1:]
+    assert len(rounds) == 2
+    for entry in rounds:
+        assert [alt["model"] for alt in entry["alternatives"]] == [llm["model"] for llm in entry["alternatives_llm"]]
+        assert entry["model"] == entry["alternatives"][0]["model"]
+        assert entry["response"].startswith(entry["model"])
+    assert result["best"]["model"] == rounds[-1]["model"]
+    assert result["response"] == rounds[-1]["response"]
+    assert all(chat.deadline is None for chats in clients.values() for chat in chats)
+
+
+def test_alternatives_share_one_multi_sample_request():
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            return "current\nkeep"
+        return uuid.uuid4().hex
+
+    chat = ScriptedChat(answer, supports_n=True)
+    round_one = chat.think("q", rounds=1, num_alternatives=4, details=True)["thinking_history"][1]
+    assert len(set(round_one["alternatives"])) == 4
+    sampled = [request for request in chat.requests if request["n"] > 1]
+    assert len(sampled) == 1 and sampled[0]["n"] == 4
+    # The conversation and original message form the prefix of the alternative prompt
+    assert sampled[0]["messages"][0] == {"role": "user", "content": "q"}
+    assert sampled[0]["messages"][1]["role"] == "assistant"
+
+    # Samples missing from the provider's answer are generated with separate calls
+    chat = ScriptedChat(answer, supports_n=True, max_samples=1)
+    round_one = chat.think("q", rounds=1, num_alternatives=4, details=True)["thinking_history"][1]
+    assert len(set(round_one["alternatives"])) == 4
+    assert [request["n"] for request in chat.requests].count(1) == 1 + 3 + 1
+
+    # Batched alternatives record the provider and model that produced them
+    draft = ScriptedChat(answer, supports_n=True, provider="vllm")
+    judge = ScriptedChat(answer)
+    engine = ThinkingEngine(CascadeStrategy(draft, judge), BatchEvaluator())
+    round_one = engine.run("q", rounds=1, num_alternatives=4, details=True)["thinking_history"][1]
+    assert [request["n"] for request in draft.requests if request["stage"] == "alternatives"] == [4]
+    assert [(alt["provider"], alt["model"]) for alt in round_one["alternatives"]] == [("vllm", "test-model")] * 4
+    assert round_one["alternatives_llm"] == [{"provider": "vllm", "model": "test-model"}] * 4
+    # They record the temperature the request was sent with, not their slots' own
+    sent = [request for request in draft.requests if request["stage"] == "alternatives"][0]
+    assert sent["temperature"] == 0.85
+    assert [alt["temperature"] for alt in round_one["alternatives"]] == [0.85] * 4
+
+
+def test_pairwise_evaluation_reuses_verdicts_and_stops_on_clear_lead():
+    texts = {temperature: uuid.uuid4().hex for temperature in (0.7, 0.8, 0.9)}
+
+    def answer(content, temperature):
+        if "Response B:" in content:
+            return "A\nthe current response is better"
+        if "Generate an alternative" in content:
+            return texts[temperature]
+        return "base response"
+
+    chat = ScriptedChat(answer)
+    result = chat.think("q", rounds=4, num_alternatives=3, details=True, eval_mode="pairwise")
+    # Round 2 repeats round 1's alternatives, so its verdicts are reused; the incumbent
+    # has then won 6 times in a row and rounds 3 and 4 are skipped
+    assert len(result["thinking_history"]) == 3
+    assert result["evaluation"] == {"mode": "pairwise", "evaluator_calls": 3, "reused_verdicts": 3, "settled": True}
+    assert sum("Response B:" in call for call in chat.calls) == 3
+
+
+def test_pairwise_knockout_between_challengers():
+    def answer(content, temperature):
+        first, second = re.search(r"Response A: (.*)\n\nResponse B: (.*?)(?:\n|$)", content).groups()
+        return ("B" if len(second) > len(first) else "A") + "\nlonger is better"
+
+    chat = ScriptedChat(answer)
+    evaluator = PairwiseEvaluator()
+    alternatives = ["bb", "cccc", "dd"]
+    assert evaluator.evaluate(chat, "q", "a", alternatives, drop_losers=True) == (1, "longer is better")
+    assert alternatives == [None, "cccc", None]
+    # 3 challenges of the incumbent plus 2 knockout matches
+    assert evaluator.calls == 5
+    assert evaluator.scores[evaluator._key("cccc")]["wins"] == 3
+
+
+def test_pairwise_explanation_comes_from_the_winning_comparison():
+    def answer(content, temperature):
+        first, second = re.search(r"Response A: (.*)\n\nResponse B: (.*?)(?:\n|$)", content).groups()
+        winner = max(first, second, key=len)
+        return ("B" if winner == second else "A") + f"\n{winner} is longer than {min(first, second, key=len)}"
+
+    chat = ScriptedChat(answer)
+    # Only the first challenger beats the incumbent
+    assert PairwiseEvaluator().evaluate(chat, "q", "aaa", ["bbbb", "c", "dd"]) == (0, "bbbb is longer than aaa")
+    # After the knockout the explanation is the final's
+    assert PairwiseEvaluator().evaluate(chat, "q", "a", ["eeeeee", "bbb", "cccc"]) == (0, "eeeeee is longer than cccc")
+
+
+def test_stage_limits_apply_per_run():
+    seen = []
+
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            return "current\nkeep"
+        seen.append(chat.stage_limits["alternatives"]["max_tokens"])
+        return uuid.uuid4().hex
+
+    chat = ScriptedChat(answer)
+    chat.think("q", rounds=1, num_alternatives=2, stage_limits={"alternatives": {"max_tokens": 200}})
+    assert seen == [200, 200, 200]
+    assert [request["stage"] for request in chat.requests] == ["base", "alternatives", "alternatives", "evaluation"]
+    assert chat.stage_limits is None
+
+
+def test_cascade_drafts_judges_and_escalates_on_low_confidence():
+    def draft_answer(content, temperature):
+        return uuid.uuid4().hex
+
+    def judge_answer(content, temperature):
+        if "How confident" in content:
+            return confidence
+        if "1. strong answer" in content:
+            return "1\nthe strong answer is better"
+        return "current\nkeep"
+
+    def tiered(answer, model):
+        chat = ScriptedChat(answer)
+        chat.model = model
+        return chat
+
+    for confidence, escalated in (("3", True), ("9", False)):
+        draft, judge = tiered(draft_answer, "fast"), tiered(judge_answer, "strong-judge")
+        escalation = tiered(lambda content, temperature: "strong answer", "strongest")
+        result = ThinkingEngine(CascadeStrategy(draft, judge, escalation), BatchEvaluator()).run("q", rounds=2, num_alternatives=3)
+        cascade = result["cascade"]
+        assert cascade["escalated"] is escalated
+        assert cascade["confidence"] == int(confidence) / 10
+        tiers = cascade["tiers"]
+        # The draft tier writes the base response and every alternative, the judge only evaluates
+        assert tiers["draft"]["calls"] == 1 + 2 * 3
+        assert {request["stage"] for request in judge.requests} == {"evaluation"}
+        if escalated:
+            assert tiers["judge"]["calls"] == 2 + 1 + 1
+            assert tiers["escalation"]["calls"] == 1
+            assert (result["response"], result["model"]) == ("strong answer", "strongest")
+            assert result["thinking_history"][-1]["escalation"] is True
+        else:
+            assert tiers["judge"]["calls"] == 2 + 1
+            assert tiers["escalation"]["calls"] == 0
+            assert result["model"] == "fast"
+
+
+def test_apply_edits():
+    text = "line one\nline two\nline three"
+    assert apply_edits(text, "<<<<<<< SEARCH\nline two\n=======\nline 2\n>>>>>>> REPLACE") == "line one\nline 2\nline three"
+    # Search text with stray surrounding whitespace still matches once
+    assert apply_edits(text, "<<<<<<< SEARCH\n  line three \n=======\nline 3\n>>>>>>> REPLACE") == "line one\nline two\nline 3"
+    assert apply_edits(text, "no edit blocks here") is None
+    assert apply_edits(text, "<<<<<<< SEARCH\nline four\n=======\nline 4\n>>>>>>> REPLACE") is None
+    # An ambiguous search text does not apply (the alternative falls back to full regeneration)
+    assert apply_edits(text, "<<<<<<< SEARCH\nline\n=======\nrow\n>>>>>>> REPLACE") is None
+
+
+def test_edit_mode_applies_edits_and_falls_back_to_full_regeneration():
+    base = "Intro paragraph.\n" + "filler sentence. " * 60 + "\nThe answer is WRONG."
+    edit_answers = iter([
+        "<<<<<<< SEARCH\nThe answer is WRONG.\n=======\nThe answer is RIGHT.\n>>>>>>> REPLACE",
+        "<<<<<<< SEARCH\ntext that is not there\n=======\nanything\n>>>>>>> REPLACE",
+    ])
+    lock = threading.Lock()
+
+    def answer(content, temperature):
+        if "Alternatives:" in content:
+            # Prefer the edited candidate
+            listed = [line for line in content.split("\n") if line[:1].isdigit()]
+            return next(line.split(".")[0] for line in listed if "Intro" in line) + "\nfixes the answer"
+        if content.startswith("Improve your previous response"):
+            with lock:
+                return next(edit_answers)
+        if content.startswith("Generate an alternative"):
+            return "a complete rewrite"
+        return base
+
+    chat = ScriptedChat(answer)
+    result = chat.think("q", rounds=1, num_alternatives=2, details=True, alternative_mode="edit")
+    assert result["response"] == base.replace("WRONG", "RIGHT")
+    entry = result["thinking_history"][1]
+    assert entry["edited"] == 1 and entry["edit_fallbacks"] == 1
+    assert sorted(entry["alternatives"]) == sorted(["a complete rewrite", base.replace("WRONG", "RIGHT")])
+
+    # Short responses are regenerated in full
+    short = ScriptedChat(lambda content, temperature: "1\nok" if "Alternatives:" in content else "short " + uuid.uuid4().hex)
+    short.think("q", rounds=1, num_alternatives=2, alternative_mode="edit")
+    assert not any(call.startswith("Improve your previous response") for call in short.calls)
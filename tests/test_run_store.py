@@ -0,0 +1,62 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp import server
+from cort_mcp.run_store import RunStore
+
+HISTORY = [
+    {"round": 0, "response": "base", "alternatives": [], "selected": -1, "explanation": "Initial base response"},
+    {"round": 1, "response": "base", "alternatives": ["alt-a", "alt-b"], "selected": 1, "explanation": "b is better"},
+]
+
+
+def test_runs_are_bounded_and_expire():
+    store = RunStore(max_runs=2)
+    first = store.put({"thinking_rounds": 1, "thinking_history": HISTORY})
+    second = store.put({"thinking_rounds": 1, "thinking_history": HISTORY})
+    # Reading a run makes it the most recently used one
+    assert store.get(first)["thinking_rounds"] == 1
+    store.put({"thinking_rounds": 1, "thinking_history": HISTORY})
+    assert store.get(second) is None and store.get(first) is not None
+    assert len(store) == 2
+
+    assert store.rounds(first, rounds=[1], fields=["alternatives"]) == [{"round": 1, "alternatives": ["alt-a", "alt-b"]}]
+    with pytest.raises(ValueError, match="no rounds"):
+        store.rounds(first, rounds=[5])
+
+    store.ttl = 0
+    assert store.get(first) is None and len(store) == 0
+
+
+def test_details_tool_returns_run_id_and_history_is_served_lazily(monkeypatch):
+    def fake_generate(prompt, api_key, model, provider, details=False, **options):
+        return {"response": "b", "model": model, "provider": provider, "thinking_rounds": 1, "thinking_history": HISTORY}
+
+    monkeypatch.setattr(server, "generate_with_single_llm", fake_generate)
+    monkeypatch.setattr(server, "_run_store", RunStore())
+
+    async def scenario():
+        response = await server.cort_think_details("q", model="m", provider="openai")
+        assert "details" not in response and response["thinking_rounds"] == 1
+        run_id = response["run_id"]
+        assert response["details_uri"] == f"cort://runs/{run_id}"
+        inline = await server.cort_think_details("q", model="m", provider="openai", inline_details=True)
+        assert yaml.safe_load(inline["details"])["thinking_history"] == HISTORY
+
+        history = await server.cort_think_history(run_id, rounds=[1], fields=["selected", "explanation"])
+        assert history["thinking_history"] == [{"round": 1, "selected": 1, "explanation": "b is better"}]
+        assert "error" in await server.cort_think_history("nope")
+
+        contents = await server.server.read_resource(f"cort://runs/{run_id}")
+        assert yaml.safe_load(contents.contents[0].content)["thinking_history"] == HISTORY
+        contents = await server.server.read_resource(f"cort://runs/{run_id}/rounds/1/alternatives")
+        assert json.loads(contents.contents[0].content) == ["alt-a", "alt-b"]
+
+    asyncio.run(scenario())
@@ -1,2 +1,214 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cort_mcp import recursive_thinking_ai, server
+from cort_mcp.cancellation import RunCancelled, current_cancel_token
+from cort_mcp.run_store import RunStore
+
+HISTORY = [{"round": 0, "response": "draft", "alternatives": [], "selected": -1, "explanation": "Initial base response"}]
+
+
 def test_dummy():
     assert True
+
+
+def test_cascade_tools_run_directly_and_as_jobs(monkeypatch):
+    calls = []
+
+    def fake_cascade(prompt, tiers, escalate_below=0.7, details=False, **options):
+        calls.append({"tiers": tiers, "details": details, **options})
+        draft_model, draft_provider, _ = tiers["draft"]
+        return {"response": "draft", "model": draft_model, "provider": draft_provider, "thinking_rounds": 0, "thinking_history": HISTORY,
+                "cascade": {"escalated": False, "confidence": 0.9, "tiers": {}}}
+
+    monkeypatch.setattr(server, "generate_with_cascade", fake_cascade)
+    monkeypatch.setattr(server, "_run_store", RunStore())
+
+    async def scenario():
+        simple = await server.cort_think_simple_cascade("q", draft_model="small", draft_provider="vllm", judge_model="big", judge_provider="vllm")
+        assert simple["response"] == "draft" and simple["model"] == "small" and simple["provider"] == "vllm"
+        assert "run_id" not in simple and simple["cascade"]["escalated"] is False
+        assert set(calls[-1]["tiers"]) == {"draft", "judge"}
+
+        details = await server.cort_think_details_cascade("q", draft_model="small", draft_provider="vllm", escalation_model="huge",
+                                                          escalation_provider="vllm", inline_details=True)
+        assert yaml.safe_load(details["details"])["thinking_history"] == HISTORY
+        assert server.get_run_store().get(details["run_id"])["thinking_history"] == HISTORY
+        assert set(calls[-1]["tiers"]) == {"draft", "judge", "escalation"}
+
+        job = await server.cort_think_submit("cort.think.details_cascade", {"prompt": "q", "draft_provider": "vllm", "draft_model": "small"})
+        for _ in range(100):
+            result = await server.cort_think_result(job["job_id"])
+            if "result" in result:
+                break
+            await asyncio.sleep(0.01)
+        assert result["state"] == "succeeded", result
+        assert result["result"]["details_uri"].startswith("cort://runs/")
+
+    monkeypatch.setattr(server, "_job_manager", None)
+    asyncio.run(scenario())
+
+
+def test_job_tools_are_unavailable_with_several_workers(monkeypatch):
+    monkeypatch.setenv("CORT_MCP_WORKERS", "2")
+
+    async def scenario():
+        submitted = await server.cort_think_submit("cort.think.simple", {"prompt": "q"})
+        assert "--workers" in submitted["error"]
+        assert "--workers" in (await server.cort_think_status("job"))["error"]
+
+    asyncio.run(scenario())
+
+
+def test_details_are_inlined_with_several_workers(monkeypatch):
+    def fake_generate(prompt, api_key, model, provider, details=False, **options):
+        return {"response": "b", "model": model, "provider": provider, "thinking_rounds": 0, "thinking_history": HISTORY}
+
+    monkeypatch.setenv("CORT_MCP_WORKERS", "2")
+    monkeypatch.setattr(server, "generate_with_single_llm", fake_generate)
+    monkeypatch.setattr(server, "_run_store", RunStore())
+    response = asyncio.run(server.cort_think_details("q", model="m", provider="vllm"))
+    assert "run_id" not in response and len(server.get_run_store()) == 0
+    assert yaml.safe_load(response["details"])["thinking_history"] == HISTORY
+
+
+def test_cancelled_runs_do_not_fall_back(monkeypatch):
+    providers = []
+    started = threading.Event()
+
+    def fake_generate(prompt, api_key, model, provider, details=False, **options):
+        providers.append(provider)
+        if provider == "vllm":
+            started.set()
+            token = current_cancel_token()
+            while prompt == "wait" and not token.cancelled:
+                time.sleep(0.01)
+            raise RunCancelled("run cancelled")
+        return {"response": "fallback", "model": model, "provider": provider, "thinking_rounds": 0, "thinking_history": HISTORY}
+
+    monkeypatch.setattr(server, "generate_with_single_llm", fake_generate)
+    monkeypatch.setattr(server, "get_api_key", lambda provider: "key")
+
+    async def scenario():
+        # The client cancels while the primary provider call is running
+        task = asyncio.create_task(server.cort_think_simple("wait", model="m", provider="vllm"))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+        # A run cancelled through its token alone
+        with pytest.raises(RunCancelled):
+            await server.cort_think_simple("q", model="m", provider="vllm")
+
+    asyncio.run(scenario())
+    assert providers == ["vllm", "vllm"]
+
+
+def test_fallback_gets_the_remaining_deadline_budget(monkeypatch):
+    budgets = []
+
+    def fake_generate(prompt, api_key, model, provider, details=False, deadline_ms=None, **options):
+        budgets.append((provider, deadline_ms))
+        if provider == "vllm":
+            time.sleep(0.3)
+            raise RuntimeError("connection refused")
+        return {"response": "fallback", "model": model, "provider": provider, "thinking_rounds": 0, "thinking_history": HISTORY}
+
+    monkeypatch.setattr(server, "generate_with_single_llm", fake_generate)
+    monkeypatch.setattr(server, "get_api_key", lambda provider: "key")
+    response = asyncio.run(server.cort_think_simple("q", model="m", provider="vllm", deadline_ms=1000))
+    assert response["response"] == "fallback"
+    (_, primary), (_, fallback) = budgets
+    assert primary == 1000 and 0 < fallback <= 700
+
+    # Nothing is left for a fallback once the primary has used up the budget
+    budgets.clear()
+    response = asyncio.run(server.cort_think_simple("q", model="m", provider="vllm", deadline_ms=200))
+    assert "Deadline reached" in response["error"] and [provider for provider, _ in budgets] == ["vllm"]
+
+
+def test_cancelled_job_keeps_its_slot_until_the_run_stops(monkeypatch):
+    stopped = threading.Event()
+
+    def run():
+        token = current_cancel_token()
+        while not token.cancelled:
+            time.sleep(0.01)
+        # The run needs a moment to wind down after noticing the cancellation
+        time.sleep(0.2)
+        stopped.set()
+        raise RunCancelled("run cancelled")
+
+    async def scenario():
+        manager = server.JobManager(max_running=1)
+        first = manager.submit("cort.think.simple", lambda: server.run_blocking(run))
+        second = manager.submit("cort.think.simple", lambda: server.run_blocking(lambda: {"response": "done"}))
+        await asyncio.sleep(0.05)
+        assert manager.cancel(first["job_id"])["state"] == "cancelled"
+        await asyncio.sleep(0.05)
+        assert manager.status(second["job_id"])["state"] == "queued"
+        while manager.status(second["job_id"])["state"] != "succeeded":
+            await asyncio.sleep(0.01)
+        assert stopped.is_set()
+
+    asyncio.run(scenario())
+
+
+def test_job_tools_resolve_the_functions_behind_wrapped_tools():
+    # What the decorators of fastmcp 2.7-2.x return
+    wrapped = types.SimpleNamespace(name="cort.think.simple", fn=server.cort_think_simple)
+    assert server.tool_function(wrapped) is server.cort_think_simple
+    assert server.tool_function(server.cort_think_simple) is server.cort_think_simple
+    arguments = server.tool_arguments_model(server.tool_function(wrapped))
+    assert arguments(prompt="q").num_alternatives == 3
+
+
+def test_http_workers_get_the_cli_settings_through_the_environment(monkeypatch):
+    monkeypatch.setattr(os, "environ", dict(os.environ))
+    monkeypatch.setattr(sys, "argv", ["cort-mcp", "--log=off", "--transport=http", "--workers=2", "--alternative-mode=edit",
+                                      "--dedup-threshold=0.8", "--stage-limits", '{"alternatives": {"max_tokens": 800}}',
+                                      "--answer-store=reuse"])
+    started = {}
+    monkeypatch.setattr(server, "initialize_and_run_server", lambda **kwargs: started.update(kwargs))
+    try:
+        server.main()
+        assert started["workers"] == 2 and started["port"] == server.DEFAULT_HTTP_PORT
+        assert os.environ["CORT_MCP_WORKERS"] == "2"
+        # A worker process starts from the defaults and reads everything from the environment
+        recursive_thinking_ai.configure_stage_limits()
+        recursive_thinking_ai.configure_alternative_mode()
+        recursive_thinking_ai.configure_dedup()
+        recursive_thinking_ai.configure_answer_store(None, "off")
+        app = server.create_http_app()
+        assert app.routes
+        assert recursive_thinking_ai.get_stage_limits()["alternatives"]["max_tokens"] == 800
+        assert recursive_thinking_ai._alternative_mode == "edit"
+        assert recursive_thinking_ai._dedup_settings["threshold"] == 0.8
+        assert recursive_thinking_ai._answer_store_mode == "reuse"
+        assert server.multi_worker()
+        tools = {tool.name for tool in asyncio.run(server.server.list_tools())}
+        assert "cort.think.details" in tools and not tools & set(server.JOB_TOOL_NAMES)
+    finally:
+        server.server.enable(names=set(server.JOB_TOOL_NAMES) | set(server.RUN_HISTORY_COMPONENTS))
+        recursive_thinking_ai.configure_stage_limits()
+        recursive_thinking_ai.configure_alternative_mode()
+        recursive_thinking_ai.configure_dedup()
+        recursive_thinking_ai.configure_answer_store(None, "off")
+        logging.disable(logging.NOTSET)
+
+
+def test_resolving_models_keeps_stdout_clean(capsys):
+    server.resolve_model_and_provider({"model": "m", "provider": "vllm"})
+    assert capsys.readouterr().out == ""